@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Times every matrix builder and metric calculator across image sizes, bit
+depths and textures, reporting throughput and peak memory.
+
+COMMAND LINE:
+    python -m benchmarks.run_benchmarks [--quick] [-o results.json]
+
+ARGUMENTS:
+    --sizes - Image sides in pixels. (Default = 64 256 1024 4096)
+    --bit-depths - Bit depths of the quantized images. (Default = 4 8 16)
+    --textures - Texture kinds, see benchmarks.textures. (Default = all)
+    --only - Benchmarks to run, by name or part of a name, e.g. calc_glcm
+        or Metrics. (Default = all)
+    --quick - Sizes 64 and 256 at bit depths 4 and 8, for a fast check.
+    --backend - Kernel backend, as for dev.lib.matrixCalc.backends.
+    --min-time - Seconds each measurement is repeated for. The fastest
+        repeat is reported. (Default = 0.2)
+    --max-matrix-mb - Combinations whose matrix would be larger are
+        skipped, and calls that run out of memory anyway are reported as
+        such. (Default = 256)
+    -o, --output - Writes the results to a .json or .csv file.
+    --compare - Results .json of an earlier run. Each row gains its speedup
+        over that run (above 1 is faster).
+
+Throughput is megapixels of the source image per second, for the metric
+calculators too, so every stage of the pipeline is on the same scale. Peak
+memory is the most memory allocated above the starting point during one
+extra, untimed call, as traced by tracemalloc, which NumPy reports its
+arrays to.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+import tracemalloc
+import warnings
+
+from dev.lib.matrixCalc.backends import set_backend
+
+from benchmarks.suite import BENCHMARKS, matrix_bytes
+from benchmarks.textures import TEXTURES, make_texture
+
+
+SIZES = (64, 256, 1024, 4096)
+BIT_DEPTHS = (4, 8, 16)
+
+QUICK_SIZES = (64, 256)
+QUICK_BIT_DEPTHS = (4, 8)
+
+COLUMNS = ["benchmark", "texture", "size", "bitDepth", "status", "seconds",
+           "mpps", "peakMiB", "speedup"]
+
+
+def time_call(run, args, minTime):
+
+    # Fastest of as many calls as fit in minTime, and at least three.
+
+    best = float("inf")
+    total = 0.0
+    calls = 0
+
+    while calls < 3 or total < minTime:
+
+        start = time.perf_counter()
+        run(*args)
+        elapsed = time.perf_counter() - start
+
+        best = min(best, elapsed)
+        total += elapsed
+        calls += 1
+
+    return best
+
+
+def peak_memory(run, args):
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        run(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return max(peak - baseline, 0)
+
+
+def run_benchmarks(names, sizes, bitDepths, textures, backend=None,
+                   minTime=0.2, maxMatrixBytes=2**28, log=None):
+
+    results = []
+
+    for size in sizes:
+
+        for bitDepth in bitDepths:
+
+            for kind in textures:
+
+                image = make_texture(kind, size, bitDepth)
+
+                for name in names:
+
+                    benchmark = BENCHMARKS[name]
+
+                    row = {"benchmark": name, "texture": kind, "size": size,
+                           "bitDepth": bitDepth}
+
+                    row.update(seconds=None, mpps=None, peakMiB=None,
+                               status="ok")
+
+                    if matrix_bytes(benchmark, size, kind,
+                                    bitDepth) > maxMatrixBytes:
+                        row["status"] = "skipped"
+                    else:
+                        try:
+                            args = benchmark.setup(image, kind, bitDepth,
+                                                   backend)
+                            seconds = time_call(benchmark.run, args, minTime)
+                            row.update(
+                                seconds=seconds,
+                                mpps=image.size/1e6/seconds,
+                                peakMiB=peak_memory(benchmark.run,
+                                                    args)/2**20
+                            )
+                        except MemoryError:
+                            row["status"] = "out of memory"
+
+                    results.append(row)
+
+                    if log is not None:
+                        log(row)
+
+    return results
+
+
+def _key(row):
+    return (row["benchmark"], row["texture"], row["size"], row["bitDepth"])
+
+
+def add_speedups(results, baseline):
+
+    before = {_key(row): row["seconds"] for row in baseline}
+
+    for row in results:
+
+        old = before.get(_key(row))
+
+        if old and row["seconds"]:
+            row["speedup"] = old/row["seconds"]
+        else:
+            row["speedup"] = None
+
+
+def format_row(row):
+
+    if row["status"] == "skipped":
+        timing = "skipped (matrix too large)"
+    elif row["status"] != "ok":
+        timing = row["status"]
+    else:
+        timing = "{:10.2f} MP/s {:10.2f} ms {:9.1f} MiB".format(
+            row["mpps"], row["seconds"]*1e3, row["peakMiB"]
+        )
+
+        if row.get("speedup") is not None:
+            timing += " {:6.2f}x".format(row["speedup"])
+
+    return "{:<18} {:<8} {:>5}px {:>2}-bit  {}".format(
+        row["benchmark"], row["texture"], row["size"], row["bitDepth"], timing
+    )
+
+
+def write_results(results, path):
+
+    if path.endswith(".csv"):
+
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=COLUMNS,
+                                    extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(results)
+
+    else:
+
+        with open(path, "w") as file:
+            json.dump(results, file, indent=1)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run_benchmarks",
+        description="Times every matrix builder and metric calculator."
+    )
+
+    parser.add_argument("--sizes", type=int, nargs="+", default=None)
+    parser.add_argument("--bit-depths", type=int, nargs="+", default=None)
+    parser.add_argument("--textures", nargs="+", choices=TEXTURES,
+                        default=list(TEXTURES))
+    parser.add_argument("--only", nargs="+", default=None)
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--backend", default=None)
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--max-matrix-mb", type=float, default=256)
+    parser.add_argument("-o", "--output", default=None)
+    parser.add_argument("--compare", default=None)
+
+    args = parser.parse_args(argv)
+
+    # Uniform images leave many features undefined, which is expected here.
+
+    warnings.simplefilter("ignore", RuntimeWarning)
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else SIZES)
+    bitDepths = args.bit_depths or (QUICK_BIT_DEPTHS if args.quick
+                                    else BIT_DEPTHS)
+
+    names = [name for name in BENCHMARKS if args.only is None
+             or any(part in name for part in args.only)]
+
+    if not names:
+        parser.error("No benchmark matches --only.")
+
+    if args.backend is not None:
+        set_backend(args.backend)
+
+    baseline = None
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    def log(row):
+
+        if baseline is not None:
+            add_speedups([row], baseline)
+
+        print(format_row(row), flush=True)
+
+    results = run_benchmarks(names, sizes, bitDepths, args.textures,
+                             backend=args.backend, minTime=args.min_time,
+                             maxMatrixBytes=args.max_matrix_mb*2**20, log=log)
+
+    if args.output is not None:
+        write_results(results, args.output)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Benchmarks of every matrix builder and metric calculator.
+
+INPUT: Quantized image, with its texture kind and bit depth.
+OUTPIT: BENCHMARKS, a dict of benchmark name to Benchmark.
+
+Each Benchmark has:
+    setup(image, kind, bitDepth, backend) - Returns the arguments of run,
+        e.g. the matrix a metric calculator is timed on. Not timed.
+    run(*args) - The call that is timed.
+    cells(size, kind, bitDepth) - Upper bound on the matrix entries the
+        benchmark allocates, so combinations too large to hold are skipped.
+
+Builders are timed with the default settings of extract_features. At bit
+depths above DENSE_GLCM_BIT_DEPTH the GLCM is built and measured sparse, as
+a dense 16-bit GLCM would need 32 GiB. The GLSZM is always sparse, as in
+extract_features.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from dev.lib.matrixCalc.matrixGLCM import calc_glcm
+from dev.lib.matrixCalc.matrixGLRLM import calc_glrlm
+from dev.lib.matrixCalc.matrixGLSZM import calc_glszm
+from dev.lib.matrixCalc.matrixGLDM import calc_gldm
+from dev.lib.matrixCalc.matrixNGTDM import calc_ngtdm
+from dev.lib.metricCalc.glcmMetrics import calcGLCMMetrics
+from dev.lib.metricCalc.glrlmMetrics import calcGLRLMMetrics
+from dev.lib.metricCalc.glszmMetrics import calcGLSZMMetrics
+from dev.lib.metricCalc.gldmMetrics import calcGLDMMetrics
+from dev.lib.metricCalc.ngtdmMetrics import calcNGTDMMetrics
+
+from benchmarks.textures import longest_run
+
+
+Benchmark = namedtuple("Benchmark", ["setup", "run", "cells"])
+
+DENSE_GLCM_BIT_DEPTH = 12
+
+
+def _is_sparse(bitDepth):
+    return bitDepth > DENSE_GLCM_BIT_DEPTH
+
+
+def _glcm_args(image, kind, bitDepth, backend):
+    return image, 0, bitDepth, _is_sparse(bitDepth)
+
+
+def _glrlm_args(image, kind, bitDepth, backend):
+    return image, 0, bitDepth, False, None, None, backend
+
+
+def _glszm_args(image, kind, bitDepth, backend):
+    return image, bitDepth, False, None, "label", 8, None, backend, True
+
+
+def _gldm_args(image, kind, bitDepth, backend):
+    return image, 0, bitDepth
+
+
+def _ngtdm_args(image, kind, bitDepth, backend):
+    return image, False, 2**bitDepth
+
+
+def _sparse_cells(size, kind, bitDepth):
+    return 0
+
+
+def _glcm_cells(size, kind, bitDepth):
+    return 0 if _is_sparse(bitDepth) else 4**bitDepth
+
+
+def _glrlm_cells(size, kind, bitDepth):
+    return 2**bitDepth*longest_run(kind, size)
+
+
+def _gldm_cells(size, kind, bitDepth):
+    return 2**bitDepth*9
+
+
+def _ngtdm_cells(size, kind, bitDepth):
+    return 2**bitDepth*3
+
+
+def _ngtdm_pair_cells(size, kind, bitDepth):
+
+    # The NGTDM metrics pair every gray level in use with every other.
+
+    return min(2**bitDepth, size*size)**2
+
+
+def _metric_setup(build, argsFor, withPixels=False):
+
+    # Builds the matrix untimed. Calculators that scale by the pixel count
+    # are given the image size.
+
+    def setup(image, kind, bitDepth, backend):
+
+        matrix = build(*argsFor(image, kind, bitDepth, backend))
+
+        if withPixels:
+            return matrix, image.size
+
+        return (matrix,)
+
+    return setup
+
+
+BENCHMARKS = {
+    "calc_glcm": Benchmark(_glcm_args, calc_glcm, _glcm_cells),
+    "calc_glrlm": Benchmark(_glrlm_args, calc_glrlm, _glrlm_cells),
+    "calc_glszm": Benchmark(_glszm_args, calc_glszm, _sparse_cells),
+    "calc_gldm": Benchmark(_gldm_args, calc_gldm, _gldm_cells),
+    "calc_ngtdm": Benchmark(_ngtdm_args, calc_ngtdm, _ngtdm_cells),
+
+    "calcGLCMMetrics": Benchmark(
+        _metric_setup(calc_glcm, _glcm_args), calcGLCMMetrics, _glcm_cells
+    ),
+    "calcGLRLMMetrics": Benchmark(
+        _metric_setup(calc_glrlm, _glrlm_args, withPixels=True),
+        calcGLRLMMetrics, _glrlm_cells
+    ),
+    "calcGLSZMMetrics": Benchmark(
+        _metric_setup(calc_glszm, _glszm_args, withPixels=True),
+        calcGLSZMMetrics, _sparse_cells
+    ),
+    "calcGLDMMetrics": Benchmark(
+        _metric_setup(calc_gldm, _gldm_args), calcGLDMMetrics, _gldm_cells
+    ),
+    "calcNGTDMMetrics": Benchmark(
+        _metric_setup(calc_ngtdm, _ngtdm_args), calcNGTDMMetrics,
+        _ngtdm_pair_cells
+    )
+}
+
+
+def matrix_bytes(benchmark, size, kind, bitDepth):
+
+    # Entries of the matrix as float64, the metric calculators' copy of it
+    # being the largest allocation of most runs.
+
+    return benchmark.cells(size, kind, bitDepth)*np.dtype(float).itemsize
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Synthetic test images for the benchmarks, already quantized to a bit depth.
+
+INPUT: Texture kind, image size and bit depth.
+OUTPIT: Square image of gray levels in form of Numpy array.
+
+ARGUMENTS:
+    kind - One of TEXTURES:
+        uniform - A single gray level. One zone, and runs the length of
+            every line.
+        noise - Every pixel drawn at random. Runs and zones of a pixel or
+            two, and every GLCM pair present.
+        flat - Large flat zones, an 8x8 grid of blocks of random levels.
+    size - Side of the image in pixels.
+    bitDepth - Levels run from 0 to 2**bitDepth - 1.
+    seed - Seed of the random levels. (Default = 0)
+"""
+
+import numpy as np
+
+
+TEXTURES = ("uniform", "noise", "flat")
+
+# Blocks along each side of a "flat" image.
+
+FLAT_BLOCKS = 8
+
+
+def make_texture(kind, size, bitDepth, seed=0):
+
+    rng = np.random.default_rng(seed)
+    numLevels = 2**bitDepth
+
+    if kind == "uniform":
+        return np.full((size, size), numLevels//2, dtype=np.intp)
+
+    if kind == "noise":
+        return rng.integers(0, numLevels, (size, size))
+
+    if kind == "flat":
+
+        blocks = rng.integers(0, numLevels, (FLAT_BLOCKS, FLAT_BLOCKS))
+        blockSize = -(-size//FLAT_BLOCKS)
+
+        image = np.kron(blocks, np.ones((blockSize, blockSize), dtype=np.intp))
+
+        return image[:size, :size]
+
+    raise ValueError("Texture must be one of " + ", ".join(TEXTURES) + ".")
+
+
+def longest_run(kind, size):
+
+    # Upper bound on the longest run of a texture, for sizing its GLRLM
+    # before it is built.
+
+    if kind == "noise":
+        return 16
+
+    return size
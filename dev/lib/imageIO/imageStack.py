@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Opens TIFF, OME-TIFF and HDF5 images without decoding them into memory, and
+hands out page and tile views for the matrix builders.
+
+INPUT: Path to .tif/.tiff/.ome.tif or .h5/.hdf5 file.
+OUTPIT: Array-like stack. Slicing it only reads the pages or tiles asked for.
+
+ARGUMENTS: 
+    path - Path to image file.
+    series - TIFF series to open. (Default = 0)
+    dataset - Name of HDF5 dataset. (Default = None, the first dataset found)
+
+Uncompressed, contiguous TIFF series and HDF5 datasets are opened as
+read-only np.memmap, so pages and tiles are zero-copy views of the file.
+Compressed or tiled TIFFs fall back to decoding only the strips or tiles of
+each page that a slice touches, and chunked HDF5 to reading only the chunks
+it touches.
+
+    stack = open_stack("slide.ome.tif")
+    for page, y, x, tile in iter_tiles(stack, 512):
+        glcm = calc_glcm(tile, 0, 8)
+"""
+
+import numpy as np
+
+
+TIFF_SUFFIXES = (".tif", ".tiff")
+HDF5_SUFFIXES = (".h5", ".hdf5", ".hdf")
+
+
+def _segment_layout(page):
+
+    # Grid of the strips or tiles of a page, or None for layouts that are
+    # decoded whole (volumetric tiles, or offsets that do not match the
+    # grid). Segments are numbered by separate sample plane, then row, then
+    # column, as in the TIFF offsets.
+
+    if page.imagedepth != 1:
+        return None
+
+    if page.is_tiled:
+        segmentShape = (page.tilelength, page.tilewidth)
+    else:
+        segmentShape = (min(page.rowsperstrip or page.imagelength,
+                            page.imagelength), page.imagewidth)
+
+    grid = (-(-page.imagelength // segmentShape[0]),
+            -(-page.imagewidth // segmentShape[1]))
+
+    samples = page.samplesperpixel
+
+    if page.planarconfig == 2 and samples > 1:
+        planes, contig = samples, 1
+        shape, axes = (samples, page.imagelength, page.imagewidth), (1, 2)
+    else:
+        planes, contig = 1, samples
+        shape, axes = (page.imagelength, page.imagewidth), (0, 1)
+        if samples > 1:
+            shape += (samples,)
+
+    if (len(page.dataoffsets) != planes*grid[0]*grid[1]
+            or tuple(page.shape) != shape):
+        return None
+
+    return {"segmentShape": segmentShape, "grid": grid, "planes": planes,
+            "contig": contig, "axes": axes}
+
+
+def _region_index(index, shape, axes):
+
+    # Splits an index of ints and slices into a page into the rows and
+    # columns it reads, as (start, stop) pairs, and the index into that
+    # region. Returns None for any other index, which reads the whole page.
+
+    if not isinstance(index, tuple):
+        index = (index,)
+
+    if len(index) > len(shape) or not all(
+            isinstance(item, (slice, int, np.integer)) for item in index):
+        return None
+
+    local = list(index) + [slice(None)]*(len(shape) - len(index))
+    bounds = []
+
+    for axis in axes:
+
+        n = shape[axis]
+        item = local[axis]
+
+        if isinstance(item, slice):
+
+            picked = range(n)[item]
+
+            if not picked:
+                bounds.append((0, 0))
+                local[axis] = slice(0, 0)
+                continue
+
+            low = min(picked[0], picked[-1])
+            stop = picked[-1] - low + picked.step
+
+            bounds.append((low, max(picked[0], picked[-1]) + 1))
+            local[axis] = slice(picked[0] - low,
+                                stop if stop >= 0 else None, picked.step)
+
+        else:
+
+            row = range(n)[item]
+
+            bounds.append((row, row + 1))
+            local[axis] = 0
+
+    return bounds, tuple(local)
+
+
+def _read_region(page, layout, rows, cols):
+
+    # Decodes the strips or tiles of a page that overlap rows and cols,
+    # (start, stop) pairs, and copies their overlap into the region.
+
+    (y0, y1), (x0, x1) = rows, cols
+    segmentLength, segmentWidth = layout["segmentShape"]
+    down, across = layout["grid"]
+
+    region = np.zeros((layout["planes"], y1 - y0, x1 - x0, layout["contig"]),
+                      dtype=page.keyframe.dtype)
+
+    segments = [
+        (plane*down + ty)*across + tx
+        for plane in range(layout["planes"])
+        for ty in range(y0 // segmentLength, -(-y1 // segmentLength))
+        for tx in range(x0 // segmentWidth, -(-x1 // segmentWidth))
+    ] if y1 > y0 and x1 > x0 else []
+
+    keyframe = page.keyframe
+    fileHandle = page.parent.filehandle
+
+    decodeArgs = {}
+
+    if keyframe.compression in {6, 7, 34892, 33007}:  # JPEG
+        decodeArgs = {"jpegtables": page.jpegtables,
+                      "jpegheader": keyframe.jpegheader}
+
+    for data, index in fileHandle.read_segments(
+            [page.dataoffsets[k] for k in segments],
+            [page.databytecounts[k] for k in segments],
+            indices=segments, lock=fileHandle.lock):
+
+        segment, (plane, _, sy, sx, _), _ = keyframe.decode(data, index,
+                                                            **decodeArgs)
+
+        if segment is None:
+            continue
+
+        # Edge segments may be padded past the image, so only the overlap
+        # with the region is copied.
+
+        oy0, oy1 = max(y0, sy), min(y1, sy + segment.shape[1])
+        ox0, ox1 = max(x0, sx), min(x1, sx + segment.shape[2])
+
+        region[plane, oy0-y0:oy1-y0, ox0-x0:ox1-x0] = \
+            segment[0, oy0-sy:oy1-sy, ox0-sx:ox1-sx]
+
+    # Back to the layout of page.shape.
+
+    if layout["planes"] > 1:
+        return region[..., 0]
+
+    if layout["contig"] > 1:
+        return region[0]
+
+    return region[0, ..., 0]
+
+
+def _read_page(page, index):
+
+    # Reads one page of a TIFF, decoding only the strips or tiles an index
+    # of ints and slices touches. Other indices decode the whole page.
+
+    layout = _segment_layout(page.keyframe)
+
+    region = None
+
+    if layout is not None:
+        region = _region_index(index, tuple(page.keyframe.shape),
+                               layout["axes"])
+
+    if region is None:
+        return page.asarray()[index]
+
+    bounds, local = region
+
+    return _read_region(page, layout, *bounds)[local]
+
+
+class TiffPageStack:
+
+    # Page by page access to a TIFF series that cannot be memory-mapped.
+    # Indexing decodes only the pages selected, and of each page only the
+    # strips or tiles the rows and columns asked for fall in. A series
+    # stored as a single page, e.g. a whole-slide image, is indexed as that
+    # page.
+
+    def __init__(self, tiffFile, series=0):
+
+        self.tiffFile = tiffFile
+        self.pages = tiffFile.series[series].pages
+        self.dtype = self.pages[0].dtype
+
+        if len(self.pages) == 1:
+            self.shape = tuple(self.pages[0].shape)
+        else:
+            self.shape = (len(self.pages),) + tuple(self.pages[0].shape)
+
+        self.ndim = len(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+
+        if not isinstance(index, tuple):
+            index = (index,)
+
+        if len(self.pages) == 1:
+            return _read_page(self.pages[0], index)
+
+        pageIndex, rest = index[0], index[1:]
+
+        if isinstance(pageIndex, (int, np.integer)):
+            return _read_page(self.pages[int(pageIndex)], rest)
+
+        pageNumbers = np.arange(self.shape[0])[pageIndex]
+
+        if pageNumbers.size == 0:
+            return np.zeros((0,) + _read_page(self.pages[0], rest).shape,
+                            dtype=self.dtype)
+
+        return np.stack([_read_page(self.pages[k], rest)
+                         for k in pageNumbers])
+
+    def close(self):
+        self.tiffFile.close()
+
+
+def _open_tiff(path, series):
+
+    import tifffile
+
+    try:
+        stack = tifffile.memmap(path, series=series, mode="r")
+    except ValueError:
+        # Compressed or non-contiguous, so cannot be mapped directly.
+        return TiffPageStack(tifffile.TiffFile(path), series)
+
+    return stack
+
+
+def _first_dataset(h5File):
+
+    found = []
+
+    def visit(name, item):
+        if not found and hasattr(item, "shape"):
+            found.append(name)
+
+    h5File.visititems(visit)
+
+    if not found:
+        raise ValueError("No dataset found in HDF5 file.")
+
+    return found[0]
+
+
+def _open_hdf5(path, dataset):
+
+    import h5py
+
+    h5File = h5py.File(path, "r")
+
+    if dataset is None:
+        dataset = _first_dataset(h5File)
+
+    data = h5File[dataset]
+    offset = data.id.get_offset()
+
+    # Contiguous, uncompressed datasets sit in one block of the file, which
+    # can be mapped directly. Chunked datasets are sliced through h5py,
+    # which only reads the chunks a slice touches.
+
+    if data.chunks is None and offset is not None:
+        stack = np.memmap(path, dtype=data.dtype, mode="r", offset=offset,
+                          shape=data.shape)
+        h5File.close()
+        return stack
+
+    return data
+
+
+def open_stack(path, series=0, dataset=None):
+
+    name = str(path).lower()
+
+    if name.endswith(TIFF_SUFFIXES):
+        return _open_tiff(path, series)
+
+    if name.endswith(HDF5_SUFFIXES):
+        return _open_hdf5(path, dataset)
+
+    raise ValueError("Unsupported file type: " + str(path))
+
+
+def read_page(stack, index=0):
+
+    # Returns one 2-D page. Single images are their own only page.
+
+    if stack.ndim == 2:
+        if index != 0:
+            raise IndexError("Single image has only page 0.")
+        return stack[:, :]
+
+    return stack[index]
+
+
+def read_tile(stack, y, x, height, width, page=0):
+
+    if stack.ndim == 2:
+        if page != 0:
+            raise IndexError("Single image has only page 0.")
+        return stack[y:y+height, x:x+width]
+
+    # Slice page and tile together, so chunked sources read only the tile.
+
+    return stack[page, y:y+height, x:x+width]
+
+
+def iter_tiles(stack, tileSize, pages=None):
+
+    # Yields (page, y, x, tile) over every page, row by row. Edge tiles are
+    # smaller when the image is not a multiple of tileSize.
+
+    if stack.ndim == 2:
+        numPages = 1
+        rows, cols = stack.shape
+    else:
+        numPages = stack.shape[0]
+        rows, cols = stack.shape[-2:]
+
+    if pages is None:
+        pages = range(numPages)
+
+    for page in pages:
+
+        for y in range(0, rows, tileSize):
+
+            for x in range(0, cols, tileSize):
+
+                yield page, y, x, read_tile(stack, y, x, tileSize, tileSize,
+                                            page)
@@ -0,0 +1,506 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Builds GLCM, GLRLM, GLDM and NGTDM tile by tile, for whole-slide images too
+large to hold at once. Accumulators of separate tiles, e.g. from parallel
+workers, merge into exactly the matrix of the whole image.
+
+INPUT: Tiles of an already quantized image, each with a halo of the pixels
+    around it.
+OUTPIT: Matrix of the whole image in form of Numpy array, as from the
+    single pass builders.
+
+ARGUMENTS:
+    numLevels - Number of gray levels. Determines size of each matrix.
+
+    GLCMAccumulator - offsets and distances as for calc_glcm_multi.
+    GLRLMAccumulator - angles and ignoreBackground as for calc_glrlm_multi.
+    GLDMAccumulator - alpha and radius as for calc_gldm.
+    NGTDMAccumulator - ignoreBackground and distance as for calc_ngtdm.
+
+Each accumulator has:
+    halo - Pixels of halo a tile needs on each side.
+    update(tile, halo, origin) - Adds a tile. tile is the tile with its
+        halo, halo is the thickness of the halo on each side, as an int or
+        (top, bottom, left, right), and origin is the (y, x) of the first
+        pixel inside the halo in the whole image. On each side the halo must
+        be at least the accumulator's halo, or reach the image edge.
+    merge(other) - Adds another accumulator with the same settings.
+    result() - The matrix of every tile added so far.
+
+iter_tiles(arr, tileSize, halo) splits an image (or a memory map) into
+tiles with the right halos, yielding (tile, halo, origin).
+
+Tiles are counted by their pixels inside the halo only. A GLCM pair belongs
+to the tile holding its first pixel, and the halo supplies the neighbours
+of pixels at the seams, so no pair or neighbourhood is counted twice or
+dropped. Runs can cross any number of tiles, so GLRLM runs that reach the
+edge of a tile and continue into the halo are kept as open segments, with
+their place in the whole image, and joined across tiles by result().
+
+Counts are kept as integers, so tiles add up exactly in any order. The
+NGTDM differences are summed as whole numbers per neighbourhood size, and
+only divided out by result(), so they match calc_ngtdm to rounding.
+"""
+
+import numpy as np
+
+from dev.lib.matrixCalc.matrixGLCM import GLCM_OFFSETS, _count_pairs
+from dev.lib.matrixCalc.matrixGLRLM import _line_sequence, _run_lengths
+from dev.lib.matrixCalc.matrixGLDM import calc_dependence_counts
+from dev.lib.matrixCalc.matrixNGTDM import _window_sums, _window_counts
+from dev.lib.matrixCalc.countTypes import count_dtype, as_counts
+from dev.lib.matrixCalc.angleOffsets import angle_to_degrees
+
+
+def _halo_sides(halo):
+
+    if np.isscalar(halo):
+        return (int(halo),)*4
+
+    top, bottom, left, right = (int(side) for side in halo)
+
+    return top, bottom, left, right
+
+
+def _split_tile(tile, halo):
+
+    # The tile and the slice of it inside the halo.
+
+    tile = np.asarray(tile).astype(np.intp, copy=False)
+    top, bottom, left, right = _halo_sides(halo)
+
+    if min(top, bottom, left, right) < 0:
+        raise ValueError("Halo cannot be negative.")
+
+    rows, cols = tile.shape
+
+    if top + bottom > rows or left + right > cols:
+        raise ValueError("Halo is larger than the tile.")
+
+    core = (slice(top, rows - bottom), slice(left, cols - right))
+
+    return tile, core
+
+
+def iter_tiles(arr, tileSize, halo):
+
+    # Tiles of tileSize pixels (fewer at the right and bottom edges), each
+    # with up to halo pixels around it, clipped at the image edges.
+
+    rows, cols = arr.shape
+
+    for y0 in range(0, rows, tileSize):
+
+        for x0 in range(0, cols, tileSize):
+
+            y1 = min(y0 + tileSize, rows)
+            x1 = min(x0 + tileSize, cols)
+
+            top = min(halo, y0)
+            bottom = min(halo, rows - y1)
+            left = min(halo, x0)
+            right = min(halo, cols - x1)
+
+            tile = np.asarray(arr[y0-top:y1+bottom, x0-left:x1+right])
+
+            yield tile, (top, bottom, left, right), (y0, x0)
+
+
+def _check_merge(first, second, settings):
+
+    if type(first) is not type(second) or not all(
+            np.array_equal(getattr(first, name), getattr(second, name))
+            for name in settings):
+        raise ValueError("Only accumulators with the same settings merge.")
+
+
+class GLCMAccumulator:
+
+    def __init__(self, numLevels, offsets=tuple(GLCM_OFFSETS.values()),
+                 distances=(1,)):
+
+        self.numLevels = numLevels
+        self.offsets = [tuple(offset) for offset in offsets]
+        self.distances = list(distances)
+
+        self.halo = max(max(abs(dy), abs(dx))*distance
+                        for dy, dx in self.offsets
+                        for distance in self.distances)
+
+        # Pair counts in one direction only. result() adds the transpose.
+
+        self.counts = np.zeros((len(self.distances)*len(self.offsets),
+                                numLevels, numLevels), dtype=np.int64)
+
+    def update(self, tile, halo=0, origin=(0, 0)):
+
+        tile, (coreRows, coreCols) = _split_tile(tile, halo)
+
+        rows, cols = tile.shape
+
+        k = 0
+
+        for distance in self.distances:
+
+            for dy, dx in self.offsets:
+
+                dy, dx = dy*distance, dx*distance
+
+                # First pixels inside the halo whose partner is in the tile.
+
+                y0 = max(coreRows.start, -dy)
+                y1 = min(coreRows.stop, rows - dy)
+                x0 = max(coreCols.start, -dx)
+                x1 = min(coreCols.stop, cols - dx)
+
+                if y0 < y1 and x0 < x1:
+                    self.counts[k] += _count_pairs(
+                        tile[y0:y1, x0:x1], tile[y0+dy:y1+dy, x0+dx:x1+dx],
+                        self.numLevels
+                    )
+
+                k += 1
+
+        return self
+
+    def merge(self, other):
+
+        _check_merge(self, other, ("numLevels", "offsets", "distances"))
+
+        self.counts += other.counts
+
+        return self
+
+    def result(self):
+        return as_counts(self.counts + self.counts.transpose(0, 2, 1),
+                         2*self.counts.sum())
+
+
+# (dy, dx) step along the lines of each GLRLM angle, as laid out by
+# _line_sequence.
+
+_RUN_STEPS = {0: (0, 1), 45: (-1, 1), 90: (1, 0), 135: (1, 1)}
+
+# Complete runs are kept packed as level*RUN_CODE + length.
+
+RUN_CODE = 2**32
+
+
+def _line_place(degrees, ys, xs):
+
+    # Line of the whole image a pixel lies on, and its place along it.
+
+    if degrees == 0:
+        return ys, xs
+
+    if degrees == 90:
+        return xs, ys
+
+    if degrees == 45:
+        return xs + ys, xs
+
+    return xs - ys, ys
+
+
+def _continues(tile, core, ys, xs, levels):
+
+    # Whether the pixels at ys, xs lie in the halo and have the given levels.
+    # Pixels inside the core are never checked, as runs already end there.
+
+    rows, cols = tile.shape
+    coreRows, coreCols = core
+
+    inHalo = ((ys >= 0) & (ys < rows) & (xs >= 0) & (xs < cols)
+              & ((ys < coreRows.start) | (ys >= coreRows.stop)
+                 | (xs < coreCols.start) | (xs >= coreCols.stop)))
+
+    same = np.zeros(levels.size, dtype=bool)
+    same[inHalo] = tile[ys[inHalo], xs[inHalo]] == levels[inHalo]
+
+    return same
+
+
+class GLRLMAccumulator:
+
+    def __init__(self, numLevels,
+                 angles=(0, np.pi/4, np.pi/2, np.pi*(135/180)),
+                 ignoreBackground=True):
+
+        self.numLevels = numLevels
+        self.angles = list(angles)
+        self.ignoreBackground = ignoreBackground
+
+        self.halo = 1
+
+        self._degrees = [angle_to_degrees(angle) for angle in self.angles]
+
+        # Per angle, the distinct complete runs, as level*RUN_CODE + length,
+        # with their counts, and the open segments as columns of (level,
+        # line, start, end, openStart, openEnd).
+
+        self.runs = [(np.zeros(0, dtype=np.int64),
+                      np.zeros(0, dtype=np.int64)) for _ in self.angles]
+        self.segments = [np.zeros((0, 6), dtype=np.int64)
+                         for _ in self.angles]
+
+    def _add_runs(self, a, codes, counts):
+
+        codes, index = np.unique(np.concatenate([self.runs[a][0], codes]),
+                                 return_inverse=True)
+
+        self.runs[a] = (codes, np.bincount(
+            index.ravel(), weights=np.concatenate([self.runs[a][1], counts]),
+            minlength=codes.size
+        ).astype(np.int64))
+
+    def update(self, tile, halo=0, origin=(0, 0)):
+
+        tile, core = _split_tile(tile, halo)
+        coreRows, coreCols = core
+
+        levels = tile[core]
+
+        if levels.size == 0:
+            return self
+
+        # Tile coordinates of every pixel of the core, laid out as its values.
+
+        coreYs, coreXs = np.indices(levels.shape)
+        coreYs = coreYs + coreRows.start
+        coreXs = coreXs + coreCols.start
+
+        for a, degrees in enumerate(self._degrees):
+
+            values, lineEnds = _line_sequence(levels, degrees)
+
+            runLevels, runLengths = _run_lengths(values, lineEnds)
+
+            runEnds = np.cumsum(runLengths) - 1
+            runStarts = runEnds - runLengths + 1
+
+            ys = _line_sequence(coreYs, degrees)[0]
+            xs = _line_sequence(coreXs, degrees)[0]
+
+            dy, dx = _RUN_STEPS[degrees]
+
+            # A run is open at either end if the next pixel along the line
+            # lies in the halo and has the same level.
+
+            openStart = _continues(tile, core, ys[runStarts] - dy,
+                                   xs[runStarts] - dx, runLevels)
+            openEnd = _continues(tile, core, ys[runEnds] + dy,
+                                 xs[runEnds] + dx, runLevels)
+
+            isOpen = openStart | openEnd
+
+            codes, counts = np.unique(runLevels[~isOpen]*RUN_CODE
+                                      + runLengths[~isOpen],
+                                      return_counts=True)
+
+            self._add_runs(a, codes, counts)
+
+            line, start = _line_place(degrees,
+                                      ys[runStarts[isOpen]] + origin[0]
+                                      - coreRows.start,
+                                      xs[runStarts[isOpen]] + origin[1]
+                                      - coreCols.start)
+
+            self.segments[a] = np.concatenate([self.segments[a], np.stack([
+                runLevels[isOpen], line, start,
+                start + runLengths[isOpen] - 1,
+                openStart[isOpen], openEnd[isOpen]
+            ], axis=1).astype(np.int64)])
+
+        return self
+
+    def merge(self, other):
+
+        _check_merge(self, other, ("numLevels", "_degrees",
+                                   "ignoreBackground"))
+
+        for a in range(len(self.angles)):
+            self._add_runs(a, *other.runs[a])
+            self.segments[a] = np.concatenate([self.segments[a],
+                                               other.segments[a]])
+
+        return self
+
+    def _joined_runs(self, a):
+
+        # Complete runs, with the open segments joined end to end along
+        # each line of the whole image.
+
+        codes, counts = self.runs[a]
+        segments = self.segments[a]
+
+        levels = np.repeat(codes//RUN_CODE, counts)
+        lengths = np.repeat(codes % RUN_CODE, counts)
+
+        if len(segments):
+
+            level, line, start, end, openStart, openEnd = segments[
+                np.lexsort((segments[:, 2], segments[:, 1]))
+            ].T
+
+            joined = np.zeros(level.size, dtype=bool)
+            joined[1:] = ((line[1:] == line[:-1]) & (start[1:] == end[:-1] + 1)
+                          & (openEnd[:-1] == 1) & (openStart[1:] == 1))
+
+            chain = np.cumsum(~joined) - 1
+
+            levels = np.concatenate([levels, level[~joined]])
+            lengths = np.concatenate([lengths, np.bincount(
+                chain, weights=end - start + 1
+            ).astype(np.int64)])
+
+        return levels, lengths
+
+    def result(self):
+
+        runs = []
+
+        for a in range(len(self.angles)):
+
+            levels, lengths = self._joined_runs(a)
+
+            if self.ignoreBackground:
+                levels, lengths = levels[levels != 0], lengths[levels != 0]
+
+            runs.append((levels, lengths))
+
+        longestRun = max([lengths.max() for _, lengths in runs if
+                          lengths.size] + [1])
+
+        glrlms = np.zeros((len(runs), self.numLevels, longestRun),
+                          dtype=count_dtype(sum(levels.size
+                                                for levels, _ in runs)))
+
+        for a, (levels, lengths) in enumerate(runs):
+
+            counts = np.bincount(levels*longestRun + (lengths-1),
+                                 minlength=self.numLevels*longestRun)
+
+            glrlms[a] = counts.reshape(self.numLevels, longestRun)
+
+        return glrlms
+
+
+class GLDMAccumulator:
+
+    def __init__(self, numLevels, alpha, radius=1):
+
+        self.numLevels = numLevels
+        self.alpha = alpha
+        self.radius = radius
+
+        self.halo = radius
+
+        self.counts = np.zeros((numLevels, (2*radius+1)**2), dtype=np.int64)
+
+    def update(self, tile, halo=0, origin=(0, 0)):
+
+        tile, core = _split_tile(tile, halo)
+
+        numColumns = self.counts.shape[1]
+
+        # Neighbours in the halo are compared like any other. Beyond the
+        # tile is the image edge, as calc_dependence_counts assumes.
+
+        dependentPixels = calc_dependence_counts(tile, self.alpha,
+                                                 self.radius)[core]
+
+        self.counts += np.bincount(
+            (tile[core]*numColumns + dependentPixels).ravel(),
+            minlength=self.counts.size
+        ).reshape(self.counts.shape)
+
+        return self
+
+    def merge(self, other):
+
+        _check_merge(self, other, ("numLevels", "alpha", "radius"))
+
+        self.counts += other.counts
+
+        return self
+
+    def result(self):
+        return as_counts(self.counts, self.counts.sum())
+
+
+class NGTDMAccumulator:
+
+    def __init__(self, numLevels, ignoreBackground, distance=1):
+
+        self.numLevels = numLevels
+        self.ignoreBackground = ignoreBackground
+        self.distance = distance
+
+        self.halo = distance
+
+        # Differences are kept as whole numbers, |count*level - sum|, per
+        # level and neighbourhood size, so tiles add up exactly in any order.
+        # result() divides by the neighbourhood sizes.
+
+        self.levelCounts = np.zeros(numLevels, dtype=np.int64)
+        self.scaledDiffs = np.zeros((numLevels, (2*distance+1)**2),
+                                    dtype=np.int64)
+        self.totalSize = 0
+
+    def update(self, tile, halo=0, origin=(0, 0)):
+
+        tile, core = _split_tile(tile, halo)
+
+        if tile.size == 0:
+            return self
+
+        neighbourSums = (_window_sums(tile, self.distance) - tile)[core]
+        neighbourCounts = (_window_counts(tile.shape, self.distance) - 1)[core]
+
+        levels = tile[core]
+
+        counted = neighbourCounts > 0
+
+        if self.ignoreBackground:
+            counted &= levels != 0
+
+        sizes = neighbourCounts[counted]
+
+        self.levelCounts += np.bincount(levels[counted],
+                                        minlength=self.numLevels)
+        self.scaledDiffs += np.bincount(
+            levels[counted]*self.scaledDiffs.shape[1] + sizes,
+            weights=np.abs(sizes*levels[counted] - neighbourSums[counted]),
+            minlength=self.scaledDiffs.size
+        ).astype(np.int64).reshape(self.scaledDiffs.shape)
+        self.totalSize += levels.size
+
+        return self
+
+    def merge(self, other):
+
+        _check_merge(self, other, ("numLevels", "ignoreBackground",
+                                   "distance"))
+
+        self.levelCounts += other.levelCounts
+        self.scaledDiffs += other.scaledDiffs
+        self.totalSize += other.totalSize
+
+        return self
+
+    def result(self):
+
+        ngtdm = np.zeros((self.numLevels, 3))
+
+        ngtdm[:, 0] = self.levelCounts
+
+        if self.totalSize:
+            ngtdm[:, 1] = self.levelCounts/self.totalSize
+
+        sizes = np.arange(1, self.scaledDiffs.shape[1])
+
+        ngtdm[:, 2] = (self.scaledDiffs[:, 1:]/sizes).sum(1)
+
+        return ngtdm
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Converts the angles the GLCM and GLRLM builders take into degrees and
+(dy, dx) pixel steps, shared so every builder reads angles the same way.
+
+INPUT: Angle in radians.
+OUTPIT: Angle in degrees, or (dy, dx) step to the neighbouring pixel.
+
+ARGUMENTS:
+    angle - 0, pi/4, pi/2 or 3*pi/4. Compared with a tolerance, as angles
+        are usually built from np.pi.
+
+ANGLE_OFFSETS maps each angle, in degrees, to its step. GLCMs are symmetric
+and runs read the same both ways, so the opposite step gives the same
+matrix.
+"""
+
+import numpy as np
+
+
+# (dy, dx) step to the neighbouring pixel for each angle, in degrees.
+
+ANGLE_OFFSETS = {
+    0: (0, 1),  # Right
+    45: (-1, 1),  # Above-Right
+    90: (-1, 0),  # Above
+    135: (-1, -1)  # Above-Left
+}
+
+
+def angle_to_degrees(angle):
+
+    for degrees in ANGLE_OFFSETS:
+        if np.isclose(angle, np.deg2rad(degrees)):
+            return degrees
+
+    raise ValueError("Angle must be 0, pi/4, pi/2 or 3*pi/4.")
+
+
+def angle_to_offset(angle):
+
+    return ANGLE_OFFSETS[angle_to_degrees(angle)]
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Registry of the kernels behind the sequential parts of the matrix builders,
+so the vectorized NumPy kernels and the compiled scalar kernels can be
+swapped and compared.
+
+INPUT: Backend and kernel names.
+OUTPIT: Kernel function.
+
+ARGUMENTS:
+    name - Kernel name:
+        "run_lengths" - (values, lineEnds) to (runLevels, runLengths), as
+            used by every GLRLM builder.
+        "zones" - (arr, mask, ignoreBackground, connectivity) to
+            (zoneLevels, zoneSizes), as used by calc_glszm.
+    backend - Backend name. (Default = None, the backend set by set_backend)
+
+BACKENDS:
+    numpy - Whole-array kernels of matrixGLRLM and matrixGLSZM. (Default)
+    numba - Scalar kernels of jitKernels, compiled with Numba's njit and
+        run in parallel across image lines and gray levels. Without Numba
+        installed they run as plain Python, giving the same matrices slowly.
+        NUMBA_AVAILABLE in jitKernels tells which.
+
+Kernels are added with the register_kernel(backend, name) decorator.
+"""
+
+BACKENDS = {}
+
+_settings = {"backend": "numpy"}
+
+
+def register_kernel(backend, name):
+
+    def register(kernel):
+        BACKENDS.setdefault(backend, {})[name] = kernel
+        return kernel
+
+    return register
+
+
+def _load_backends():
+
+    # Kernels register themselves when their modules are imported. Imported
+    # here rather than at the top, as the matrix modules import this one.
+
+    import dev.lib.matrixCalc.matrixGLRLM  # noqa: F401
+    import dev.lib.matrixCalc.matrixGLSZM  # noqa: F401
+    import dev.lib.matrixCalc.jitKernels  # noqa: F401
+
+
+def available_backends():
+
+    _load_backends()
+
+    return sorted(BACKENDS)
+
+
+def set_backend(backend):
+
+    if backend not in available_backends():
+        raise ValueError("Backend must be one of " +
+                         ", ".join(available_backends()) + ".")
+
+    _settings["backend"] = backend
+
+
+def get_kernel(name, backend=None):
+
+    if backend is None:
+        backend = _settings["backend"]
+
+    if backend not in available_backends():
+        raise ValueError("Backend must be one of " +
+                         ", ".join(available_backends()) + ".")
+
+    return BACKENDS[backend][name]
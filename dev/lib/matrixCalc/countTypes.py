@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Integer types the matrix builders count in. Matrices hold counts, so they
+are built as unsigned integers rather than float64, halving their memory.
+The metric calculators convert them to float when normalizing.
+
+INPUT: Largest count any entry of a matrix could reach.
+OUTPIT: Smallest unsigned integer type that holds it.
+
+ARGUMENTS:
+    maxCount - Upper bound on any entry, e.g. the number of pixels, or
+        twice that for a GLCM, which counts every pair both ways.
+
+COUNT_DTYPE (uint32) is used unless maxCount could overflow it, which takes
+an image of over four billion pixels. Then uint64 is used.
+"""
+
+import numpy as np
+
+
+COUNT_DTYPE = np.uint32
+
+
+def count_dtype(maxCount):
+
+    if maxCount > np.iinfo(COUNT_DTYPE).max:
+        return np.uint64
+
+    return COUNT_DTYPE
+
+
+def as_counts(counts, maxCount):
+
+    # Counts from np.bincount and the like, which are intp, cast to the
+    # count type.
+
+    return np.asarray(counts).astype(count_dtype(maxCount), copy=False)
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Scalar kernels for run tracing (GLRLM) and zone flood fill (GLSZM),
+compiled with Numba when it is installed. Registered as the "numba" backend
+(see dev.lib.matrixCalc.backends).
+
+INPUT: Line sequence, or image, in form of Numpy arrays.
+OUTPIT: Runs, or zones, as arrays of levels and lengths (or sizes).
+
+ARGUMENTS:
+    jit_run_lengths - values and lineEnds as from _line_sequence.
+    jit_zones - arr, mask, ignoreBackground and connectivity as for
+        calc_glszm.
+
+Both return the same runs and zones as the NumPy kernels, up to order.
+
+Outputs are written into buffers allocated once per call at their largest
+possible size (a line has at most as many runs as pixels, and zone sizes
+are stored at the first pixel of each zone), and the flood fill keeps its
+queue in a typed array rather than a deque of tuples. Lines are traced in
+parallel, as are gray levels, whose zones never share pixels.
+
+Numba is optional. Without it, njit leaves the kernels as plain Python and
+prange is range, so the backend still runs, slowly.
+"""
+
+import numpy as np
+
+from dev.lib.matrixCalc.backends import register_kernel
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+
+except ImportError:
+
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+
+        if args and callable(args[0]):
+            return args[0]
+
+        return lambda kernel: kernel
+
+    prange = range
+
+
+# (dy, dx) steps to every neighbour a zone grows through.
+
+ZONE_STEPS = {
+    4: np.array([(-1, 0), (0, -1), (0, 1), (1, 0)], dtype=np.intp),
+    8: np.array([(-1, -1), (-1, 0), (-1, 1), (0, -1),
+                 (0, 1), (1, -1), (1, 0), (1, 1)], dtype=np.intp)
+}
+
+
+@njit(parallel=True, cache=True)
+def _trace_runs(values, lineStarts, lineEnds, runLevels, runLengths,
+                numRuns):
+
+    # Runs of each line are written from the line's own first position, so
+    # lines never write over each other.
+
+    for line in prange(lineStarts.size):
+
+        start = lineStarts[line]
+        end = lineEnds[line]
+
+        k = start
+        runStart = start
+
+        for t in range(start+1, end+2):
+
+            if t > end or values[t] != values[runStart]:
+                runLevels[k] = values[runStart]
+                runLengths[k] = t - runStart
+                k += 1
+                runStart = t
+
+        numRuns[line] = k - start
+
+
+@njit(parallel=True, cache=True)
+def _gather_runs(lineStarts, runStarts, numRuns, runLevels, runLengths,
+                 outLevels, outLengths):
+
+    # Packs the runs of every line together, in line order.
+
+    for line in prange(lineStarts.size):
+
+        for k in range(numRuns[line]):
+            outLevels[runStarts[line] + k] = runLevels[lineStarts[line] + k]
+            outLengths[runStarts[line] + k] = runLengths[lineStarts[line] + k]
+
+
+@register_kernel("numba", "run_lengths")
+def jit_run_lengths(values, lineEnds):
+
+    values = np.ascontiguousarray(values)
+    lineEnds = np.asarray(lineEnds, dtype=np.intp)
+
+    lineStarts = np.empty(lineEnds.size, dtype=np.intp)
+    lineStarts[:1] = 0
+    lineStarts[1:] = lineEnds[:-1] + 1
+
+    runLevels = np.empty(values.size, dtype=values.dtype)
+    runLengths = np.empty(values.size, dtype=np.intp)
+    numRuns = np.zeros(lineEnds.size, dtype=np.intp)
+
+    _trace_runs(values, lineStarts, lineEnds, runLevels, runLengths,
+                numRuns)
+
+    runStarts = np.cumsum(numRuns) - numRuns
+
+    outLevels = np.empty(numRuns.sum(), dtype=values.dtype)
+    outLengths = np.empty(numRuns.sum(), dtype=np.intp)
+
+    _gather_runs(lineStarts, runStarts, numRuns, runLevels, runLengths,
+                 outLevels, outLengths)
+
+    return outLevels, outLengths
+
+
+@njit(parallel=True, cache=True)
+def _flood_zones(flat, counted, cols, order, levelStarts, steps, zoneSizes):
+
+    # order holds the counted pixels grouped by gray level, levelStarts the
+    # first of each level. Each level is filled separately, and only marks
+    # its own pixels as visited.
+
+    rows = flat.size // cols
+
+    visited = np.zeros(flat.size, dtype=np.bool_)
+
+    for g in prange(levelStarts.size - 1):
+
+        first = levelStarts[g]
+        last = levelStarts[g+1]
+
+        queue = np.empty(last - first, dtype=np.intp)
+
+        for s in range(first, last):
+
+            seed = order[s]
+
+            if visited[seed]:
+                continue
+
+            level = flat[seed]
+
+            visited[seed] = True
+            queue[0] = seed
+            top = 1
+            size = 0
+
+            while top > 0:
+
+                top -= 1
+                pixel = queue[top]
+                size += 1
+
+                y = pixel // cols
+                x = pixel % cols
+
+                for k in range(steps.shape[0]):
+
+                    ny = y + steps[k, 0]
+                    nx = x + steps[k, 1]
+
+                    if ny < 0 or ny >= rows or nx < 0 or nx >= cols:
+                        continue
+
+                    neighbour = ny*cols + nx
+
+                    if (counted[neighbour] and not visited[neighbour]
+                            and flat[neighbour] == level):
+                        visited[neighbour] = True
+                        queue[top] = neighbour
+                        top += 1
+
+            zoneSizes[seed] = size
+
+
+@register_kernel("numba", "zones")
+def jit_zones(arr, mask, ignoreBackground, connectivity):
+
+    arr = np.asarray(arr).astype(np.intp, copy=False)
+
+    counted = np.ones(arr.shape, dtype=bool) if mask is None else mask.copy()
+
+    if ignoreBackground:
+        counted &= arr != 0
+
+    flat = np.ascontiguousarray(arr).ravel()
+    counted = counted.ravel()
+
+    pixels = np.flatnonzero(counted)
+
+    if pixels.size == 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+
+    order = pixels[np.argsort(flat[pixels], kind="stable")]
+
+    _, levelStarts = np.unique(flat[order], return_index=True)
+    levelStarts = np.append(levelStarts, order.size).astype(np.intp)
+
+    zoneSizes = np.zeros(flat.size, dtype=np.intp)
+
+    _flood_zones(flat, counted, arr.shape[1], order, levelStarts,
+                 ZONE_STEPS[connectivity], zoneSizes)
+
+    seeds = np.flatnonzero(zoneSizes)
+
+    return flat[seeds], zoneSizes[seeds]
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Constructs the GLCM, GLRLM, GLSZM, GLDM and NGTDM of every label of a label
+image at once, for per-cell texture.
+
+INPUT: Image and label image in form of Numpy arrays.
+OUTPIT: Stack of matrices in form of Numpy array, one per label (a list of
+    scipy.sparse matrices for the GLSZM).
+
+ARGUMENTS:
+    arr - Image in form of array, e.g. the levels from quantize_image.
+    labels - Integer label image the shape of arr. Label 0 is background
+        and is left out.
+    numLevels - Number of gray levels. Determines size of each matrix.
+
+    calc_glcm_by_label - offsets and distances as for calc_glcm_multi.
+    calc_glrlm_by_label - angles, ignoreBackground and backend as for
+        calc_glrlm_multi.
+    calc_glszm_by_label - ignoreBackground and connectivity as for
+        calc_glszm.
+    calc_gldm_by_label - alpha and radius as for calc_gldm.
+    calc_ngtdm_by_label - ignoreBackground and distance as for calc_ngtdm.
+
+label_index(labels) gives the label values, in the order of the first axis
+of every stack, and the label index of every pixel (-1 for background).
+
+Each pixel, pair, run or zone is coded by its label index as well as its
+gray level, so a single bincount over the whole image scatters the counts
+of every label into its own matrix. Pixels of one label are never paired
+with, or counted as neighbours of, pixels of another. Every matrix matches
+the single label builders given the mask labels == label.
+
+The GLRLM stack shares its run length axis, which is trimmed to the longest
+run of any label. calc_glszm_by_label instead returns a list of sparse
+GLSZMs, one per label, each as wide as its own largest zone, as for
+calc_glszm(..., sparse=True). A single large zone would otherwise widen the
+matrix of every label.
+"""
+
+import numpy as np
+import scipy.sparse
+from scipy.sparse.csgraph import connected_components
+
+from dev.lib.matrixCalc.matrixGLCM import _shifted_pairs
+from dev.lib.matrixCalc.matrixGLRLM import _line_sequence
+from dev.lib.matrixCalc.backends import get_kernel
+from dev.lib.matrixCalc.countTypes import count_dtype, as_counts
+from dev.lib.matrixCalc.angleOffsets import angle_to_degrees
+
+
+def label_index(labels):
+
+    labels = np.asarray(labels)
+
+    labelValues, index = np.unique(labels, return_inverse=True)
+    index = index.reshape(labels.shape)
+
+    # Background is moved to -1, and the remaining labels counted from 0.
+
+    if labelValues.size and labelValues[0] == 0:
+        labelValues = labelValues[1:]
+        index = index - 1
+
+    return labelValues, index.astype(np.intp)
+
+
+def _pad_labels(index, radius):
+
+    # Pads with -1, so neighbours outside the image are background.
+
+    return np.pad(index, radius, constant_values=-1)
+
+
+def calc_glcm_by_label(arr, labels, offsets, distances, numLevels):
+
+    arr = np.asarray(arr).astype(np.intp, copy=False)
+    labelValues, index = label_index(labels)
+
+    numLabels = labelValues.size
+    offsets = list(offsets)
+    distances = list(distances)
+
+    glcms = np.zeros((numLabels, len(distances)*len(offsets),
+                      numLevels, numLevels), dtype=count_dtype(2*arr.size))
+
+    k = 0
+
+    for distance in distances:
+
+        for dy, dx in offsets:
+
+            first, second = _shifted_pairs(arr, dy*distance, dx*distance)
+            firstLabel, secondLabel = _shifted_pairs(index, dy*distance,
+                                                     dx*distance)
+
+            sameLabel = (firstLabel == secondLabel) & (firstLabel >= 0)
+
+            packed = (firstLabel[sameLabel]*numLevels*numLevels
+                      + first[sameLabel]*numLevels + second[sameLabel])
+
+            counts = np.bincount(packed,
+                                 minlength=numLabels*numLevels*numLevels)
+            counts = counts.reshape(numLabels, numLevels, numLevels)
+
+            glcms[:, k] = counts + counts.transpose(0, 2, 1)
+
+            k += 1
+
+    return glcms
+
+
+def calc_glrlm_by_label(arr, labels, angles, numLevels,
+                        ignoreBackground=True, backend=None):
+
+    arr = np.asarray(arr).astype(np.intp, copy=False)
+    labelValues, index = label_index(labels)
+
+    numLabels = labelValues.size
+
+    # Label and level together, so a run ends at a change of either.
+    # Background is -1, and its runs are dropped.
+
+    keys = np.where(index >= 0, index*numLevels + arr, -1)
+
+    runLengthsKernel = get_kernel("run_lengths", backend)
+
+    runs = []
+
+    for angle in angles:
+
+        runKeys, runLengths = runLengthsKernel(
+            *_line_sequence(keys, angle_to_degrees(angle))
+        )
+
+        counted = runKeys >= 0
+
+        if ignoreBackground:
+            counted &= runKeys % numLevels != 0
+
+        runs.append((runKeys[counted], runLengths[counted]))
+
+    longestRun = max([runLengths.max() for _, runLengths in runs if
+                      runLengths.size] + [1])
+
+    glrlms = np.zeros((numLabels, len(runs), numLevels, longestRun),
+                      dtype=count_dtype(arr.size))
+
+    for k, (runKeys, runLengths) in enumerate(runs):
+
+        counts = np.bincount(runKeys*longestRun + (runLengths-1),
+                             minlength=numLabels*numLevels*longestRun)
+
+        glrlms[:, k] = counts.reshape(numLabels, numLevels, longestRun)
+
+    return glrlms
+
+
+def calc_glszm_by_label(arr, labels, numLevels, ignoreBackground=True,
+                        connectivity=8):
+
+    if connectivity == 4:
+        steps = [(0, 1), (1, 0)]
+    elif connectivity == 8:
+        steps = [(0, 1), (1, -1), (1, 0), (1, 1)]
+    else:
+        raise ValueError("Connectivity must be 4 or 8.")
+
+    arr = np.asarray(arr).astype(np.intp, copy=False)
+    labelValues, index = label_index(labels)
+
+    numLabels = labelValues.size
+
+    keys = np.where(index >= 0, index*numLevels + arr, -1)
+
+    if ignoreBackground:
+        keys[arr == 0] = -1
+
+    # Zones are the connected components of the graph joining neighbouring
+    # pixels of the same label and level, found for every zone at once.
+
+    pixels = np.arange(keys.size).reshape(keys.shape)
+
+    firstPixels = []
+    secondPixels = []
+
+    for dy, dx in steps:
+
+        first, second = _shifted_pairs(keys, dy, dx)
+        joined = (first == second) & (first >= 0)
+
+        firstPixel, secondPixel = _shifted_pairs(pixels, dy, dx)
+
+        firstPixels.append(firstPixel[joined])
+        secondPixels.append(secondPixel[joined])
+
+    firstPixels = np.concatenate(firstPixels)
+    secondPixels = np.concatenate(secondPixels)
+
+    graph = scipy.sparse.coo_matrix(
+        (np.ones(firstPixels.size, dtype=bool), (firstPixels, secondPixels)),
+        shape=(keys.size, keys.size)
+    )
+
+    _, zones = connected_components(graph, directed=False)
+
+    counted = keys.ravel() >= 0
+    zones = zones[counted]
+
+    zoneSizes = np.bincount(zones)
+    zoneKeys = np.zeros(zoneSizes.size, dtype=np.intp)
+    zoneKeys[zones] = keys.ravel()[counted]
+
+    zoneKeys = zoneKeys[zoneSizes > 0]
+    zoneSizes = zoneSizes[zoneSizes > 0]
+
+    # Each distinct (label, level, size) is counted once, then split by
+    # label. Every GLSZM is as wide as its own largest zone, so one large
+    # zone does not widen the rest.
+
+    maxRegionSize = np.int64(max(zoneSizes.max(initial=0), 1))
+
+    codes, counts = np.unique(zoneKeys.astype(np.int64)*maxRegionSize
+                              + (zoneSizes-1), return_counts=True)
+    counts = as_counts(counts, arr.size)
+
+    zoneKeys = codes // maxRegionSize
+    zoneSizes = codes % maxRegionSize + 1
+    zoneLabels = zoneKeys // numLevels
+
+    bounds = np.searchsorted(zoneLabels, np.arange(numLabels+1))
+
+    glszms = []
+
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+
+        glszms.append(scipy.sparse.coo_matrix(
+            (counts[start:stop],
+             (zoneKeys[start:stop] % numLevels, zoneSizes[start:stop]-1)),
+            shape=(numLevels, max(zoneSizes[start:stop].max(initial=0), 1))
+        ))
+
+    return glszms
+
+
+def calc_gldm_by_label(arr, labels, alpha, numLevels, radius=1):
+
+    arr = np.asarray(arr).astype(np.intp, copy=False)
+    labelValues, index = label_index(labels)
+
+    numLabels = labelValues.size
+    numColumns = (2*radius+1)**2
+
+    rows, cols = arr.shape
+
+    padded = np.pad(arr, radius)
+    paddedIndex = _pad_labels(index, radius)
+
+    dependentPixels = np.zeros(arr.shape, dtype=np.intp)
+
+    # A neighbour is only dependent if it has the same label.
+
+    for dy in range(-radius, radius+1):
+
+        for dx in range(-radius, radius+1):
+
+            if dy == 0 and dx == 0:
+                continue
+
+            neighbour = padded[radius+dy:radius+dy+rows,
+                               radius+dx:radius+dx+cols]
+            neighbourIndex = paddedIndex[radius+dy:radius+dy+rows,
+                                         radius+dx:radius+dx+cols]
+
+            dependentPixels += ((np.abs(arr - neighbour) <= alpha)
+                                & (neighbourIndex == index))
+
+    inLabel = index >= 0
+
+    codes = ((index*numLevels + arr)*numColumns + dependentPixels)[inLabel]
+
+    gldms = np.bincount(codes, minlength=numLabels*numLevels*numColumns)
+
+    return as_counts(gldms, arr.size).reshape(numLabels, numLevels,
+                                              numColumns)
+
+
+def calc_ngtdm_by_label(arr, labels, numLevels, ignoreBackground=True,
+                        distance=1):
+
+    arr = np.asarray(arr).astype(np.intp, copy=False)
+    labelValues, index = label_index(labels)
+
+    numLabels = labelValues.size
+
+    rows, cols = arr.shape
+
+    padded = np.pad(arr, distance)
+    paddedIndex = _pad_labels(index, distance)
+
+    neighbourSums = np.zeros(arr.shape, dtype=np.intp)
+    neighbourCounts = np.zeros(arr.shape, dtype=np.intp)
+
+    # Neighbourhoods only average pixels of the same label.
+
+    for dy in range(-distance, distance+1):
+
+        for dx in range(-distance, distance+1):
+
+            if dy == 0 and dx == 0:
+                continue
+
+            sameLabel = paddedIndex[distance+dy:distance+dy+rows,
+                                    distance+dx:distance+dx+cols] == index
+
+            neighbourSums += np.where(sameLabel,
+                                      padded[distance+dy:distance+dy+rows,
+                                             distance+dx:distance+dx+cols], 0)
+            neighbourCounts += sameLabel
+
+    counted = (neighbourCounts > 0) & (index >= 0)
+
+    if ignoreBackground:
+        counted &= arr != 0
+
+    keys = index[counted]*numLevels + arr[counted]
+
+    neighbourhoodAverage = neighbourSums[counted]/neighbourCounts[counted]
+    neighbouringGrayDiff = np.abs(arr[counted] - neighbourhoodAverage)
+
+    # p_i is taken over every pixel of the label, as calc_ngtdm does over a
+    # mask.
+
+    labelSizes = np.bincount(index[index >= 0], minlength=numLabels)
+
+    ngtdms = np.zeros((numLabels, numLevels, 3))
+
+    ngtdms[:, :, 0] = np.bincount(
+        keys, minlength=numLabels*numLevels
+    ).reshape(numLabels, numLevels)
+    ngtdms[:, :, 1] = ngtdms[:, :, 0]/np.maximum(labelSizes, 1)[:, None]
+    ngtdms[:, :, 2] = np.bincount(
+        keys, weights=neighbouringGrayDiff, minlength=numLabels*numLevels
+    ).reshape(numLabels, numLevels)
+
+    return ngtdms
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+On-disk cache of built matrices, so a second pass over a dataset only costs
+metric evaluation.
+
+INPUT: Matrix builder and its arguments.
+OUTPIT: The builder's matrices, read from disk when built before.
+
+ARGUMENTS:
+    directory - Folder holding the cache. Created if missing, and safe to
+        share between worker processes.
+    maxBytes - Size budget of the folder. The least recently used entries
+        are deleted once it is exceeded. (Default = 1 GiB)
+
+Usage:
+    cache = MatrixCache("matrix_cache", maxBytes=2**32)
+    glcms = cache.wrap(calc_glcm_multi)(levels, offsets, distances, 8)
+
+Entries are content addressed: the key is a hash of the builder's name and
+every argument it is called with, arrays by their bytes, shape and dtype.
+The quantized levels passed to a builder therefore carry the image and its
+quantization, and angles, bitDepth, alpha, ignoreBackground and the rest
+are keyed by value. CACHE_VERSION is part of every key, and is raised when
+a builder's output changes, so old entries are never read again and age
+out of the budget.
+
+Matrices are stored with np.savez_compressed, one .npz file per entry.
+Dense arrays, scipy sparse matrices and lists of either are supported.
+Reading an entry marks it as recently used.
+
+The cache keeps a running total of its size, so a put does not list the
+folder. The folder is only scanned once the total exceeds maxBytes, when
+entries are deleted down to EVICT_FRACTION of it, or every SCAN_PUTS puts,
+to count entries written by other processes.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+import zipfile
+from functools import wraps
+
+import numpy as np
+import scipy.sparse
+
+
+CACHE_VERSION = 2
+
+# Eviction deletes entries down to this fraction of maxBytes, so the next
+# scan is not due on the next put.
+
+EVICT_FRACTION = 0.9
+
+# Puts between scans of the folder, which pick up entries written by other
+# processes sharing it.
+
+SCAN_PUTS = 1000
+
+
+def _key_value(value):
+
+    # JSON friendly stand-in for an argument. Arrays are replaced by a hash
+    # of their contents.
+
+    if isinstance(value, np.ndarray):
+
+        array = np.ascontiguousarray(value)
+        digest = hashlib.blake2b(array.view(np.uint8).reshape(-1),
+                                 digest_size=20).hexdigest()
+
+        return {"array": digest, "shape": array.shape,
+                "dtype": array.dtype.str}
+
+    if isinstance(value, (list, tuple)):
+        return [_key_value(item) for item in value]
+
+    if isinstance(value, dict):
+        return {str(name): _key_value(item) for name, item in value.items()}
+
+    if isinstance(value, np.generic):
+        return value.item()
+
+    if isinstance(value, float):
+        return repr(value)
+
+    return value
+
+
+def _pack(result):
+
+    # Arrays for np.savez, describing a dense array, a sparse matrix, or a
+    # list of either.
+
+    if isinstance(result, list):
+        arrays = {"kind": np.array("list"), "length": np.array(len(result))}
+        for k, item in enumerate(result):
+            arrays.update({str(k) + "_" + name: value
+                           for name, value in _pack(item).items()})
+        return arrays
+
+    if scipy.sparse.issparse(result):
+        result = result.tocoo()
+        return {"kind": np.array("coo"), "data": result.data,
+                "row": result.row, "col": result.col,
+                "shape": np.array(result.shape)}
+
+    return {"kind": np.array("array"), "array": np.asarray(result)}
+
+
+def _unpack(arrays, prefix=""):
+
+    kind = str(arrays[prefix + "kind"])
+
+    if kind == "list":
+        return [_unpack(arrays, prefix + str(k) + "_")
+                for k in range(int(arrays[prefix + "length"]))]
+
+    if kind == "coo":
+        return scipy.sparse.coo_matrix(
+            (arrays[prefix + "data"],
+             (arrays[prefix + "row"], arrays[prefix + "col"])),
+            shape=tuple(arrays[prefix + "shape"])
+        )
+
+    return arrays[prefix + "array"]
+
+
+def _file_size(path):
+
+    # Size of an entry, or 0 if there is none.
+
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+class MatrixCache:
+
+    def __init__(self, directory, maxBytes=2**30):
+
+        self.directory = str(directory)
+        self.maxBytes = maxBytes
+
+        # Size of the folder as of the last scan, plus what this process has
+        # written since. None until the first scan.
+
+        self._total = None
+        self._puts = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, name, arguments):
+
+        text = json.dumps([CACHE_VERSION, name, _key_value(arguments)],
+                          sort_keys=True)
+
+        return hashlib.blake2b(text.encode(), digest_size=20).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, key):
+
+        # Returns None on a miss. An entry deleted by another process while
+        # being read is a miss too.
+
+        path = self._path(key)
+
+        try:
+            with np.load(path) as arrays:
+                result = _unpack(arrays)
+            os.utime(path)
+        except (OSError, EOFError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+
+        return result
+
+    def put(self, key, result):
+
+        # Written to a temporary file first and renamed into place, so other
+        # processes never read a partial entry.
+
+        handle, temporary = tempfile.mkstemp(suffix=".tmp",
+                                             dir=self.directory)
+
+        try:
+            with os.fdopen(handle, "wb") as file:
+                np.savez_compressed(file, **_pack(result))
+            size = os.path.getsize(temporary)
+            replaced = _file_size(self._path(key))
+            os.replace(temporary, self._path(key))
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+        self._puts += 1
+
+        if self._total is None or self._puts >= SCAN_PUTS:
+            self.evict()
+            return
+
+        self._total += size - replaced
+
+        if self._total > self.maxBytes:
+            self.evict()
+
+    def entries(self):
+
+        # (last use, size, path) of every entry.
+
+        found = []
+
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if not entry.name.endswith(".npz"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, stat.st_size, entry.path))
+
+        return found
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+
+        # Deletes the least recently used entries once the cache is over its
+        # budget, until it is within EVICT_FRACTION of it.
+
+        found = sorted(self.entries())
+        total = sum(size for _, size, _ in found)
+
+        if total > self.maxBytes:
+
+            for _, size, path in found:
+
+                if total <= EVICT_FRACTION*self.maxBytes:
+                    break
+
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+                total -= size
+
+        self._total = total
+        self._puts = 0
+
+    def clear(self):
+
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        self._total = 0
+        self._puts = 0
+
+    def wrap(self, builder, name=None, ignore=("backend",)):
+
+        # The builder, reading from and writing to the cache. Arguments are
+        # bound to the builder's signature, so positional and keyword calls
+        # share entries, and defaults are part of the key. Arguments in
+        # ignore, which do not change the matrices, are left out of it.
+
+        name = name or builder.__module__ + "." + builder.__qualname__
+        signature = inspect.signature(builder)
+
+        @wraps(builder)
+        def cachedBuilder(*args, **kwargs):
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+
+            key = self.key(name, {argument: value for argument, value
+                                  in bound.arguments.items()
+                                  if argument not in ignore})
+
+            result = self.get(key)
+
+            if result is None:
+                result = builder(*args, **kwargs)
+                self.put(key, result)
+
+            return result
+
+        return cachedBuilder
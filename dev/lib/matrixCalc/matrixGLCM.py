@@ -11,91 +11,142 @@ ARGUMENTS:
     arr - Image in form of array.
     angle - Angle of calculation (0, 45, 90, or 135).
     bitDepth - Bitdepth of image. Determines size of GLCM.
+    sparse - If true, returns a scipy.sparse COO matrix holding only the
+        observed level pairs. Use for high bit depths. (Default = False)
+    numLevels - Number of gray levels, e.g. quantInfo["numLevels"] from
+        quantize_image. Overrides bitDepth. (Default = None)
+    mask - ROI mask, as for crop_to_mask. Pairs with either pixel outside
+        the mask are not counted. (Default = None)
+
+calc_glcm_multi computes several GLCMs from a single cast of the image.
+
+ARGUMENTS: 
+    arr - Image in form of array.
+    offsets - List of (dy, dx) steps, e.g. GLCM_OFFSETS.values().
+    distances - List of distances each offset is scaled by.
+    bitDepth - Bitdepth of image. Determines size of GLCM.
+    sparse - If true, returns a list of COO matrices instead. (Default = False)
+    numLevels, mask - As for calc_glcm. (Default = None)
+
+    Returns an array of shape (len(distances)*len(offsets), L, L), ordered
+    distance first, i.e. [(d, offset) for d in distances for offset in offsets].
 """
 import numpy as np
+import scipy.sparse
+
+from dev.lib.matrixCalc.roiMask import crop_to_mask
+from dev.lib.matrixCalc.countTypes import count_dtype, as_counts
+from dev.lib.matrixCalc.angleOffsets import ANGLE_OFFSETS, angle_to_offset
+
+
+# (dy, dx) step to the neighbouring pixel for each angle, in degrees.
+# GLCMs are symmetric, so the opposite step gives the same matrix.
+
+GLCM_OFFSETS = ANGLE_OFFSETS
+
+
+def _shifted_pairs(arr, dy, dx):
+
+    # Returns two equally shaped views of the image, such that each element
+    # of the first is paired with the pixel (dy, dx) away in the second.
+    # Stops are clamped at 0, as a negative stop would count from the end.
+    # A step as long as the image gives two empty views.
+
+    rows, cols = arr.shape
+
+    first = arr[max(0, -dy):max(0, rows-max(0, dy)),
+                max(0, -dx):max(0, cols-max(0, dx))]
+    second = arr[max(0, dy):max(0, rows-max(0, -dy)),
+                 max(0, dx):max(0, cols-max(0, -dx))]
+
+    return first, second
+
+
+def _count_pairs(first, second, numLevels):
+
+    # Packs each (first, second) pair into a single index and counts them
+    # all at once, rather than incrementing the matrix pixel by pixel.
+
+    packed = (first.astype(np.intp, copy=False).ravel()*numLevels
+              + second.astype(np.intp, copy=False).ravel())
+
+    counts = np.bincount(packed, minlength=numLevels*numLevels)
+
+    return counts.reshape(numLevels, numLevels)
+
+
+def _count_pairs_sparse(first, second, numLevels):
+
+    # Same packing as _count_pairs, but only the observed pairs are kept, so
+    # memory does not depend on numLevels. int64 holds 16-bit pairs. Counts
+    # leave room for the transpose to be added.
+
+    packed = (first.astype(np.int64).ravel()*numLevels
+              + second.astype(np.int64).ravel())
+
+    pairs, counts = np.unique(packed, return_counts=True)
 
+    return scipy.sparse.coo_matrix(
+        (as_counts(counts, 2*packed.size),
+         (pairs // numLevels, pairs % numLevels)),
+        shape=(numLevels, numLevels)
+    )
 
-def calc_glcm(arr, angle, bitDepth):
 
-    glcm = np.zeros((2**bitDepth, 2**bitDepth))
+def calc_glcm_multi(arr, offsets, distances, bitDepth, sparse=False,
+                    numLevels=None, mask=None):
 
-    iRange = range(0, arr.shape[0])
-    jRange = range(0, arr.shape[1])
+    if numLevels is None:
+        numLevels = 2**bitDepth
 
-    # Different angles require different comparisons.
-    # Decides which path to take, depending on direction required.
+    # Crop and cast once, shared by every offset.
 
-    if angle == 0:  # 0 Degrees. Compare pixels to Left and Right.
+    arr, mask = crop_to_mask(arr, mask)
+    arr = arr.astype(np.intp, copy=False)
 
-        for i in iRange:
+    offsets = list(offsets)
+    distances = list(distances)
 
-            for j in jRange:
+    # A pair is counted once each way, so no entry exceeds twice the pixels.
 
-                if j == 0:  # Left-Most Edge. Compare to right.
-                    glcm[arr[i][j]][arr[i][j+1]] += 1
-                elif j == arr.shape[1]-1:  # Right-Most Edge. Compare to left.
-                    glcm[arr[i][j]][arr[i][j-1]] += 1
-                else:  # All other pixels. Compare to both left and right.
-                    glcm[arr[i][j]][arr[i][j+1]] += 1
-                    glcm[arr[i][j]][arr[i][j-1]] += 1
+    if sparse:
+        glcms = []
+    else:
+        glcms = np.zeros((len(distances)*len(offsets), numLevels, numLevels),
+                         dtype=count_dtype(2*arr.size))
 
-    elif angle == np.pi/4:  # 45 Degrees. Compare to pixels in the Above-Right and Below-Left
+    k = 0
 
-        for i in iRange:
+    for distance in distances:
 
-            for j in jRange:
+        for dy, dx in offsets:
 
-                if i == 0 and j == 0:  # Topleft Corner. No comparison needed, as out of bounds.
-                    continue
-                # Bottom right corner. No comparison needed, as out of bounds.
-                elif i == arr.shape[0]-1 and j == arr.shape[1]-1:
-                    continue
-                # Top and Right-Most Row and Column. Compare to Below-Left
-                elif i == 0 or j == arr.shape[1]-1:
-                    glcm[arr[i][j]][arr[i+1][j-1]] += 1
-                # Bottom and Left-Most Row and Column. Compare to Above-Right.
-                elif i == arr.shape[0]-1 or j == 0:
-                    glcm[arr[i][j]][arr[i-1][j+1]] += 1
-                # All other pixels. Compare to both Below-Left and Above-Right.
-                else:
-                    glcm[arr[i][j]][arr[i+1][j-1]] += 1
-                    glcm[arr[i][j]][arr[i-1][j+1]] += 1
+            first, second = _shifted_pairs(arr, dy*distance, dx*distance)
 
-    elif angle == np.pi/2:  # 90 Degrees. Compare to Above and Below.
+            if mask is not None:
+                inFirst, inSecond = _shifted_pairs(mask, dy*distance,
+                                                   dx*distance)
+                inROI = inFirst & inSecond
+                first, second = first[inROI], second[inROI]
 
-        for i in iRange:
+            # Every neighbouring pair is counted in both directions, so the
+            # GLCM is the pair counts plus their transpose.
 
-            for j in jRange:
+            if sparse:
+                counts = _count_pairs_sparse(first, second, numLevels)
+                glcms.append((counts + counts.T).tocoo())
+            else:
+                counts = _count_pairs(first, second, numLevels)
+                glcms[k] = counts + counts.T
 
-                if i == 0:  # Top Edge. Compare to Below.
-                    glcm[arr[i][j]][arr[i+1][j]] += 1
-                elif i == arr.shape[1]-1:  # Bottom Edge. Compare to Above.
-                    glcm[arr[i][j]][arr[i-1][j]] += 1
-                else:  # All other pixels. Compare to both Above and Below.
-                    glcm[arr[i][j]][arr[i+1][j]] += 1
-                    glcm[arr[i][j]][arr[i-1][j]] += 1
+            k += 1
 
-    # 135 Degrees. Compare to pixels in the Above-Left and Below-Right
-    elif angle == np.pi*(135/180):
+    return glcms
 
-        for i in iRange:
 
-            for j in jRange:
+def calc_glcm(arr, angle, bitDepth, sparse=False, numLevels=None, mask=None):
 
-                # Top Right Corner. No comparison needed, as out of bounds.
-                if i == 0 and j == arr.shape[1]-1:
-                    continue
-                # Bottom Leftcorner. No comparison needed, as out of bounds.
-                elif i == arr.shape[0]-1 and j == 0:
-                    continue
-                elif i == 0 or j == 0:  # Top and Left-Most Row and Column. Compare to Below-Right
-                    glcm[arr[i][j]][arr[i+1][j+1]] += 1
-                # Bottom and Right-Most Row and Column. Compare to Above-Left.
-                elif i == arr.shape[0]-1 or j == arr.shape[1]-1:
-                    glcm[arr[i][j]][arr[i-1][j-1]] += 1
-                # All other pixels. Compare to both Below-Right and Above-Left.
-                else:
-                    glcm[arr[i][j]][arr[i+1][j+1]] += 1
-                    glcm[arr[i][j]][arr[i-1][j-1]] += 1
+    glcm = calc_glcm_multi(arr, [angle_to_offset(angle)], [1], bitDepth,
+                           sparse=sparse, numLevels=numLevels, mask=mask)[0]
 
     return glcm
@@ -11,166 +11,82 @@ ARGUMENTS:
     arr - Image in form of array.
     alpha - Distance from center pixel for comparison.
     bitDepth - Bitdepth of image. Determines size of GLDM.
+    numLevels - Number of gray levels, e.g. quantInfo["numLevels"] from
+        quantize_image. Overrides bitDepth. (Default = None)
+    radius - Size of the square neighbourhood around each pixel. A radius of
+        r compares (2r+1)**2 - 1 neighbours, so the GLDM has (2r+1)**2
+        columns. (Default = 1, the 8 surrounding pixels)
+    mask - ROI mask, as for crop_to_mask. Only pixels inside the mask are
+        counted, and neighbours outside it are never dependent, as if they
+        were outside the image. (Default = None)
 """
 
 import numpy as np
 
+from dev.lib.matrixCalc.roiMask import crop_to_mask
+from dev.lib.matrixCalc.countTypes import as_counts
 
-def calc_gldm(arr, alpha, bitDepth):
 
-    arr = arr.astype('i')
+def calc_dependence_counts(arr, alpha, radius=1, mask=None):
 
-    numIntensities = 2**bitDepth
-    gldm = np.zeros((numIntensities, 9))
+    # Number of dependent neighbours of every pixel, as an array the shape
+    # of the image.
 
-    iRange = range(0, arr.shape[0])
-    jRange = range(0, arr.shape[1])
+    arr = np.asarray(arr).astype(np.intp, copy=False)
 
-    for i in iRange:
+    rows, cols = arr.shape
 
-        for j in jRange:
+    if arr.size == 0:
+        return np.zeros(arr.shape, dtype=np.intp)
 
-            pixelIntensity = arr[i][j]
-            dependentPixels = 0
+    # Pad once with a value further than alpha from every pixel, so that
+    # neighbours outside the image (or the mask) are never dependent.
 
-            # Check location of pixel for different comparisons:
+    padValue = arr.min() - alpha - 1
+    padded = np.pad(arr, radius, constant_values=padValue)
 
-            # Top left-most corner, compare to right, right-below, and below:
-            if i == 0 and j == 0:
+    if mask is not None:
+        padded[radius:radius+rows, radius:radius+cols][~mask] = padValue
 
-                # Calculate how many dependent pixels.
+    dependentPixels = np.zeros(arr.shape, dtype=np.intp)
 
-                if abs(arr[i][j]-arr[i][j+1]) <= alpha:  # Right
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i+1][j+1]) <= alpha:  # Right-Below
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i+1][j]) <= alpha:  # Below
-                    dependentPixels += 1
+    # Compare each pixel to each neighbour in turn, using a shifted view of
+    # the padded image.
 
-            # Top right-most corner, compare to left, left-below, and below:
-            elif i == 0 and j == arr.shape[1]-1:
+    for dy in range(-radius, radius+1):
 
-                # Calculate how many dependent pixels.
+        for dx in range(-radius, radius+1):
 
-                if abs(arr[i][j]-arr[i][j-1]) <= alpha:  # Left
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i+1][j-1]) <= alpha:  # Left-Below
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i+1][j]) <= alpha:  # Below
-                    dependentPixels += 1
-
-            #  Bottom left-most corner, compare to above, right above and right:
-            elif i == arr.shape[0]-1 and j == 0:
-
-                # Calculate how many dependent pixels.
-
-                if abs(arr[i][j]-arr[i-1][j]) <= alpha:  # Above
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i-1][j+1]) <= alpha:  # Right-Above
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i][j+1]) <= alpha:  # Right
-                    dependentPixels += 1
-
-            # Bottom right-most corner, compare to above, left above and left:
-            elif i == arr.shape[0]-1 and j == arr.shape[1]-1:
-
-                # Calculate how many dependent pixels.
-
-                if abs(arr[i][j]-arr[i-1][j]) <= alpha:  # Above
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i-1][j-1]) <= alpha:  # Above-Left
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i][j-1]) <= alpha:  # Left
-                    dependentPixels += 1
-
-            # Top row (Non-corner), compare to left, left-below, below, right-below and right:
-            elif i == 0:
-
-                # Calculate how many dependent pixels.
-
-                if abs(arr[i][j]-arr[i][j-1]) <= alpha:  # Left
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i+1][j-1]) <= alpha:  # Left-Below
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i+1][j]) <= alpha:  # Below
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i-1][j+1]) <= alpha:  # Right-Above
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i][j+1]) <= alpha:  # Right
-                    dependentPixels += 1
-
-            # Bottom row (non corner), compare to left, left-above, above, right-above and right:
-            elif i == arr.shape[0]-1:
-
-                # Calculate how many dependent pixels.
-
-                if abs(arr[i][j]-arr[i][j-1]) <= alpha:  # Left
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i-1][j-1]) <= alpha:  # Above-Left
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i-1][j]) <= alpha:  # Above
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i-1][j+1]) <= alpha:  # Right-Above
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i][j+1]) <= alpha:  # Right
-                    dependentPixels += 1
-
-            # Left-most Edge (non-corner), compare to above, right-above, right, right-below, and below:
-            elif j == 0:
-
-                # Calculate how many dependent pixels.
-
-                if abs(arr[i][j]-arr[i-1][j]) <= alpha:  # Above
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i-1][j+1]) <= alpha:  # Right-Above
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i][j+1]) <= alpha:  # Right
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i+1][j+1]) <= alpha:  # Right-Below
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i+1][j]) <= alpha:  # Below
-                    dependentPixels += 1
-
-            # Right-most Edge (non-corner), compare to above, left-above, left, left-below, and below:
-            elif j == arr.shape[1]-1:
-
-                # Calculate how many dependent pixels.
-
-                if abs(arr[i][j]-arr[i-1][j]) <= alpha:  # Above
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i-1][j-1]) <= alpha:  # Above-Left
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i][j-1]) <= alpha:  # Left
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i+1][j-1]) <= alpha:  # Left-Below
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i+1][j]) <= alpha:  # Below
-                    dependentPixels += 1
-
-            # Non-edge pixel. Compare to all pixel in neighbourhood.
-            else:
-
-                if abs(arr[i][j]-arr[i][j-1]) <= alpha:  # Left
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i-1][j-1]) <= alpha:  # Above-Left
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i-1][j]) <= alpha:  # Above
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i-1][j+1]) <= alpha:  # Right-Above
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i][j+1]) <= alpha:  # Right
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i+1][j+1]) <= alpha:  # Right-Below
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i+1][j]) <= alpha:  # Below
-                    dependentPixels += 1
-                if abs(arr[i][j]-arr[i+1][j-1]) <= alpha:  # Left-Below
-                    dependentPixels += 1
-
-            # if gldm.shape[1] < dependentPixels + 1:
-            #     for colNum in range(1, dependentPixels - gldm.shape[1] + 2):
-            #         gldm = np.column_stack((gldm, np.zeros(gldm.shape[0])))
-
-            gldm[pixelIntensity][dependentPixels] += 1
-
-    return gldm
+            if dy == 0 and dx == 0:
+                continue
+
+            neighbour = padded[radius+dy:radius+dy+rows,
+                               radius+dx:radius+dx+cols]
+
+            dependentPixels += np.abs(arr - neighbour) <= alpha
+
+    return dependentPixels
+
+
+def calc_gldm(arr, alpha, bitDepth, numLevels=None, radius=1, mask=None):
+
+    arr, mask = crop_to_mask(arr, mask)
+    arr = arr.astype(np.intp, copy=False)
+
+    if numLevels is None:
+        numIntensities = 2**bitDepth
+    else:
+        numIntensities = numLevels
+
+    numColumns = (2*radius+1)**2
+
+    dependentPixels = calc_dependence_counts(arr, alpha, radius, mask)
+
+    codes = arr*numColumns + dependentPixels
+
+    if mask is not None:
+        codes = codes[mask]
+
+    gldm = np.bincount(codes.ravel(), minlength=numIntensities*numColumns)
+
+    return as_counts(gldm, codes.size).reshape(numIntensities, numColumns)
@@ -12,162 +12,152 @@ ARGUMENTS:
     Angle - Angle of calculation (0, 45, 90, or 135).
     bitDepth - Bitdepth of image. Determines size of GLDM.
     ignoreBackground - If true, ignores pixels with value 0. Prevents matrices from being too large. (Default = True)
-"""
+    numLevels - Number of gray levels, e.g. quantInfo["numLevels"] from
+        quantize_image. Overrides bitDepth. (Default = None)
+    mask - ROI mask, as for crop_to_mask. Pixels outside the mask end a
+        run, and are not counted in any. (Default = None)
+    backend - Kernel backend tracing the runs, "numpy" or "numba" (see
+        dev.lib.matrixCalc.backends). (Default = None, set_backend's choice)
 
-import numpy as np
+calc_glrlm_multi computes the GLRLM for several angles in one call.
+
+ARGUMENTS: 
+    arr - Image in form of array.
+    angles - List of angles, e.g. [0, np.pi/4, np.pi/2, np.pi*(135/180)].
+    bitDepth, ignoreBackground, numLevels, mask, backend - As for
+        calc_glrlm.
 
+    Returns an array of shape (len(angles), L, longestRun). All angles share
+    the run length axis, which is trimmed to the longest run found.
 
-def calc_glrlm(arr, angle, bitDepth, ignoreBackground=True):
+Column j of the GLRLM holds runs of length j+1. The matrix is trimmed to the
+longest run found, instead of the longest image axis.
+
+ignoreBackground is honoured. The original pixel walk left its check
+commented out, so runs of level 0 were always counted. With the default of
+True they are now dropped, so callers relying on the old counts must pass
+ignoreBackground=False.
+"""
+
+import numpy as np
 
-    numIntensities = 2**bitDepth
-    longestAxisLength = max(arr.shape[0], arr.shape[1])
+from dev.lib.matrixCalc.roiMask import crop_to_mask
+from dev.lib.matrixCalc.backends import register_kernel, get_kernel
+from dev.lib.matrixCalc.countTypes import count_dtype
+from dev.lib.matrixCalc.angleOffsets import angle_to_degrees
 
-    runLength = 0
 
-    glrlm = np.zeros((numIntensities, longestAxisLength))
+def _line_sequence(arr, degrees):
 
-# Different angles require different comparisons.
-# Decides which path to take, depending on direction required.
+    # Lays every line along the given direction end to end in one array.
+    # Returns the values and the index of the last pixel of each line.
 
-    if angle == 0:  # 0 Degrees. Compare pixels to Left and Right.
+    rows, cols = arr.shape
 
-        for i in range(0, arr.shape[0]):
+    if degrees == 0:  # 0 Degrees. Rows, Left to Right.
+        values = arr.ravel()
+        lineLengths = np.full(rows, cols)
 
-            runLength = 0
+    elif degrees == 90:  # 90 Degrees. Columns, Top to Bottom.
+        values = arr.T.ravel()
+        lineLengths = np.full(cols, rows)
 
-            for j in range(0, arr.shape[1]):
+    else:
 
-                pixelIntensity = arr[i][j]
+        # 135 Degrees runs down the diagonals (Above-Left to Below-Right).
+        # 45 Degrees runs up the anti-diagonals (Below-Left to Above-Right),
+        # which are the diagonals of the image flipped upside down.
 
-                # if pixelIntensity == 0 and ignoreBackground:
-                #     continue
+        if degrees == 45:
+            arr = arr[::-1]
 
-                if j == arr.shape[1]-1:
-                    glrlm[pixelIntensity][runLength] += 1
-                else:
-                    if arr[i][j] == arr[i][j+1]:
-                        runLength += 1
-                    else:
-                        glrlm[pixelIntensity][runLength] += 1
-                        runLength = 0
+        lines = [np.diagonal(arr, offset)
+                 for offset in range(-(rows-1), cols)]
 
-    # 90 Degrees. Compare Center Pixel to Below. Works 'down' columns.
-    if angle == np.pi/2:
+        values = np.concatenate(lines)
+        lineLengths = np.array([line.size for line in lines])
 
-        for j in range(0, arr.shape[1]):
+    lineEnds = np.cumsum(lineLengths) - 1
 
-            runLength = 0
+    return values, lineEnds
 
-            for i in range(0, arr.shape[0]):
 
-                pixelIntensity = arr[i][j]
+@register_kernel("numpy", "run_lengths")
+def _run_lengths(values, lineEnds):
 
-                # if pixelIntensity == 0 and ignoreBackground:
-                #     continue
+    # A run ends wherever the next pixel differs, or at the end of a line.
+    # Runs are then the gaps between consecutive run ends.
 
-                if i == arr.shape[0]-1:
-                    glrlm[pixelIntensity][runLength] += 1
-                else:
-                    if arr[i][j] == arr[i+1][j]:
-                        runLength += 1
-                    else:
-                        glrlm[pixelIntensity][runLength] += 1
-                        runLength = 0
+    isRunEnd = np.empty(values.size, dtype=bool)
+    isRunEnd[:-1] = values[:-1] != values[1:]
+    isRunEnd[lineEnds] = True
 
-    elif angle == np.pi/4:  # 45 Degrees. Compare to pixels in the Above-Right and Below-Left
+    runEnds = np.flatnonzero(isRunEnd)
 
-        for i in range(1, arr.shape[0]):
+    runLengths = np.diff(runEnds, prepend=-1)
+    runLevels = values[runEnds]
 
-            runLength = 0
+    return runLevels, runLengths
 
-            for j in range(0, i+1):
 
-                pixelIntensity = arr[i][j]
+def calc_glrlm_multi(arr, angles, bitDepth, ignoreBackground=True,
+                     numLevels=None, mask=None, backend=None):
 
-                # if pixelIntensity == 0 and ignoreBackground:
-                #     continue
+    if numLevels is None:
+        numIntensities = 2**bitDepth
+    else:
+        numIntensities = numLevels
 
-                if i == 0:
-                    glrlm[pixelIntensity][runLength] += 1
-                else:
-                    if arr[i][j] == arr[i-1][j+1]:
-                        runLength += 1
-                        i -= 1
-                    else:
-                        glrlm[pixelIntensity][runLength] += 1
-                        runLength = 0
-                        i -= 1
+    arr, mask = crop_to_mask(arr, mask)
+    arr = arr.astype(np.intp, copy=False)
 
-        for j in range(1, arr.shape[1]-1):
+    if arr.size == 0:
+        return np.zeros((len(angles), numIntensities, 1),
+                        dtype=count_dtype(0))
 
-            runLength = 0
+    # Pixels outside the mask become -1, which differs from every level, so
+    # they split the runs around them. Their own runs are dropped below.
 
-            for i in range(arr.shape[0]-1, j-1, -1):
+    if mask is not None:
+        arr = np.where(mask, arr, -1)
 
-                pixelIntensity = arr[i][j]
+    runLengthsKernel = get_kernel("run_lengths", backend)
 
-                # if pixelIntensity == 0 and ignoreBackground:
-                #     continue
+    runs = []
 
-                if j == arr.shape[1]-1:
-                    glrlm[pixelIntensity][runLength] += 1
-                else:
-                    if arr[i][j] == arr[i-1][j+1]:
-                        runLength += 1
-                        j += 1
-                        # continue
-                    else:
-                        glrlm[pixelIntensity][runLength] += 1
-                        runLength = 0
-                        j += 1
+    for angle in angles:
 
-    # 135 Degrees. Compare to pixels in the Above-Left and Below-Right
-    elif angle == np.pi*(135/180):
+        runLevels, runLengths = runLengthsKernel(
+            *_line_sequence(arr, angle_to_degrees(angle))
+        )
 
-        for i in range(arr.shape[0]-2, -1, -1):
+        counted = runLevels >= 0
 
-            runLength = 0
+        if ignoreBackground:
+            counted &= runLevels != 0
 
-            for j in range(0, arr.shape[0]):
+        runs.append((runLevels[counted], runLengths[counted]))
 
-                pixelIntensity = arr[i][j]
+    longestRun = max([runLengths.max() for _, runLengths in runs if
+                      runLengths.size] + [1])
 
-                # if pixelIntensity == 0 and ignoreBackground:
-                #     continue
+    glrlms = np.zeros((len(runs), numIntensities, longestRun),
+                      dtype=count_dtype(arr.size))
 
-                if i == arr.shape[0]-1:
-                    glrlm[pixelIntensity][runLength] += 1
-                    break
-                else:
-                    if arr[i][j] == arr[i+1][j+1]:
-                        runLength += 1
-                        i += 1
-                    else:
-                        glrlm[pixelIntensity][runLength] += 1
-                        runLength = 0
-                        i += 1
+    for k, (runLevels, runLengths) in enumerate(runs):
 
-        for j in range(1, arr.shape[1]-1):
+        counts = np.bincount(runLevels*longestRun + (runLengths-1),
+                             minlength=numIntensities*longestRun)
 
-            runLength = 0
+        glrlms[k] = counts.reshape(numIntensities, longestRun)
 
-            for i in range(0, arr.shape[0]):
+    return glrlms
 
-                pixelIntensity = arr[i][j]
 
-                # if pixelIntensity == 0 and ignoreBackground:
-                #     continue
+def calc_glrlm(arr, angle, bitDepth, ignoreBackground=True, numLevels=None,
+               mask=None, backend=None):
 
-                if j == arr.shape[1]-1:
-                    glrlm[pixelIntensity][runLength] += 1
-                    break
-                else:
-                    if arr[i][j] == arr[i+1][j+1]:
-                        runLength += 1
-                        j += 1
-                    else:
-                        glrlm[pixelIntensity][runLength] += 1
-                        runLength = 0
-                        j += 1
+    glrlm = calc_glrlm_multi(arr, [angle], bitDepth, ignoreBackground,
+                             numLevels, mask, backend)[0]
 
     return glrlm
@@ -11,15 +11,202 @@ ARGUMENTS:
     arr - Image in form of array.
     bitDepth - Bitdepth of image. Determines size of GLDM.
     ignoreBackground - If true, ignores pixels with value 0. Prevents matrices from being too large. (Default = True)
+    numLevels - Number of gray levels, e.g. quantInfo["numLevels"] from
+        quantize_image. Overrides bitDepth. (Default = None)
+    engine - Zone extraction method. "label" labels the connected components
+        of each gray level in bulk. "floodfill" is the original pixel by
+        pixel search, and only supports 8-connectivity. (Default = "label")
+    connectivity - 4 or 8. Whether zones join through edges only, or through
+        edges and corners. (Default = 8)
+    mask - ROI mask, as for crop_to_mask. Zones only grow through pixels
+        inside the mask. Needs the "label" engine. (Default = None)
+    backend - Kernel backend finding the zones for the "label" engine,
+        "numpy" or "numba" (see dev.lib.matrixCalc.backends). (Default =
+        None, set_backend's choice)
+    sparse - If true, returns a scipy.sparse COO matrix holding only the
+        (gray level, zone size) pairs that occur. Its memory depends on the
+        number of distinct zones, not on the size of the largest, which can
+        be the whole image. (Default = False)
 """
 
 #!/usr/bin/env python
 
 from collections import deque
 import numpy as np
+import scipy.sparse
+from scipy.sparse.csgraph import connected_components
 
+from dev.lib.matrixCalc.roiMask import crop_to_mask
+from dev.lib.matrixCalc.matrixGLRLM import _run_lengths
+from dev.lib.matrixCalc.backends import register_kernel, get_kernel
+from dev.lib.matrixCalc.countTypes import count_dtype, as_counts
 
-def calc_glszm(array, bitDepth, ignoreBackground):
+
+def _touching_runs(runOf, runStarts, hasNext, cols, lineStep, dx):
+
+    # Pairs of runs (a, b), with a in one line and b in the line lineStep
+    # further on, such that some pixel of a has the pixel dx to the side of
+    # it in b. hasNext marks the lines whose line lineStep further on is
+    # their neighbour, e.g. every row of an image but the last. runOf is the
+    # run of every pixel. Along a line the pair only changes where a run
+    # starts in either line, so only those pixels, and the first of each
+    # line, are looked up. A pair found twice joins nothing more, so repeats
+    # are left in.
+
+    first = max(0, -dx)
+    last = cols - max(0, dx)
+    step = lineStep*cols + dx
+
+    if lineStep < 1 or first >= last or not hasNext.any():
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+
+    pixels = np.concatenate([
+        runStarts, runStarts - step,
+        np.flatnonzero(hasNext).astype(runStarts.dtype)*cols + first
+    ])
+
+    x = pixels % cols
+    pixels = pixels[(pixels >= 0) & (pixels < hasNext.size*cols)
+                    & (x >= first) & (x < last)]
+    pixels = pixels[hasNext[pixels // cols]]
+
+    return runOf[pixels], runOf[pixels + step]
+
+
+def _run_zones(keys, neighbours):
+
+    # Zones of a level map, laid out as lines of keys.shape[-1] pixels, e.g.
+    # the rows of an image or of every plane of a volume. Keys of -1 join no
+    # zone. neighbours lists the (lineStep, hasNext, dx) steps to the pixels
+    # of later lines a zone grows through, as for _touching_runs.
+    #
+    # Zones are labelled in one pass for every gray level, as the connected
+    # components of the runs along each line, joined to the runs of the
+    # lines they touch. The graph has a node per run rather than per pixel,
+    # so large flat zones cost little.
+
+    cols = keys.shape[-1]
+
+    runLevels, runLengths = _run_lengths(
+        keys.ravel(), np.arange(1, keys.size//cols + 1)*cols - 1
+    )
+
+    # Pixel and run numbers fit int32 for all but the largest images, which
+    # halves the memory of the lookups below.
+
+    index = np.int32 if keys.size < 2**31 else np.int64
+
+    runStarts = (np.cumsum(runLengths) - runLengths).astype(index)
+    runOf = np.repeat(np.arange(runLengths.size, dtype=index), runLengths)
+
+    above = []
+    below = []
+
+    for lineStep, hasNext, dx in neighbours:
+
+        a, b = _touching_runs(runOf, runStarts, hasNext, cols, lineStep, dx)
+        joined = (runLevels[a] == runLevels[b]) & (runLevels[a] >= 0)
+
+        above.append(a[joined])
+        below.append(b[joined])
+
+    above = np.concatenate(above)
+    below = np.concatenate(below)
+
+    graph = scipy.sparse.coo_matrix(
+        (np.ones(above.size, dtype=bool), (above, below)),
+        shape=(runLevels.size, runLevels.size)
+    )
+
+    _, zones = connected_components(graph, directed=False)
+
+    counted = runLevels >= 0
+    zones = zones[counted]
+
+    zoneSizes = np.bincount(zones, weights=runLengths[counted]).astype(np.intp)
+    zoneLevels = np.zeros(zoneSizes.size, dtype=np.intp)
+    zoneLevels[zones] = runLevels[counted]
+
+    return zoneLevels[zoneSizes > 0], zoneSizes[zoneSizes > 0]
+
+
+@register_kernel("numpy", "zones")
+def _label_zones(arr, mask, ignoreBackground, connectivity):
+
+    rows, cols = arr.shape
+
+    if arr.size == 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+
+    # Pixels that are not counted become -1, which joins no zone.
+
+    keys = np.asarray(arr).astype(np.intp)
+
+    if mask is not None:
+        keys[~mask] = -1
+
+    if ignoreBackground:
+        keys[keys == 0] = -1
+
+    # Each row is joined to the row below, straight down, and diagonally
+    # for 8-connectivity.
+
+    hasNext = np.arange(rows) < rows - 1
+
+    return _run_zones(keys, [(1, hasNext, dx) for dx in
+                             ((0,) if connectivity == 4 else (-1, 0, 1))])
+
+
+def _zones_to_glszm(zoneLevels, zoneSizes, numLevels, sparse=False):
+
+    # Column j holds zones of size j+1, as in the flood fill engine.
+
+    maxRegionSize = max(zoneSizes.max(initial=0), 1)
+
+    if sparse:
+
+        # Only the (level, size) pairs that occur are kept, so memory grows
+        # with the number of distinct zones, not with the largest.
+
+        codes, counts = np.unique(zoneLevels.astype(np.int64)*maxRegionSize
+                                  + (zoneSizes-1), return_counts=True)
+
+        return scipy.sparse.coo_matrix(
+            (as_counts(counts, zoneSizes.size),
+             (codes // maxRegionSize, codes % maxRegionSize)),
+            shape=(numLevels, maxRegionSize)
+        )
+
+    glszm = np.bincount(zoneLevels*maxRegionSize + (zoneSizes-1),
+                        minlength=numLevels*maxRegionSize)
+
+    return as_counts(glszm, zoneSizes.size).reshape(numLevels, maxRegionSize)
+
+
+def calc_glszm(array, bitDepth, ignoreBackground, numLevels=None,
+               engine="label", connectivity=8, mask=None, backend=None,
+               sparse=False):
+
+    if numLevels is None:
+        numLevels = 2**bitDepth
+
+    if connectivity not in (4, 8):
+        raise ValueError("Connectivity must be 4 or 8.")
+
+    if engine == "label":
+        array, mask = crop_to_mask(array, mask)
+        zones = get_kernel("zones", backend)(array, mask, ignoreBackground,
+                                             connectivity)
+        return _zones_to_glszm(*zones, numLevels, sparse)
+
+    elif engine != "floodfill":
+        raise ValueError("Engine must be 'label' or 'floodfill'.")
+
+    if mask is not None:
+        raise ValueError("The floodfill engine does not support masks.")
+
+    if connectivity != 8:
+        raise ValueError("The floodfill engine only supports 8-connectivity.")
 
     arr = array.astype('h')
     coordQueue = deque()
@@ -488,7 +675,7 @@ def calc_glszm(array, bitDepth, ignoreBackground):
             if regionSize > maxRegionSize:
                 maxRegionSize = regionSize
 
-    glszm = np.zeros((2**bitDepth, maxRegionSize))
+    glszm = np.zeros((numLevels, maxRegionSize), dtype=count_dtype(arr.size))
     arr = array.astype('h')
 
     # del coord
@@ -951,4 +1138,7 @@ def calc_glszm(array, bitDepth, ignoreBackground):
             if pixelIntensity != -1:
                 glszm[pixelIntensity][regionSize] += 1
 
+    if sparse:
+        return scipy.sparse.coo_matrix(glszm)
+
     return glszm
@@ -10,222 +10,107 @@ OUTPIT: NGTDM from image in form of Numpy array.
 ARGUMENTS: 
     arr - Image in form of array.
     ignoreBackground - If true, ignores pixels with value 0. Prevents matrices from being too large. (Default = True)
-    
+    numLevels - Number of gray levels, e.g. quantInfo["numLevels"] from
+        quantize_image. Sets the NGTDM size instead of the image maximum.
+        (Default = None)
+    distance - Neighbourhood distance. Every pixel within this many pixels
+        (including diagonally) of the center is averaged. Cost does not
+        depend on the distance. (Default = 1, the 8 surrounding pixels)
+    mask - ROI mask, as for crop_to_mask. Only pixels inside the mask are
+        counted, neighbourhoods only average pixels inside it, and p_i is
+        taken over the mask. (Default = None)
+
 """
 import numpy as np
 
+from dev.lib.matrixCalc.roiMask import crop_to_mask
 
-def calc_ngtdm(arr, ignoreBackground):
-
-    arr = arr.astype('i')
-
-    maxIntensity = arr.max()
-    totalSize = arr.shape[0]*arr.shape[1]
-
-    ngtdm = np.zeros((maxIntensity + 1, 3))
-
-    # Iterate through array
-
-    for i in range(0, arr.shape[0]):
-
-        for j in range(0, arr.shape[1]):
-
-            pixelIntensity = arr[i][j]
-
-            if pixelIntensity == 0 and ignoreBackground:
-                continue
-
-            # Check location of pixel for different comparisons:
-
-            # Top left-most corner, compare to right, right-below, and below:
-            if i == 0 and j == 0:
-
-                # Find average value of neighbourhood
-
-                neighbourhoodAverage = (
-                    (1/3)*(arr[i][j+1]+arr[i+1][j+1] + arr[i+1][j])
-                )
-
-                # Calculate Neighbouring Graytone Difference
-
-                neighbouringGrayDiff = abs(arr[i][j] - neighbourhoodAverage)
-
-                # Increment number of intensity by one, and add neighbouringGrayDiff
-
-                ngtdm[arr[i][j]][0] += 1
-
-                ngtdm[arr[i][j]][2] += neighbouringGrayDiff
-
-            # Top right-most corner, compare to left, left-below, and below:
-            elif i == 0 and j == arr.shape[1]-1:
-
-                # Find average value of neighbourhood
-
-                neighbourhoodAverage = (
-                    (1/3)*(arr[i][j-1]+arr[i+1][j-1] + arr[i+1][j])
-                )
-
-                # Calculate Neighbouring Graytone Difference
-
-                neighbouringGrayDiff = abs(arr[i][j] - neighbourhoodAverage)
-
-                # Increment number of intensity by one, and add neighbouringGrayDiff
-
-                ngtdm[arr[i][j]][0] += 1
-
-                ngtdm[arr[i][j]][2] += neighbouringGrayDiff
-
-            #  Bottom left-most corner, compare to above, right above and right:
-            elif i == arr.shape[0]-1 and j == 0:
 
-                # Find average value of neighbourhood
+def _window_sums(arr, distance):
 
-                neighbourhoodAverage = (
-                    (1/3)*(arr[i-1][j]+arr[i-1][j+1] + arr[i][j+1])
-                )
+    # Sum of every (2*distance+1) square window, clipped at the image edges,
+    # from an integral image. Four lookups per pixel, whatever the distance.
 
-                # Calculate Neighbouring Graytone Difference
+    rows, cols = arr.shape
 
-                neighbouringGrayDiff = abs(arr[i][j] - neighbourhoodAverage)
+    integral = np.zeros((rows+1, cols+1), dtype=arr.dtype)
+    integral[1:, 1:] = arr.cumsum(0).cumsum(1)
 
-                # Increment number of intensity by one, and add neighbouringGrayDiff
+    top = np.clip(np.arange(rows) - distance, 0, rows)
+    bottom = np.clip(np.arange(rows) + distance + 1, 0, rows)
+    left = np.clip(np.arange(cols) - distance, 0, cols)
+    right = np.clip(np.arange(cols) + distance + 1, 0, cols)
 
-                ngtdm[arr[i][j]][0] += 1
+    return (integral[bottom][:, right] - integral[top][:, right]
+            - integral[bottom][:, left] + integral[top][:, left])
 
-                ngtdm[arr[i][j]][2] += neighbouringGrayDiff
 
-            # Bottom right-most corner, compare to above, left above and left:
-            elif i == arr.shape[0]-1 and j == arr.shape[1]-1:
+def _window_counts(shape, distance):
 
-                # Find average value of neighbourhood
+    # Number of pixels of each window that fall inside the image. Separable,
+    # so it is the outer product of the row and column counts.
 
-                neighbourhoodAverage = (
-                    (1/3)*(arr[i-1][j]+arr[i-1][j-1] + arr[i][j-1])
-                )
+    rows, cols = shape
 
-                # Calculate Neighbouring Graytone Difference
+    rowCounts = (np.minimum(np.arange(rows) + distance, rows - 1)
+                 - np.maximum(np.arange(rows) - distance, 0) + 1)
+    colCounts = (np.minimum(np.arange(cols) + distance, cols - 1)
+                 - np.maximum(np.arange(cols) - distance, 0) + 1)
 
-                neighbouringGrayDiff = abs(arr[i][j] - neighbourhoodAverage)
+    return np.outer(rowCounts, colCounts)
 
-                # Increment number of intensity by one, and add neighbouringGrayDiff
 
-                ngtdm[arr[i][j]][0] += 1
+def calc_ngtdm(arr, ignoreBackground, numLevels=None, distance=1, mask=None):
 
-                ngtdm[arr[i][j]][2] += neighbouringGrayDiff
+    arr, mask = crop_to_mask(arr, mask)
+    arr = arr.astype(np.intp, copy=False)
 
-            # Top row (Non-corner), compare to left, left-below, below, right-below and right:
-            elif i == 0:
+    if numLevels is None:
+        numLevels = int(arr.max(initial=0)) + 1
 
-                # Find average value of neighbourhood
+    ngtdm = np.zeros((numLevels, 3))
 
-                neighbourhoodAverage = (
-                    (1/5)*(arr[i][j-1]+arr[i+1][j-1]
-                           + arr[i+1][j]+arr[i+1][j+1]
-                           + arr[i][j+1])
-                )
+    # Neighbourhood sum and size exclude the center pixel itself. With a
+    # mask, pixels outside it add nothing to either.
 
-                # Calculate Neighbouring Graytone Difference
+    if mask is None:
 
-                neighbouringGrayDiff = abs(arr[i][j] - neighbourhoodAverage)
+        totalSize = arr.shape[0]*arr.shape[1]
 
-                # Increment number of intensity by one, and add neighbouringGrayDiff
+        neighbourSums = _window_sums(arr, distance) - arr
+        neighbourCounts = _window_counts(arr.shape, distance) - 1
 
-                ngtdm[arr[i][j]][0] += 1
+    else:
 
-                ngtdm[arr[i][j]][2] += neighbouringGrayDiff
+        totalSize = np.count_nonzero(mask)
 
-            # Bottom row (non corner), compare to left, left-above, above, right-above and right:
-            elif i == arr.shape[0]-1:
+        inROI = mask.astype(np.intp)
 
-                # Find average value of neighbourhood
+        neighbourSums = _window_sums(arr*inROI, distance) - arr*inROI
+        neighbourCounts = _window_sums(inROI, distance) - inROI
 
-                neighbourhoodAverage = (1/5)*(arr[i][j-1]+arr[i-1][j-1]
-                                              + arr[i-1][j]+arr[i-1][j+1]
-                                              + arr[i][j+1])
+    counted = neighbourCounts > 0
 
-                # Calculate Neighbouring Graytone Difference
+    if mask is not None:
+        counted &= mask
 
-                neighbouringGrayDiff = abs(arr[i][j] - neighbourhoodAverage)
+    if ignoreBackground:
+        counted &= arr != 0
 
-                # Increment number of intensity by one, and add neighbouringGrayDiff
+    levels = arr[counted]
 
-                ngtdm[arr[i][j]][0] += 1
+    # Find average value of neighbourhood, and the Neighbouring Graytone
+    # Difference of each pixel.
 
-                ngtdm[arr[i][j]][2] += neighbouringGrayDiff
+    neighbourhoodAverage = neighbourSums[counted]/neighbourCounts[counted]
+    neighbouringGrayDiff = np.abs(levels - neighbourhoodAverage)
 
-            # Left-most Edge (non-corner), compare to above, right-above, right, right-below, and below:
-            elif j == 0:
+    # Number of each intensity, and the summed differences per intensity.
 
-                # Find average value of neighbourhood
-
-                neighbourhoodAverage = (1/5)*(arr[i-1][j]+arr[i-1][j+1]
-                                              + arr[i][j+1]+arr[i+1][j+1]
-                                              + arr[i+1][j])
-
-                # Calculate Neighbouring Graytone Difference
-
-                neighbouringGrayDiff = abs(arr[i][j] - neighbourhoodAverage)
-
-                # Increment number of intensity by one, and add neighbouringGrayDiff
-
-                ngtdm[arr[i][j]][0] += 1
-
-                ngtdm[arr[i][j]][2] += neighbouringGrayDiff
-
-            # Right-most Edge (non-corner), compare to above, left-above, left, left-below, and below:
-            elif j == arr.shape[1]-1:
-
-                # Find average value of neighbourhood
-
-                neighbourhoodAverage = (
-                    (1/5)*(arr[i-1][j]+arr[i-1][j-1] +
-                           arr[i][j-1]+arr[i+1][j-1] +
-                           arr[i+1][j])
-                )
-
-                # Calculate Neighbouring Graytone Difference
-
-                neighbouringGrayDiff = abs(arr[i][j] - neighbourhoodAverage)
-
-                # Increment number of intensity by one, and add neighbouringGrayDiff
-
-                ngtdm[arr[i][j]][0] += 1
-
-                ngtdm[arr[i][j]][2] += neighbouringGrayDiff
-
-            # Non-edge pixel. Compare to all pixel in neighbourhood.
-            else:
-
-                # Find average value of neighbourhood
-
-                neighbourhoodAverage = (
-                    (1/8)*(arr[i-1][j-1]+arr[i-1][j] +
-                           arr[i-1][j+1]+arr[i][j-1] +
-                           arr[i][j+1]+arr[i+1][j-1] +
-                           arr[i+1][j]+arr[i+1][j+1])
-                )
-
-                # Calculate Neighbouring Graytone Difference
-
-                neighbouringGrayDiff = abs(arr[i][j] - neighbourhoodAverage)
-
-                # Increment number of intensity by one, and add neighbouringGrayDiff
-
-                ngtdm[arr[i][j]][0] += 1
-
-                ngtdm[arr[i][j]][2] += neighbouringGrayDiff
-
-    for i in range(0, ngtdm.shape[0]):
-
-        ngtdm[i][1] = ngtdm[i][0]/totalSize
+    ngtdm[:, 0] = np.bincount(levels, minlength=numLevels)
+    if totalSize:
+        ngtdm[:, 1] = ngtdm[:, 0]/totalSize
+    ngtdm[:, 2] = np.bincount(levels, weights=neighbouringGrayDiff,
+                              minlength=numLevels)
 
     return ngtdm
-
-
-arr = np.array([[0, 1, 1, 2, 0],
-                [0, 1, 2, 1, 1],
-                [0, 0, 2, 1, 0],
-                [0, 2, 3, 2, 1],
-                [2, 3, 2, 3, 0]])
-
-gldm = calc_ngtdm(arr, ignoreBackground=False)
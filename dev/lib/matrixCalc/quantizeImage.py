@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Quantizes image into a compact range of gray levels before matrix calculation.
+
+INPUT: Image in form of Numpy array.
+OUTPIT: Level map (uint8 or uint16 Numpy array) and Dict of mapping metadata.
+
+ARGUMENTS: 
+    arr - Image in form of array.
+    numBins - Number of gray levels to rebin to. (Default = 32)
+    binWidth - Intensity width of each gray level. If given, used instead of
+        numBins. (Default = None)
+    intensityRange - (low, high) intensities mapped to the first and last
+        level. (Default = None, image min and max)
+    percentiles - (low, high) percentiles used as intensityRange instead,
+        e.g. (1, 99) to ignore outliers. (Default = None)
+    reserveBackground - If true, pixels of value 0 stay at level 0 and all
+        other pixels are binned into levels 1 and above, so ignoreBackground
+        keeps working on the level map. (Default = False)
+    mask - ROI mask, as for crop_to_mask. Only pixels inside the mask set
+        the intensity range, and pixels outside it are left at level 0.
+        (Default = None)
+
+The metadata Dict holds "numLevels", "bitDepth", "binEdges", "binWidth" and
+"intensityRange". The level map and metadata can be passed straight to any
+matrix builder, e.g.
+
+    levels, quantInfo = quantize_image(arr, numBins=32)
+    glcm = calc_glcm(levels, angle, quantInfo["bitDepth"],
+                     numLevels=quantInfo["numLevels"])
+"""
+import math
+import numpy as np
+
+
+def quantize_image(arr, numBins=32, binWidth=None, intensityRange=None,
+                   percentiles=None, reserveBackground=False, mask=None):
+
+    arr = np.asarray(arr)
+
+    if reserveBackground:
+        foreground = arr != 0
+    else:
+        foreground = np.ones(arr.shape, dtype=bool)
+
+    if mask is not None:
+        foreground &= np.asarray(mask) != 0
+
+    values = arr[foreground].astype(float)
+
+    # Decide the intensity range mapped onto the gray levels.
+
+    if intensityRange is not None:
+        low, high = intensityRange
+    elif values.size == 0:
+        low, high = 0.0, 0.0
+    elif percentiles is not None:
+        low, high = np.percentile(values, percentiles)
+    else:
+        low, high = values.min(), values.max()
+
+    low = float(low)
+    high = float(high)
+
+    if high < low:
+        raise ValueError("Upper intensity bound is below the lower bound.")
+
+    # Fixed bin width, or fixed number of bins spread over the range.
+
+    if binWidth is not None:
+
+        if binWidth <= 0:
+            raise ValueError("binWidth must be positive.")
+
+        numBins = int(math.floor((high - low)/binWidth)) + 1
+
+    else:
+
+        if numBins < 1:
+            raise ValueError("numBins must be at least 1.")
+
+        binWidth = (high - low)/numBins if high > low else 1.0
+
+    # Values outside the range (from percentiles or intensityRange) are
+    # clipped into the first and last levels.
+
+    binned = np.floor((values - low)/binWidth)
+    binned = np.clip(binned, 0, numBins - 1).astype(np.int64)
+
+    offset = 1 if reserveBackground else 0
+    numLevels = numBins + offset
+
+    if numLevels <= 2**8:
+        dtype = np.uint8
+    elif numLevels <= 2**16:
+        dtype = np.uint16
+    else:
+        raise ValueError("Quantization gives more than 65536 gray levels.")
+
+    levels = np.zeros(arr.shape, dtype=dtype)
+    levels[foreground] = binned + offset
+
+    quantInfo = {
+        "numLevels": numLevels,
+        "bitDepth": max(1, int(math.ceil(math.log2(numLevels)))),
+        "binEdges": low + binWidth*np.arange(numBins + 1),
+        "binWidth": binWidth,
+        "intensityRange": (low, high),
+        "reserveBackground": reserveBackground
+    }
+
+    return levels, quantInfo
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Crops an image to the bounding box of a region of interest (ROI) mask before
+matrix calculation.
+
+INPUT: Image and mask in form of Numpy arrays.
+OUTPIT: Image and boolean mask, both cropped to the bounding box of the mask.
+
+ARGUMENTS:
+    arr - Image in form of array.
+    mask - Boolean mask, or label image where every non-zero label is in the
+        ROI. Pass labels == k for a single label. Must match the shape of
+        arr. (Default = None, the whole image)
+
+Every matrix builder takes the same mask argument. Pixels outside the mask
+are never counted, and neither are pairs, runs, zones or neighbourhoods
+that reach outside it.
+"""
+
+import numpy as np
+
+
+def crop_to_mask(arr, mask=None):
+
+    arr = np.asarray(arr)
+
+    if mask is None:
+        return arr, None
+
+    mask = np.asarray(mask) != 0
+
+    if mask.shape != arr.shape:
+        raise ValueError("Mask must be the same shape as the image.")
+
+    # Only the bounding box of the ROI is processed. An empty mask crops to
+    # an empty image.
+
+    coords = np.nonzero(mask)
+
+    if coords[0].size == 0:
+        box = tuple(slice(0, 0) for _ in coords)
+    else:
+        box = tuple(slice(c.min(), c.max()+1) for c in coords)
+
+    return arr[box], mask[box]
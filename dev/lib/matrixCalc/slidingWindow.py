@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Constructs GLCM, GLRLM and GLDM for every window of an image, for texture
+feature maps.
+
+INPUT: Image in form of Numpy array.
+OUTPIT: Generator of (iy, ix, matrix), one per window.
+
+ARGUMENTS:
+    arr - Image in form of array, e.g. the levels from quantize_image.
+    windowSize - Side of the square window, in pixels.
+    step - Pixels between the corners of neighbouring windows.
+    numLevels - Number of gray levels. Determines size of each matrix.
+
+    iter_glcm_windows - offset is a (dy, dx) step, e.g. GLCM_OFFSETS[0].
+    iter_glrlm_windows - angle is in radians, and ignoreBackground and
+        backend are as for calc_glrlm. (Default ignoreBackground = False)
+    iter_gldm_windows - alpha and radius are as for calc_gldm.
+
+Windows are not rebuilt from scratch. Each pixel (or pair, or run) is given a
+code once for the whole image, and as a window moves along a row the codes
+of the columns leaving it are subtracted from its counts and those of the
+columns entering it are added. Only the codes that depend on where the
+window ends are worked out again for each window:
+    GLDM - Pixels within radius of the window edge, whose neighbours are
+        partly outside the window.
+    GLRLM - Runs along the rows (0 degrees) are counted per column band of
+        the image transposed, so every run is cut to the window by the band.
+        Diagonal runs (45 and 135 degrees) are cut by both window edges, and
+        are counted per window.
+
+Each matrix matches calc_glcm, calc_glrlm or calc_gldm of the window alone,
+except that the GLRLM always has windowSize columns.
+"""
+
+import numpy as np
+
+from dev.lib.matrixCalc.matrixGLCM import _shifted_pairs
+from dev.lib.matrixCalc.matrixGLRLM import calc_glrlm_multi
+from dev.lib.matrixCalc.matrixGLDM import calc_dependence_counts
+from dev.lib.matrixCalc.backends import get_kernel
+from dev.lib.matrixCalc.countTypes import as_counts
+from dev.lib.matrixCalc.angleOffsets import angle_to_degrees
+
+
+def window_starts(length, windowSize, step):
+
+    # First pixel of every window along an axis. Windows that would run
+    # past the edge are left out.
+
+    if windowSize < 1 or step < 1:
+        raise ValueError("windowSize and step must be at least 1.")
+
+    return np.arange(0, length - windowSize + 1, step)
+
+
+def window_grid(shape, windowSize, step):
+
+    # Number of windows down and across an image, (H', W').
+
+    return (window_starts(shape[0], windowSize, step).size,
+            window_starts(shape[1], windowSize, step).size)
+
+
+def _slide_row(countColumns, firstColumn, numWindows, width, step):
+
+    # Counts for each window along a row. countColumns(a, b) counts the
+    # columns a to b of the current band, and the first window starts at
+    # firstColumn. Windows that do not overlap are counted afresh.
+
+    counts = None
+
+    for ix in range(numWindows):
+
+        x = firstColumn + ix*step
+
+        if counts is None or step >= width:
+            counts = countColumns(x, x + width)
+        else:
+            counts -= countColumns(x - step, x)
+            counts += countColumns(x + width - step, x + width)
+
+        yield ix, counts
+
+
+def _count_block(codes, numCodes):
+    return np.bincount(codes.ravel(), minlength=numCodes)
+
+
+def _slide_codes(codes, numCodes, windowSize, step, insets):
+
+    # Counts of a per-pixel code array for every window. insets is the number
+    # of rows and columns (top, bottom, left, right) of each window whose
+    # codes are left out.
+
+    top, bottom, left, right = insets
+
+    rows, cols = codes.shape
+    numWindowsX = window_starts(cols, windowSize, step).size
+
+    height = max(0, windowSize - top - bottom)
+    width = max(0, windowSize - left - right)
+
+    for iy, y0 in enumerate(window_starts(rows, windowSize, step)):
+
+        band = codes[y0+top:y0+top+height]
+
+        countColumns = lambda a, b: _count_block(band[:, a:b], numCodes)
+
+        for ix, counts in _slide_row(countColumns, left, numWindowsX,
+                                     width, step):
+            yield iy, ix, counts
+
+
+def iter_glcm_windows(arr, windowSize, step, numLevels, offset):
+
+    arr = np.asarray(arr).astype(np.intp, copy=False)
+
+    dy, dx = offset
+
+    # Each pair is coded by the pixel it starts from. A window holds the pair
+    # only if it also holds the pixel (dy, dx) away, so the starting pixels
+    # are inset from the window edges by the offset.
+
+    first, second = _shifted_pairs(arr, dy, dx)
+
+    # Stops are clamped at 0, as in _shifted_pairs, so an offset longer than
+    # the image leaves no pairs.
+
+    codes = np.zeros(arr.shape, dtype=np.intp)
+    codes[max(0, -dy):max(0, arr.shape[0]-max(0, dy)),
+          max(0, -dx):max(0, arr.shape[1]-max(0, dx))] = (first*numLevels
+                                                          + second)
+
+    insets = (max(0, -dy), max(0, dy), max(0, -dx), max(0, dx))
+
+    for iy, ix, counts in _slide_codes(codes, numLevels*numLevels,
+                                       windowSize, step, insets):
+
+        counts = counts.reshape(numLevels, numLevels)
+
+        yield iy, ix, as_counts(counts + counts.T, 2*windowSize**2)
+
+
+def _ring_neighbours(windowSize, radius, rowStride):
+
+    # Pixels within radius of the window edge, and each of their neighbours,
+    # as flat offsets from the window corner in an image with rowStride
+    # columns. valid marks the neighbours inside the window.
+
+    ys, xs = np.indices((windowSize, windowSize))
+
+    inRing = ((ys < radius) | (ys >= windowSize - radius)
+              | (xs < radius) | (xs >= windowSize - radius))
+
+    ringY = ys[inRing]
+    ringX = xs[inRing]
+
+    neighbours = []
+    valid = []
+
+    for dy in range(-radius, radius+1):
+
+        for dx in range(-radius, radius+1):
+
+            if dy == 0 and dx == 0:
+                continue
+
+            ny = ringY + dy
+            nx = ringX + dx
+
+            inside = (ny >= 0) & (ny < windowSize) & (nx >= 0) & (nx < windowSize)
+
+            neighbours.append(np.where(inside, ny*rowStride + nx, 0))
+            valid.append(inside)
+
+    return ringY*rowStride + ringX, np.array(neighbours), np.array(valid)
+
+
+def iter_gldm_windows(arr, windowSize, step, numLevels, alpha, radius=1):
+
+    arr = np.asarray(arr).astype(np.intp, copy=False)
+
+    numColumns = (2*radius+1)**2
+    numCodes = numLevels*numColumns
+
+    # Pixels at least radius inside the window have all their neighbours in
+    # it, so their dependence is the same as in the whole image.
+
+    codes = arr*numColumns + calc_dependence_counts(arr, alpha, radius)
+
+    insets = (radius, radius, radius, radius)
+
+    flat = arr.ravel()
+    ring, neighbours, valid = _ring_neighbours(windowSize, radius,
+                                               arr.shape[1])
+
+    starts = window_starts(arr.shape[1], windowSize, step)
+
+    for iy, ix, counts in _slide_codes(codes, numCodes, windowSize, step,
+                                       insets):
+
+        # The ring is counted again against its neighbours in the window.
+
+        y0 = iy*step
+        corner = y0*arr.shape[1] + starts[ix]
+
+        ringLevels = flat[corner + ring]
+        dependent = ((np.abs(ringLevels - flat[corner + neighbours]) <= alpha)
+                     & valid).sum(0)
+
+        ringCounts = np.bincount(ringLevels*numColumns + dependent,
+                                 minlength=numCodes)
+
+        yield iy, ix, as_counts(counts + ringCounts,
+                                windowSize**2).reshape(numLevels, numColumns)
+
+
+def _iter_column_runs(arr, windowSize, step, numLevels, ignoreBackground,
+                      backend):
+
+    # GLRLM at 90 degrees of every window. Within a band of rows, each column
+    # is one line, so its runs do not change as the window slides across.
+
+    rows, cols = arr.shape
+    numCodes = numLevels*windowSize
+    numWindowsX = window_starts(cols, windowSize, step).size
+
+    lineEnds = np.arange(1, cols+1)*windowSize - 1
+
+    runLengthsKernel = get_kernel("run_lengths", backend)
+
+    for iy, y0 in enumerate(window_starts(rows, windowSize, step)):
+
+        band = arr[y0:y0+windowSize]
+
+        runLevels, runLengths = runLengthsKernel(band.T.ravel(), lineEnds)
+
+        runColumns = (np.cumsum(runLengths) - 1)//windowSize
+        runCodes = runLevels*windowSize + runLengths - 1
+
+        if ignoreBackground:
+            counted = runLevels != 0
+            runColumns, runCodes = runColumns[counted], runCodes[counted]
+
+        columnStarts = np.searchsorted(runColumns, np.arange(cols+1))
+
+        countColumns = lambda a, b: np.bincount(
+            runCodes[columnStarts[a]:columnStarts[b]], minlength=numCodes
+        )
+
+        for ix, counts in _slide_row(countColumns, 0, numWindowsX,
+                                     windowSize, step):
+            glrlm = counts.reshape(numLevels, windowSize)
+            yield iy, ix, as_counts(glrlm, windowSize**2)
+
+
+def iter_glrlm_windows(arr, windowSize, step, numLevels, angle,
+                       ignoreBackground=False, backend=None):
+
+    arr = np.asarray(arr).astype(np.intp, copy=False)
+
+    degrees = angle_to_degrees(angle)
+
+    if degrees == 90:
+        yield from _iter_column_runs(arr, windowSize, step, numLevels,
+                                     ignoreBackground, backend)
+
+    elif degrees == 0:
+
+        # Rows of the image are columns of its transpose, and square windows
+        # map onto each other, so only the window indices swap.
+
+        for ix, iy, glrlm in _iter_column_runs(arr.T, windowSize, step,
+                                               numLevels, ignoreBackground,
+                                               backend):
+            yield iy, ix, glrlm
+
+    else:
+
+        startsY = window_starts(arr.shape[0], windowSize, step)
+        startsX = window_starts(arr.shape[1], windowSize, step)
+
+        for iy, y0 in enumerate(startsY):
+
+            for ix, x0 in enumerate(startsX):
+
+                glrlm = calc_glrlm_multi(arr[y0:y0+windowSize,
+                                             x0:x0+windowSize],
+                                         [angle], None, ignoreBackground,
+                                         numLevels=numLevels,
+                                         backend=backend)[0]
+
+                padded = np.zeros((numLevels, windowSize), dtype=glrlm.dtype)
+                padded[:, :glrlm.shape[1]] = glrlm
+
+                yield iy, ix, padded
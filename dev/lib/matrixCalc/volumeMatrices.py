@@ -0,0 +1,500 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Constructs GLCM, GLRLM, GLSZM, GLDM and NGTDM from 3-D volumes, e.g.
+confocal z-stacks.
+
+INPUT: Volume in form of Numpy array, indexed (z, y, x).
+OUTPIT: Matrices from volume in form of Numpy arrays, laid out as their
+    2-D counterparts.
+
+ARGUMENTS:
+    arr - Volume in form of array.
+    offsets - List of (dz, dy, dx) steps. (Default = VOLUME_OFFSETS, the 13
+        unique directions to the 26 neighbours)
+    distances - List of distances each GLCM offset is scaled by.
+    bitDepth, ignoreBackground, numLevels, alpha - As for the 2-D builders.
+    connectivity - 6, 18 or 26. Whether zones join through faces, faces and
+        edges, or faces, edges and corners. (Default = 26)
+    radius, distance - Size of the cubic neighbourhood of GLDM and NGTDM.
+        (Default = 1, the 3x3x3 neighbourhood)
+    mask - ROI mask the shape of the volume, as for crop_to_mask.
+        (Default = None)
+    backend - Kernel backend tracing the GLRLM runs, as for calc_glrlm.
+
+calc_glcm_3d returns (len(distances)*len(offsets), L, L) and calc_glrlm_3d
+returns (len(offsets), L, longestRun), ordered as calc_glcm_multi and
+calc_glrlm_multi. Every builder works on whole shifted views of the volume.
+The GLCM, GLDM and NGTDM are counted one block of planes at a time to bound
+memory, the GLDM and NGTDM blocks with the planes around them that their
+neighbourhoods reach. Runs
+are found by shearing the volume so each direction lies along an axis, one
+block of lines at a time. Zones are labelled from the runs along each row,
+joined to the runs they touch in the next row and plane, as for the 2-D
+GLSZM.
+"""
+
+import numpy as np
+
+from dev.lib.matrixCalc.backends import get_kernel
+from dev.lib.matrixCalc.matrixGLSZM import _run_zones, _zones_to_glszm
+from dev.lib.matrixCalc.roiMask import crop_to_mask
+from dev.lib.matrixCalc.countTypes import count_dtype, as_counts
+
+
+# (dz, dy, dx) step to the neighbouring voxel for each of the 13 directions.
+# The other 13 neighbours are the opposite steps, which give the same
+# symmetric GLCM and the same runs.
+
+VOLUME_OFFSETS = [
+    (0, 0, 1),
+    (0, 1, -1),
+    (0, 1, 0),
+    (0, 1, 1),
+    (1, -1, -1),
+    (1, -1, 0),
+    (1, -1, 1),
+    (1, 0, -1),
+    (1, 0, 0),
+    (1, 0, 1),
+    (1, 1, -1),
+    (1, 1, 0),
+    (1, 1, 1)
+]
+
+# Planes of the volume counted at once by calc_glcm_3d.
+
+GLCM_BLOCK_PLANES = 16
+
+# Voxels of the sheared volume built at once by calc_glrlm_3d.
+
+GLRLM_BLOCK_VOXELS = 2**22
+
+# Planes of the volume counted at once by calc_gldm_3d and calc_ngtdm_3d.
+
+NEIGHBOUR_BLOCK_PLANES = 16
+
+
+def _shifted_views(arr, offset):
+
+    # As _shifted_pairs, for any number of dimensions.
+
+    first = tuple(slice(max(0, -d), max(0, n-max(0, d)))
+                  for n, d in zip(arr.shape, offset))
+    second = tuple(slice(max(0, d), max(0, n-max(0, -d)))
+                   for n, d in zip(arr.shape, offset))
+
+    return arr[first], arr[second]
+
+
+def _num_levels(arr, bitDepth, numLevels):
+
+    if numLevels is not None:
+        return numLevels
+
+    if bitDepth is not None:
+        return 2**bitDepth
+
+    return int(arr.max()) + 1 if arr.size else 1
+
+
+def calc_glcm_3d(arr, offsets=VOLUME_OFFSETS, distances=(1,), bitDepth=None,
+                 numLevels=None, mask=None):
+
+    arr, mask = crop_to_mask(arr, mask)
+    arr = arr.astype(np.intp, copy=False)
+
+    numLevels = _num_levels(arr, bitDepth, numLevels)
+
+    offsets = list(offsets)
+    distances = list(distances)
+
+    glcms = np.zeros((len(distances)*len(offsets), numLevels, numLevels),
+                     dtype=count_dtype(2*arr.size))
+
+    k = 0
+
+    for distance in distances:
+
+        for offset in offsets:
+
+            step = tuple(d*distance for d in offset)
+
+            first, second = _shifted_views(arr, step)
+
+            if mask is not None:
+                inFirst, inSecond = _shifted_views(mask, step)
+
+            counts = np.zeros(numLevels*numLevels, dtype=np.intp)
+
+            for z0 in range(0, first.shape[0], GLCM_BLOCK_PLANES):
+
+                block = slice(z0, z0 + GLCM_BLOCK_PLANES)
+
+                packed = first[block]*numLevels + second[block]
+
+                if mask is not None:
+                    packed = packed[inFirst[block] & inSecond[block]]
+
+                counts += np.bincount(packed.ravel(),
+                                      minlength=numLevels*numLevels)
+
+            counts = counts.reshape(numLevels, numLevels)
+
+            glcms[k] = counts + counts.T
+
+            k += 1
+
+    return glcms
+
+
+def _volume_lines(arr, mask, offset):
+
+    # Yields the lines along the given direction in blocks, each laid end to
+    # end in one array as _line_sequence does for images. Each plane across
+    # the line's first axis is shifted by its position along that axis, so
+    # every line runs straight down that axis. The sheared volume is built
+    # GLRLM_BLOCK_VOXELS at a time, across its next axis, so every line lies
+    # whole in one block. Shifted-in voxels are -2 and voxels outside the
+    # mask -1, which are never levels and end every run.
+
+    offset = list(offset)
+    axis = next(i for i, d in enumerate(offset) if d != 0)
+
+    if offset[axis] < 0:
+        arr = np.flip(arr, axis)
+        mask = None if mask is None else np.flip(mask, axis)
+        offset[axis] = 1
+
+    arr = np.moveaxis(arr, axis, 0)
+    mask = None if mask is None else np.moveaxis(mask, axis, 0)
+    steps = offset[:axis] + offset[axis+1:]
+
+    n, rows, cols = arr.shape
+
+    # Plane t is shifted by shifts[t] along each of the other two axes.
+
+    shifts = [np.zeros(n, dtype=int) if d == 0 else
+              np.arange(n)[::-1] if d > 0 else np.arange(n)
+              for d in steps]
+
+    shearedRows = rows + (n-1 if steps[0] else 0)
+    shearedCols = cols + (n-1 if steps[1] else 0)
+
+    blockRows = max(1, GLRLM_BLOCK_VOXELS // (n*shearedCols))
+
+    for u0 in range(0, shearedRows, blockRows):
+
+        u1 = min(u0 + blockRows, shearedRows)
+
+        sheared = np.full((n, u1-u0, shearedCols), -2, dtype=np.int32)
+
+        for t in range(n):
+
+            dy, dx = shifts[0][t], shifts[1][t]
+
+            # Rows y0 to y1 of plane t land in this block.
+
+            y0 = max(0, u0 - dy)
+            y1 = min(rows, u1 - dy)
+
+            if y0 >= y1:
+                continue
+
+            plane = arr[t, y0:y1]
+
+            if mask is not None:
+                plane = np.where(mask[t, y0:y1], plane, -1)
+
+            sheared[t, y0+dy-u0:y1+dy-u0, dx:dx+cols] = plane
+
+        values = np.moveaxis(sheared, 0, -1).ravel()
+        lineEnds = np.arange(n - 1, values.size, n)
+
+        yield values, lineEnds
+
+
+def calc_glrlm_3d(arr, offsets=VOLUME_OFFSETS, bitDepth=None,
+                  ignoreBackground=True, numLevels=None, mask=None,
+                  backend=None):
+
+    arr, mask = crop_to_mask(arr, mask)
+    arr = arr.astype(np.intp, copy=False)
+
+    numLevels = _num_levels(arr, bitDepth, numLevels)
+
+    offsets = list(offsets)
+
+    if arr.size == 0:
+        return np.zeros((len(offsets), numLevels, 1), dtype=count_dtype(0))
+
+    runLengthsKernel = get_kernel("run_lengths", backend)
+
+    # Runs are counted block by block into a matrix per direction, widened
+    # whenever a longer run is found. Runs of -1 and -2 are dropped.
+
+    counts = []
+
+    for offset in offsets:
+
+        directionCounts = np.zeros((numLevels, 1), dtype=np.intp)
+
+        for lines in _volume_lines(arr, mask, offset):
+
+            runLevels, runLengths = runLengthsKernel(*lines)
+            runLevels = runLevels.astype(np.intp)
+
+            counted = runLevels >= 0
+
+            if ignoreBackground:
+                counted &= runLevels != 0
+
+            runLevels = runLevels[counted]
+            runLengths = runLengths[counted]
+
+            width = max(directionCounts.shape[1], runLengths.max(initial=0))
+
+            if width > directionCounts.shape[1]:
+                directionCounts = np.pad(
+                    directionCounts,
+                    ((0, 0), (0, width - directionCounts.shape[1]))
+                )
+
+            directionCounts += np.bincount(
+                runLevels*width + (runLengths-1), minlength=numLevels*width
+            ).reshape(numLevels, width)
+
+        counts.append(directionCounts)
+
+    longestRun = max(directionCounts.shape[1] for directionCounts in counts)
+
+    glrlms = np.zeros((len(offsets), numLevels, longestRun),
+                      dtype=count_dtype(arr.size))
+
+    for k, directionCounts in enumerate(counts):
+        glrlms[k, :, :directionCounts.shape[1]] = directionCounts
+
+    return glrlms
+
+
+def _zone_neighbours(shape, rank):
+
+    # (lineStep, hasNext, dx) steps from every row of every plane to the
+    # rows of the same or next plane a zone grows through, for _run_zones.
+    # Steps within rank of a face, edge and corner (1, 2 and 3) are kept.
+    # Only steps forward through the rows are needed, as each join is found
+    # from its earlier side.
+
+    planes, rows, _ = shape
+
+    z, y = np.divmod(np.arange(planes*rows), rows)
+
+    neighbours = []
+
+    for dz in (0, 1):
+        for dy in (-1, 0, 1):
+
+            if dz == 0 and dy < 1:
+                continue
+
+            hasNext = (z + dz < planes) & (y + dy >= 0) & (y + dy < rows)
+
+            for dx in (-1, 0, 1):
+                if dz + abs(dy) + abs(dx) <= rank:
+                    neighbours.append((dz*rows + dy, hasNext, dx))
+
+    return neighbours
+
+
+def calc_glszm_3d(arr, bitDepth, ignoreBackground, numLevels=None,
+                  connectivity=26, mask=None):
+
+    rank = {6: 1, 18: 2, 26: 3}
+
+    if connectivity not in rank:
+        raise ValueError("Connectivity must be 6, 18 or 26.")
+
+    arr, mask = crop_to_mask(arr, mask)
+
+    numLevels = _num_levels(arr, bitDepth, numLevels)
+
+    if arr.size == 0:
+        return np.zeros((numLevels, 1), dtype=count_dtype(0))
+
+    # Voxels that are not counted become -1, which joins no zone. Zones of
+    # every level are labelled at once from the runs along each row, as for
+    # the 2-D GLSZM.
+
+    keys = arr.astype(np.intp)
+
+    if mask is not None:
+        keys[~mask] = -1
+
+    if ignoreBackground:
+        keys[keys == 0] = -1
+
+    zones = _run_zones(keys, _zone_neighbours(arr.shape, rank[connectivity]))
+
+    return _zones_to_glszm(*zones, numLevels)
+
+
+def _plane_blocks(numPlanes, halo):
+
+    # Blocks of NEIGHBOUR_BLOCK_PLANES planes, as (z0, z1, low, high). Planes
+    # z0 to z1 are counted, from planes low to high, which add up to halo
+    # planes either side for their neighbourhoods.
+
+    for z0 in range(0, numPlanes, NEIGHBOUR_BLOCK_PLANES):
+
+        z1 = min(z0 + NEIGHBOUR_BLOCK_PLANES, numPlanes)
+
+        yield z0, z1, max(0, z0 - halo), min(numPlanes, z1 + halo)
+
+
+def _neighbour_views(padded, radius, shape):
+
+    # Every shifted view of a padded volume within radius of the center,
+    # leaving out the center itself.
+
+    for dz in range(-radius, radius+1):
+        for dy in range(-radius, radius+1):
+            for dx in range(-radius, radius+1):
+
+                if dz == 0 and dy == 0 and dx == 0:
+                    continue
+
+                yield padded[radius+dz:radius+dz+shape[0],
+                             radius+dy:radius+dy+shape[1],
+                             radius+dx:radius+dx+shape[2]]
+
+
+def calc_gldm_3d(arr, alpha, bitDepth, numLevels=None, radius=1, mask=None):
+
+    arr, mask = crop_to_mask(arr, mask)
+    arr = arr.astype(np.intp, copy=False)
+
+    numIntensities = _num_levels(arr, bitDepth, numLevels)
+    numColumns = (2*radius+1)**3
+
+    gldm = np.zeros(numIntensities*numColumns, dtype=np.intp)
+
+    if arr.size == 0:
+        return as_counts(gldm, 0).reshape(numIntensities, numColumns)
+
+    # Padding (and voxels outside the mask) are further than alpha from
+    # every voxel, so they are never dependent.
+
+    padValue = arr.min() - alpha - 1
+
+    planes, rows, cols = arr.shape
+
+    for z0, z1, low, high in _plane_blocks(planes, radius):
+
+        # The block and its neighbouring planes, padded to radius on every
+        # side.
+
+        padded = np.full((z1-z0+2*radius, rows+2*radius, cols+2*radius),
+                         padValue, dtype=np.intp)
+
+        inside = (slice(radius-(z0-low), radius+(high-z0)),
+                  slice(radius, radius+rows), slice(radius, radius+cols))
+
+        padded[inside] = arr[low:high]
+
+        if mask is not None:
+            padded[inside][~mask[low:high]] = padValue
+
+        block = arr[z0:z1]
+
+        dependentVoxels = np.zeros(block.shape, dtype=np.intp)
+
+        for neighbour in _neighbour_views(padded, radius, block.shape):
+            dependentVoxels += np.abs(block - neighbour) <= alpha
+
+        codes = block*numColumns + dependentVoxels
+
+        if mask is not None:
+            codes = codes[mask[z0:z1]]
+
+        gldm += np.bincount(codes.ravel(),
+                            minlength=numIntensities*numColumns)
+
+    return as_counts(gldm, arr.size).reshape(numIntensities, numColumns)
+
+
+def _box_sums(arr, distance):
+
+    # Sum of every (2*distance+1) cube, clipped at the volume edges. A box
+    # filter is separable, so each axis is summed in turn from its running
+    # total.
+
+    for axis in range(arr.ndim):
+
+        n = arr.shape[axis]
+
+        total = np.cumsum(arr, axis=axis)
+        total = np.concatenate([np.zeros_like(total.take([0], axis=axis)),
+                                total], axis=axis)
+
+        low = np.clip(np.arange(n) - distance, 0, n)
+        high = np.clip(np.arange(n) + distance + 1, 0, n)
+
+        arr = total.take(high, axis=axis) - total.take(low, axis=axis)
+
+    return arr
+
+
+def calc_ngtdm_3d(arr, ignoreBackground, numLevels=None, distance=1,
+                  mask=None):
+
+    arr, mask = crop_to_mask(arr, mask)
+    arr = arr.astype(np.intp, copy=False)
+
+    numLevels = _num_levels(arr, None, numLevels)
+
+    ngtdm = np.zeros((numLevels, 3))
+
+    totalSize = arr.size if mask is None else np.count_nonzero(mask)
+
+    for z0, z1, low, high in _plane_blocks(arr.shape[0], distance):
+
+        # Box sums over the block and its neighbouring planes are clipped at
+        # the same volume edges as over the whole volume, so the planes z0
+        # to z1 match.
+
+        if mask is None:
+            inROI = np.ones((high-low,) + arr.shape[1:], dtype=np.intp)
+        else:
+            inROI = mask[low:high].astype(np.intp)
+
+        values = arr[low:high]*inROI
+        center = slice(z0-low, z1-low)
+
+        # Neighbourhood sum and size exclude the center voxel itself.
+
+        neighbourSums = (_box_sums(values, distance)[center]
+                         - values[center])
+        neighbourCounts = (_box_sums(inROI, distance)[center]
+                           - inROI[center])
+
+        block = arr[z0:z1]
+
+        counted = (neighbourCounts > 0) & (inROI[center] > 0)
+
+        if ignoreBackground:
+            counted &= block != 0
+
+        levels = block[counted]
+
+        neighbourhoodAverage = neighbourSums[counted]/neighbourCounts[counted]
+        neighbouringGrayDiff = np.abs(levels - neighbourhoodAverage)
+
+        ngtdm[:, 0] += np.bincount(levels, minlength=numLevels)
+        ngtdm[:, 2] += np.bincount(levels, weights=neighbouringGrayDiff,
+                                   minlength=numLevels)
+
+    if totalSize:
+        ngtdm[:, 1] = ngtdm[:, 0]/totalSize
+
+    return ngtdm
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Reads stacks of integer count matrices, e.g. GLRLMs or GLDMs, a block of
+matrices at a time, so the stack is never copied to float whole.
+
+INPUT: Stack of count matrices in form of Numpy array, shape (B, rows,
+    columns).
+OUTPIT: Per matrix entropies, or the stack times a weight matrix.
+
+ARGUMENTS:
+    counts - Stack of count matrices, of any dtype.
+    numCounts - Total count of each matrix, shape (B,).
+    weights - Weights along the columns, shape (columns, k).
+
+countEntropy(counts, numCounts) is -sum p*log2(p) of each matrix, with
+p = counts/numCounts, and nan for a matrix without counts.
+weightedCounts(counts, weights) is counts @ weights, of shape (B, rows, k).
+"""
+
+import numpy as np
+
+
+arbitSmall = 1e-22
+
+# Entries of a stack read at once by countEntropy and weightedCounts, so an
+# integer stack is never copied to float, or indexed entry by entry, whole.
+
+FLOAT_BLOCK_ENTRIES = 2**22
+
+
+def matrixBlocks(counts):
+
+    # Slices of the stack holding about FLOAT_BLOCK_ENTRIES entries each.
+
+    step = max(1, FLOAT_BLOCK_ENTRIES//max(1, np.prod(counts.shape[1:])))
+
+    return [slice(b, b+step) for b in range(0, len(counts), step)]
+
+
+def countEntropy(counts, numCounts):
+
+    # Only the entries that occur add to the entropy, so the logarithm is
+    # taken of the nonzero entries alone, and summed back per matrix. Sums
+    # are written into a float array, as bincount gives integers when no
+    # matrix has any counts.
+
+    entropy = np.zeros(len(counts))
+
+    for block in matrixBlocks(counts):
+
+        b, i, j = np.nonzero(counts[block])
+
+        p = counts[block][b, i, j]/numCounts[block][b]
+
+        entropy[block] = -np.bincount(b, weights=p*np.log2(p+arbitSmall),
+                                      minlength=len(entropy[block]))
+
+    entropy[numCounts == 0] = np.nan
+
+    return entropy
+
+
+def weightedCounts(counts, weights):
+
+    # Integer counts are converted to float a block of matrices at a time.
+
+    weighted = np.zeros((len(counts), counts.shape[-2], weights.shape[-1]))
+
+    for block in matrixBlocks(counts):
+        weighted[block] = counts[block].astype(float) @ weights
+
+    return weighted
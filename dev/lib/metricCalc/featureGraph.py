@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Evaluates only the requested texture features, along with the intermediate
+values they depend on.
+
+INPUT: Dict of nodes. Each node is a function taking `get`, and calls
+    get(name) for any other node it needs.
+OUTPIT: Features in form of Dict, in the order of featureNames.
+
+ARGUMENTS: 
+    nodes - Dict of node name to function, covering features and
+        intermediates.
+    featureNames - Ordered list of feature names that can be requested.
+    features - Features to calculate, given as full names
+        ("GLCM - Contrast") or without the matrix prefix ("Contrast").
+        (Default = None, all features)
+
+evaluateFeatureBatch evaluates nodes that work on a stack of matrices, and
+returns a (B, n_features) array along with the list of feature names.
+
+Nodes are evaluated with numpy's divide and invalid warnings off, so a
+feature that is undefined for a matrix is nan or inf without a warning.
+"""
+
+import numpy as np
+
+
+def resolveFeatureNames(featureNames, features=None):
+
+    if features is None:
+        return list(featureNames)
+
+    if isinstance(features, str):
+        features = [features]
+
+    # Allow names without the "GLCM - " style prefix.
+
+    shortNames = {name.split(" - ", 1)[-1]: name for name in featureNames}
+
+    wanted = set()
+
+    for feature in features:
+
+        if feature in featureNames:
+            wanted.add(feature)
+        elif feature in shortNames:
+            wanted.add(shortNames[feature])
+        else:
+            raise ValueError("Unknown feature: " + str(feature))
+
+    return [name for name in featureNames if name in wanted]
+
+
+def evaluateFeatures(nodes, featureNames, features=None):
+
+    cache = {}
+
+    # Each node is calculated the first time it is asked for, then reused.
+    # Anything no requested feature depends on is never calculated.
+
+    def get(name):
+        if name not in cache:
+            cache[name] = nodes[name](get)
+        return cache[name]
+
+    # Empty, background-only and single-level matrices divide by zero, and
+    # give nan or inf features, without a warning for every node.
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {name: get(name)
+                for name in resolveFeatureNames(featureNames, features)}
+
+
+def evaluateFeatureBatch(nodes, featureNames, features=None, batchSize=None):
+
+    metrics = evaluateFeatures(nodes, featureNames, features)
+
+    names = list(metrics)
+
+    if not names:
+        return np.zeros((batchSize or 0, 0)), names
+
+    # Every feature is one value per matrix of the stack. Features that do
+    # not depend on the matrix are repeated down the stack.
+
+    columns = [np.asarray(metrics[name], dtype=float).reshape(-1)
+               for name in names]
+
+    if batchSize is not None:
+        columns = [np.broadcast_to(column, (batchSize,)) for column in columns]
+
+    table = np.stack(columns, axis=-1)
+
+    return table, names
@@ -8,235 +8,447 @@ INPUT: GLCM form of Numpy array.
 OUTPIT: Features calculates from GLCM in form of Dict.
 
 ARGUMENTS: 
-    glcm - Gray Level Cooccurance Matrix.
-    
+    glcm - Gray Level Cooccurance Matrix. May be a scipy.sparse matrix (as
+        returned by calc_glcm(..., sparse=True)), in which case only the
+        stored level pairs are used and the matrix is never densified.
+    features - List of features to calculate, e.g. ["Contrast", "Correlation"].
+        Intermediates only needed by other features, such as the eigenvalues
+        behind the Maximal Correlation Coefficient, are skipped.
+        (Default = None, all features)
+
+calcGLCMMetricsBatch takes a stack of dense GLCMs of shape (B, L, L)
+instead, and returns a (B, n_features) array and the list of feature names.
 """
 
 import math
 import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+
+from dev.lib.metricCalc.featureGraph import (evaluateFeatures,
+                                              evaluateFeatureBatch)
+
+
+d_0 = 1e-8  # avoid division by zero
+arbitSmall = 1e-22  # Arbitarily Small Number
+
+GLCM_FEATURES = [
+    "GLCM - Autocorrelation",
+    "GLCM - Cluster Prominence",
+    "GLCM - Cluster Shade",
+    "GLCM - Cluster Tendency",
+    "GLCM - Contrast",
+    "GLCM - Correlation",
+    "GLCM - Difference Average",
+    "GLCM - Difference Variance",
+    "GLCM - Difference Entropy",
+    "GLCM - Joint Average",
+    "GLCM - Joint Energy",
+    "GLCM - Joint Entropy",
+    "GLCM - Homogeneity",
+    "GLCM - Informational Measure of Correlation 1",
+    "GLCM - Informational Measure of Correlation 2",
+    "GLCM - Maximal Correlation Coefficient",
+    "GLCM - Inverse Difference Moment",
+    "GLCM - Inverse Difference Moment Normalized",
+    "GLCM - Inverse Difference",
+    "GLCM - Inverse Difference Normalized",
+    "GLCM - Inverse Variance",
+    "GLCM - Maximum Probability",
+    "GLCM - Sum Average",
+    "GLCM - Sum Entropy",
+    "GLCM - Sum Of Squares"
+]
+
+
+def _maxCorrelationDense(get):
+
+    # Q[i][j] = sum_k P[i][k]*P[j][k]/(p_x[i]*p_y[k]), as a matrix product.
+    # d_0 is added once per k, as in the original summation.
+
+    glcm_norm = get("glcm_norm")
+
+    Q = (glcm_norm/(np.outer(get("p_x"), get("p_y"))+arbitSmall)) @ glcm_norm.T
+    Q += get("numGray")*d_0
 
+    eigenvalues = np.sort(np.linalg.eigvals(Q).real)
+    secondLargestEigen = eigenvalues[-2]
 
-def calcGLCMMetrics(glcm):
-
-    # Initialize variables
-    d_0 = 1e-8  # avoid division by zero
-    glcmNormValue = 0
-
-    mu_x = 0
-    mu_y = 0
-
-    sigma_p_x = 0
-    sigma_p_y = 0
-
-    HX = 0
-    HY = 0
-    HXY = 0
-    HXY1 = 0
-    HXY2 = 0
-
-    # Arbitarily Small Number
-
-    arbitSmall = 1e-22
-
-    # Create Dict to store metrics
-
-    glcmMetrics = {
-        "GLCM - Autocorrelation": 0,
-        "GLCM - Cluster Prominence": 0,
-        "GLCM - Cluster Shade": 0,
-        "GLCM - Cluster Tendency": 0,
-        "GLCM - Contrast": 0,
-        "GLCM - Correlation": 0,
-        "GLCM - Difference Average": 0,
-        "GLCM - Difference Variance": 0,
-        "GLCM - Difference Entropy": 0,
-        "GLCM - Joint Average": 0,
-        "GLCM - Joint Energy": 0,
-        "GLCM - Joint Entropy": 0,
-        "GLCM - Homogeneity": 0,
-        "GLCM - Informational Measure of Correlation 1": 0,
-        "GLCM - Informational Measure of Correlation 2": 0,
-        "GLCM - Maximal Correlation Coefficient": 0,
-        "GLCM - Inverse Difference Moment": 0,
-        "GLCM - Inverse Difference Moment Normalized": 0,
-        "GLCM - Inverse Difference": 0,
-        "GLCM - Inverse Difference Normalized": 0,
-        "GLCM - Inverse Variance": 0,
-        "GLCM - Maximum Probability": 0,
-        "GLCM - Sum Average": 0,
-        "GLCM - Sum Entropy": 0,
-        "GLCM - Sum Of Squares": 0
-    }
-
-    # Extract Parameters from GLCM
-
-    numGray = glcm.shape[0]
-    glcm_norm = glcm/(glcm.sum()+1e-8)
-
-    p_x = glcm_norm.sum(1)
-    p_y = glcm_norm.sum(0)
-
-    p_x_plus_y = np.zeros(2*numGray-1)
-    p_x_minus_y = np.zeros(numGray)
-
-    Q = np.zeros([numGray, numGray])
-
-    numGrayLevels = range(0, numGray)
-    numGrayLevelsSum = range(0, 2*numGray-1)
-
-    # Calculate parameters for use in further calculations.
-
-    for i in numGrayLevels:
-
-        mu_x += (i+1)*p_x[i]
-        mu_y += (i+1)*p_y[i]
-    for i in numGrayLevels:
-
-        sigma_p_x += (((i+1)-mu_x)*((i+1)-mu_x))*p_x[i]
-        sigma_p_y += (((i+1)-mu_y)*((i+1)-mu_y))*p_y[i]
-
-    sigma_p_x = math.sqrt(sigma_p_x)
-    sigma_p_y = math.sqrt(sigma_p_y)
-
-    for i in numGrayLevels:
-
-        HX -= p_x[i]*math.log2(p_x[i]+arbitSmall)
-        HY -= p_y[i]*math.log2(p_y[i]+arbitSmall)
-
-        for j in numGrayLevels:
-
-            glcmNormValue = glcm_norm[i][j]
-
-            glcmMetrics["GLCM - Autocorrelation"] += glcmNormValue*(i+1)*(j+1)
-
-            glcmMetrics["GLCM - Joint Average"] += glcmNormValue*(i+1)
-
-            glcmMetrics["GLCM - Cluster Prominence"] += (
-                ((i+1)+(j+1)-mu_x-mu_y) *
-                ((i+1)+(j+1)-mu_x-mu_y) *
-                ((i+1)+(j+1)-mu_x-mu_y) *
-                ((i+1)+(j+1)-mu_x-mu_y)
-            ) * glcmNormValue
-
-            glcmMetrics["GLCM - Cluster Shade"] += (
-                (((i+1)+(j+1)-mu_x-mu_y)*((i+1)+(j+1)-mu_x-mu_y)
-                 * ((i+1)+(j+1)-mu_x-mu_y))*glcmNormValue
-            )
-
-            glcmMetrics["GLCM - Cluster Tendency"] += (
-                (((i+1)+(j+1)-mu_x-mu_y)*((i+1)+(j+1)-mu_x-mu_y))*glcmNormValue
-            )
-
-            glcmMetrics["GLCM - Contrast"] += (
-                (((i+1)-(j+1))*((i+1)-(j+1)))*glcmNormValue
-            )
-
-            glcmMetrics["GLCM - Correlation"] += (
-                glcmNormValue *
-                (((i+1)-mu_x)/(sigma_p_x+d_0)) *
-                (((j+1)-mu_x)/(sigma_p_x+d_0))
-            )
-
-            glcmMetrics["GLCM - Joint Energy"] += (
-                glcmNormValue**2
-            )
-
-            glcmMetrics["GLCM - Joint Entropy"] -= (
-                glcmNormValue*math.log2(glcmNormValue + arbitSmall)
-            )
-
-            glcmMetrics["GLCM - Homogeneity"] += (
-                glcmNormValue/(1+abs((i+1)-(j+1))+d_0)
-            )
-
-            glcmMetrics["GLCM - Sum Of Squares"] += (
-                (((i+1) - mu_x)*((i+1) - mu_x))*glcmNormValue
-            )
-
-            p_x_plus_y[i+j] += glcmNormValue
-            p_x_minus_y[abs(i-j)] += glcmNormValue
-
-            HXY -= glcmNormValue*math.log2(
-                glcmNormValue + arbitSmall
-            )
-            HXY1 -= glcmNormValue*math.log2(
-                p_x[i]*p_y[j] + arbitSmall
-            )
-            HXY2 -= p_x[i]*p_y[j]*math.log2(
-                p_x[i]*p_y[j] + arbitSmall
-            )
-
-            for k in numGrayLevels:
-
-                Q[i][j] += (
-                    (glcm_norm[i][k]*glcm_norm[j][k]) /
-                    (p_x[i]*p_y[k]+arbitSmall)+d_0
-                )
+    return math.sqrt(secondLargestEigen)
 
-    for k in numGrayLevels:
 
-        glcmMetrics["GLCM - Difference Average"] += k*p_x_minus_y[k]
+def _maxCorrelationSparse(get):
 
-    for k in numGrayLevels:
+    # The eigenvalues of Q = Dx^-1 P Dy^-1 P^T are the squared singular values
+    # of M = Dx^-1/2 P Dy^-1/2, which stays sparse. Only levels present in
+    # the marginals are kept, as the rest give zero eigenvalues.
 
-        glcmMetrics["GLCM - Difference Variance"] += (
-            ((k-glcmMetrics["GLCM - Difference Average"])**2)*p_x_minus_y[k]
-        )
+    i, j, p = get("i"), get("j"), get("p")
+    p_x, p_y = get("p_x"), get("p_y")
+    numGray = get("numGray")
 
-        glcmMetrics["GLCM - Difference Entropy"] -= (
-            p_x_minus_y[k]*math.log2(p_x_minus_y[k]+arbitSmall)
-        )
+    rowsKept = np.flatnonzero(p_x)
+    colsKept = np.flatnonzero(p_y)
 
-        glcmMetrics["GLCM - Inverse Difference Moment"] += (
-            p_x_minus_y[k]/(1+(k**2)+d_0)
-        )
+    rowIndex = np.zeros(numGray, dtype=np.int64)
+    colIndex = np.zeros(numGray, dtype=np.int64)
+    rowIndex[rowsKept] = np.arange(rowsKept.size)
+    colIndex[colsKept] = np.arange(colsKept.size)
 
-        glcmMetrics["GLCM - Inverse Difference Moment Normalized"] += (
-            p_x_minus_y[k] / (1+((k*k)/numGray*numGray)+d_0)
-        )
-
-        glcmMetrics["GLCM - Inverse Difference"] += p_x_minus_y[k]/(1+k)
+    M = scipy.sparse.coo_matrix(
+        (p/np.sqrt(p_x[i]*p_y[j]), (rowIndex[i], colIndex[j])),
+        shape=(rowsKept.size, colsKept.size)
+    )
 
-        glcmMetrics["GLCM - Inverse Difference Normalized"] += (
-            p_x_minus_y[k]/(1+(k/numGray)+d_0)
+    if min(M.shape) > 2:
+        singular = scipy.sparse.linalg.svds(
+            M.tocsr(), k=2, return_singular_vectors=False
         )
+    elif min(M.shape) > 0:
+        singular = np.linalg.svd(M.toarray(), compute_uv=False)
+    else:
+        singular = np.zeros(0)
+
+    singular = np.sort(np.concatenate((singular, np.zeros(2))))
+
+    return singular[-2]
+
+
+def _imc1(get):
+
+    if get("HX") != 0 or get("HY") != 0:
+        return (get("HXY") - get("HXY1"))/(max(get("HX"), get("HY"))+d_0)
+
+    return 0
+
+
+def _imc2(get):
+
+    if get("HXY") <= get("HXY2"):
+        return math.sqrt(1-math.exp(-2*(get("HXY2")-get("HXY"))))
+
+    return 0
+
+
+def _hxy2(get):
+
+    # HXY2 runs over every (i, j) of the outer product p_x*p_y. The log of a
+    # product splits, so it reduces to the two marginal entropies.
+
+    nzX = get("p_x")[get("p_x") > 0]
+    nzY = get("p_y")[get("p_y") > 0]
+
+    return -(nzY.sum()*(nzX*np.log2(nzX)).sum()
+             + nzX.sum()*(nzY*np.log2(nzY)).sum())
+
+
+# Every feature is calculated from the nonzero entries (i, j, p) of the
+# normalized GLCM. Zero entries contribute nothing to any of the sums, so
+# dense and sparse GLCMs share these nodes. Gray level values are 1-based,
+# hence gi and gj.
+
+_GLCM_NODES = {
+    "gi": lambda get: get("i")+1,
+    "gj": lambda get: get("j")+1,
+    "levels": lambda get: np.arange(1, get("numGray")+1),
+    "k": lambda get: np.arange(0, get("numGray")),
+    "kSum": lambda get: np.arange(0, 2*get("numGray")-1),
+    "diff": lambda get: np.abs(get("i")-get("j")),
+
+    "p_x": lambda get: np.bincount(get("i"), weights=get("p"),
+                                   minlength=get("numGray")),
+    "p_y": lambda get: np.bincount(get("j"), weights=get("p"),
+                                   minlength=get("numGray")),
+    "p_x_plus_y": lambda get: np.bincount(get("i")+get("j"), weights=get("p"),
+                                          minlength=2*get("numGray")-1),
+    "p_x_minus_y": lambda get: np.bincount(get("diff"), weights=get("p"),
+                                           minlength=get("numGray")),
+
+    "mu_x": lambda get: (get("levels")*get("p_x")).sum(),
+    "mu_y": lambda get: (get("levels")*get("p_y")).sum(),
+    "sigma_p_x": lambda get: math.sqrt(
+        (((get("levels")-get("mu_x"))**2)*get("p_x")).sum()
+    ),
+    "clusterTerm": lambda get: get("gi")+get("gj")-get("mu_x")-get("mu_y"),
+
+    "HX": lambda get: -(get("p_x")*np.log2(get("p_x")+arbitSmall)).sum(),
+    "HY": lambda get: -(get("p_y")*np.log2(get("p_y")+arbitSmall)).sum(),
+    "HXY": lambda get: -(get("p")*np.log2(get("p")+arbitSmall)).sum(),
+    "HXY1": lambda get: -(
+        get("p")*np.log2(get("p_x")[get("i")]*get("p_y")[get("j")]+arbitSmall)
+    ).sum(),
+    "HXY2": _hxy2,
+
+    "GLCM - Autocorrelation": lambda get: (
+        get("p")*get("gi")*get("gj")
+    ).sum(),
+    "GLCM - Cluster Prominence": lambda get: (
+        (get("clusterTerm")**4)*get("p")
+    ).sum(),
+    "GLCM - Cluster Shade": lambda get: (
+        (get("clusterTerm")**3)*get("p")
+    ).sum(),
+    "GLCM - Cluster Tendency": lambda get: (
+        (get("clusterTerm")**2)*get("p")
+    ).sum(),
+    "GLCM - Contrast": lambda get: (
+        ((get("gi")-get("gj"))**2)*get("p")
+    ).sum(),
+    "GLCM - Correlation": lambda get: (
+        get("p") *
+        ((get("gi")-get("mu_x"))/(get("sigma_p_x")+d_0)) *
+        ((get("gj")-get("mu_x"))/(get("sigma_p_x")+d_0))
+    ).sum(),
+    "GLCM - Difference Average": lambda get: (
+        get("k")*get("p_x_minus_y")
+    ).sum(),
+    "GLCM - Difference Variance": lambda get: (
+        ((get("k")-get("GLCM - Difference Average"))**2)*get("p_x_minus_y")
+    ).sum(),
+    "GLCM - Difference Entropy": lambda get: -(
+        get("p_x_minus_y")*np.log2(get("p_x_minus_y")+arbitSmall)
+    ).sum(),
+    "GLCM - Joint Average": lambda get: (get("p")*get("gi")).sum(),
+    "GLCM - Joint Energy": lambda get: (get("p")**2).sum(),
+    "GLCM - Joint Entropy": lambda get: get("HXY"),
+    "GLCM - Homogeneity": lambda get: (
+        get("p")/(1+get("diff")+d_0)
+    ).sum(),
+    "GLCM - Informational Measure of Correlation 1": _imc1,
+    "GLCM - Informational Measure of Correlation 2": _imc2,
+    "GLCM - Inverse Difference Moment": lambda get: (
+        get("p_x_minus_y")/(1+(get("k")**2)+d_0)
+    ).sum(),
+    "GLCM - Inverse Difference Moment Normalized": lambda get: (
+        get("p_x_minus_y")/(1+(get("k")*get("k"))+d_0)
+    ).sum(),
+    "GLCM - Inverse Difference": lambda get: (
+        get("p_x_minus_y")/(1+get("k"))
+    ).sum(),
+    "GLCM - Inverse Difference Normalized": lambda get: (
+        get("p_x_minus_y")/(1+(get("k")/get("numGray"))+d_0)
+    ).sum(),
+    "GLCM - Inverse Variance": lambda get: (
+        get("p_x_minus_y")[1:]/(get("k")[1:]**2)
+    ).sum(),
+    "GLCM - Maximum Probability": lambda get: (
+        get("p").max() if get("p").size else 0
+    ),
+    "GLCM - Sum Average": lambda get: (
+        get("p_x_plus_y")*(get("kSum")+2)
+    ).sum(),
+    "GLCM - Sum Entropy": lambda get: -(
+        get("p_x_plus_y")*np.log2(get("p_x_plus_y")+arbitSmall)
+    ).sum(),
+    "GLCM - Sum Of Squares": lambda get: (
+        ((get("gi")-get("mu_x"))**2)*get("p")
+    ).sum()
+}
+
+
+def _xlog2x(p):
+
+    # p*log2(p), taken as 0 where p is 0.
+
+    return np.where(p > 0, p*np.log2(np.where(p > 0, p, 1)), 0)
+
+
+def _batchMaxCorrelation(get):
+
+    P = get("p")
+
+    Q = (P/(get("p_x")[:, :, None]*get("p_y")[:, None, :]+arbitSmall)) @ \
+        P.transpose(0, 2, 1)
+    Q += get("numGray")*d_0
+
+    eigenvalues = np.sort(np.linalg.eigvals(Q).real, axis=-1)
+
+    return np.sqrt(eigenvalues[:, -2])
+
+
+# The same features for a stack of dense GLCMs, p of shape (B, L, L), with
+# per-matrix values of shape (B,). Only the entropies and the marginals
+# visit every (i, j). The rest are taken from the marginals, as each
+# depends on i and j only through i, j, i+j or |i-j|, or are bilinear forms
+# evaluated with einsum without building (B, L, L) temporaries.
+
+_GLCM_BATCH_NODES = {
+    "levels": lambda get: np.arange(1, get("numGray")+1),
+    "k": lambda get: np.arange(0, get("numGray")),
+    "kSum": lambda get: np.arange(0, 2*get("numGray")-1),
+    "index": lambda get: np.arange(get("numGray")),
+
+    "p_x": lambda get: get("p").sum(-1),
+    "p_y": lambda get: get("p").sum(-2),
+    "p_x_plus_y": lambda get: _batchBincount(
+        get("p"), get("index")[:, None]+get("index")[None, :],
+        2*get("numGray")-1
+    ),
+    "p_x_minus_y": lambda get: _batchBincount(
+        get("p"), np.abs(get("index")[:, None]-get("index")[None, :]),
+        get("numGray")
+    ),
+
+    "mu_x": lambda get: (get("levels")*get("p_x")).sum(-1),
+    "mu_y": lambda get: (get("levels")*get("p_y")).sum(-1),
+    "sigma_p_x": lambda get: np.sqrt(
+        (((get("levels")-get("mu_x")[:, None])**2)*get("p_x")).sum(-1)
+    ),
+    "clusterTerm": lambda get: (
+        get("kSum")+2-get("mu_x")[:, None]-get("mu_y")[:, None]
+    ),
+
+    "HX": lambda get: -(get("p_x")*np.log2(get("p_x")+arbitSmall)).sum(-1),
+    "HY": lambda get: -(get("p_y")*np.log2(get("p_y")+arbitSmall)).sum(-1),
+    "HXY": lambda get: -(get("p")*np.log2(get("p")+arbitSmall)).sum((-2, -1)),
+    "HXY1": lambda get: -(get("p")*np.log2(
+        get("p_x")[:, :, None]*get("p_y")[:, None, :]+arbitSmall
+    )).sum((-2, -1)),
+    "HXY2": lambda get: -(
+        get("p_y").sum(-1)*_xlog2x(get("p_x")).sum(-1)
+        + get("p_x").sum(-1)*_xlog2x(get("p_y")).sum(-1)
+    ),
+
+    "GLCM - Autocorrelation": lambda get: np.einsum(
+        "bij,i,j->b", get("p"), get("levels"), get("levels")
+    ),
+    "GLCM - Cluster Prominence": lambda get: (
+        (get("clusterTerm")**4)*get("p_x_plus_y")
+    ).sum(-1),
+    "GLCM - Cluster Shade": lambda get: (
+        (get("clusterTerm")**3)*get("p_x_plus_y")
+    ).sum(-1),
+    "GLCM - Cluster Tendency": lambda get: (
+        (get("clusterTerm")**2)*get("p_x_plus_y")
+    ).sum(-1),
+    "GLCM - Contrast": lambda get: (
+        (get("k")**2)*get("p_x_minus_y")
+    ).sum(-1),
+    "GLCM - Correlation": lambda get: np.einsum(
+        "bij,bi,bj->b", get("p"), get("standardLevels"), get("standardLevels")
+    ),
+    "standardLevels": lambda get: (
+        (get("levels")-get("mu_x")[:, None])/(get("sigma_p_x")[:, None]+d_0)
+    ),
+    "GLCM - Difference Average": lambda get: (
+        get("k")*get("p_x_minus_y")
+    ).sum(-1),
+    "GLCM - Difference Variance": lambda get: (
+        ((get("k")-get("GLCM - Difference Average")[:, None])**2)
+        * get("p_x_minus_y")
+    ).sum(-1),
+    "GLCM - Difference Entropy": lambda get: -(
+        get("p_x_minus_y")*np.log2(get("p_x_minus_y")+arbitSmall)
+    ).sum(-1),
+    "GLCM - Joint Average": lambda get: get("mu_x"),
+    "GLCM - Joint Energy": lambda get: np.einsum(
+        "bij,bij->b", get("p"), get("p")
+    ),
+    "GLCM - Joint Entropy": lambda get: get("HXY"),
+    "GLCM - Homogeneity": lambda get: (
+        get("p_x_minus_y")/(1+get("k")+d_0)
+    ).sum(-1),
+    "GLCM - Informational Measure of Correlation 1": lambda get: np.where(
+        (get("HX") != 0) | (get("HY") != 0),
+        (get("HXY") - get("HXY1"))/(np.maximum(get("HX"), get("HY"))+d_0),
+        0
+    ),
+    "GLCM - Informational Measure of Correlation 2": lambda get: np.sqrt(
+        1-np.exp(-2*np.maximum(get("HXY2")-get("HXY"), 0))
+    ),
+    "GLCM - Maximal Correlation Coefficient": _batchMaxCorrelation,
+    "GLCM - Inverse Difference Moment": lambda get: (
+        get("p_x_minus_y")/(1+(get("k")**2)+d_0)
+    ).sum(-1),
+    "GLCM - Inverse Difference Moment Normalized": lambda get: (
+        get("p_x_minus_y")/(1+(get("k")*get("k"))+d_0)
+    ).sum(-1),
+    "GLCM - Inverse Difference": lambda get: (
+        get("p_x_minus_y")/(1+get("k"))
+    ).sum(-1),
+    "GLCM - Inverse Difference Normalized": lambda get: (
+        get("p_x_minus_y")/(1+(get("k")/get("numGray"))+d_0)
+    ).sum(-1),
+    "GLCM - Inverse Variance": lambda get: (
+        get("p_x_minus_y")[:, 1:]/(get("k")[1:]**2)
+    ).sum(-1),
+    "GLCM - Maximum Probability": lambda get: get("p").max((-2, -1)),
+    "GLCM - Sum Average": lambda get: (
+        get("p_x_plus_y")*(get("kSum")+2)
+    ).sum(-1),
+    "GLCM - Sum Entropy": lambda get: -(
+        get("p_x_plus_y")*np.log2(get("p_x_plus_y")+arbitSmall)
+    ).sum(-1),
+    "GLCM - Sum Of Squares": lambda get: (
+        ((get("levels")-get("mu_x")[:, None])**2)*get("p_x")
+    ).sum(-1)
+}
+
+
+def _batchBincount(p, index, length):
+
+    # Sums each matrix of the stack by a shared (L, L) index, as bincount
+    # does for one matrix. Each matrix is moved to its own range of bins.
+
+    numBatch = p.shape[0]
+
+    bins = (np.arange(numBatch)[:, None, None]*length + index).ravel()
+
+    return np.bincount(bins, weights=p.ravel(),
+                       minlength=numBatch*length).reshape(numBatch, length)
+
+
+def calcGLCMMetricsBatch(glcms, features=None):
+
+    glcms = np.asarray(glcms)
+
+    nodes = dict(_GLCM_BATCH_NODES)
+
+    numGray = glcms.shape[-1]
+    nodes["numGray"] = lambda get: numGray
+
+    # Integer counts become float here, in the one normalizing division.
+
+    p = glcms/(glcms.sum((-2, -1), keepdims=True, dtype=float)+1e-8)
+    nodes["p"] = lambda get: p
+
+    return evaluateFeatureBatch(nodes, GLCM_FEATURES, features, len(glcms))
+
+
+def calcGLCMMetrics(glcm, features=None):
+
+    nodes = dict(_GLCM_NODES)
 
-        if k == 0:
-            continue
+    numGray = glcm.shape[0]
+    nodes["numGray"] = lambda get: numGray
 
-        glcmMetrics["GLCM - Inverse Variance"] += p_x_minus_y[k]/(k**2)
+    # Extract nonzero entries from GLCM
 
-    for k in numGrayLevelsSum:
+    if scipy.sparse.issparse(glcm):
 
-        glcmMetrics["GLCM - Sum Average"] += (
-            p_x_plus_y[k]*(k+2)
-        )
+        glcm = glcm.tocoo()
+        glcm.sum_duplicates()
 
-        glcmMetrics["GLCM - Sum Entropy"] -= (
-            p_x_plus_y[k]*math.log2(p_x_plus_y[k]+arbitSmall)
-        )
+        i = glcm.row.astype(np.int64)
+        j = glcm.col.astype(np.int64)
+        p = glcm.data/(glcm.data.sum(dtype=float)+1e-8)
 
-    if HX != 0 or HY != 0:
+        nodes["GLCM - Maximal Correlation Coefficient"] = _maxCorrelationSparse
 
-        glcmMetrics["GLCM - Informational Measure of Correlation 1"] = (
-            (HXY - HXY1)/(max(HX, HY)+d_0)
-        )
+    else:
 
-    if HXY <= HXY2:
+        glcm_norm = glcm/(glcm.sum(dtype=float)+1e-8)
 
-        glcmMetrics["GLCM - Informational Measure of Correlation 2"] = (
-            math.sqrt(1-math.exp(-2*(HXY2-HXY)))
-        )
+        i, j = np.nonzero(glcm_norm)
+        p = glcm_norm[i, j]
 
-    eigenvalues = np.sort(np.linalg.eigvals(Q).real)
-    secondLargestEigen = eigenvalues[-2]
+        nodes["glcm_norm"] = lambda get: glcm_norm
+        nodes["GLCM - Maximal Correlation Coefficient"] = _maxCorrelationDense
 
-    glcmMetrics["GLCM - Maximal Correlation Coefficient"] = (
-        math.sqrt(secondLargestEigen)
-    )
+    nodes["i"] = lambda get: i
+    nodes["j"] = lambda get: j
+    nodes["p"] = lambda get: p
 
-    glcmMetrics["GLCM - Maximum Probability"] = (
-        glcm_norm.max()
-    )
+    glcmMetrics = evaluateFeatures(nodes, GLCM_FEATURES, features)
 
     return glcmMetrics
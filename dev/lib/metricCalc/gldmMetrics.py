@@ -10,143 +10,139 @@ OUTPIT: Features calculates from GLDM in form of Dict.
 
 ARGUMENTS: 
     gldm - Gray Level Dependence Matrix.
-    
+    features - List of features to calculate, e.g. ["Dependence Entropy"].
+        (Default = None, all features)
+
+calcGLDMMetricsBatch takes a stack of shape (B, rows, columns) instead, and
+returns a (B, n_features) array and the list of feature names.
 """
 
-import math
-
-def calcGLDMMetrics(gldm):
-
-    # Initialized Parameters
-    
-    numGray = gldm.shape[0]
-    numSize = gldm.shape[1]
-    numZones = gldm.sum()
-    
-    gldm_norm = gldm/numZones
-    
-    rowTotal = 0
-    colTotal = 0
-    
-    avgGray = 0
-    avgSize = 0
-    
-    arbitSmall = 1e-22
-    
-    # Create Dict to store metrics
-    
-    gldmMetrics = {
-        "GLDM - Small Dependence Emphasis" : 0,
-        "GLDM - Large Dependence Emphasis" : 0,
-        "GLDM - Low Gray Level Emphasis" : 0,         
-        "GLDM - High Gray Level Emphasis" : 0,
-        "GLDM - Small Dependence Low Gray Level Emphasis" : 0,
-        "GLDM - Large Dependence Low Gray Level Emphasis" : 0,
-        "GLDM - Small Dependence High Gray Level Emphasis" : 0,
-        "GLDM - Large Dependence High Gray Level Emphasis" : 0,
-        "GLDM - Gray Level Variance" : 0,
-        "GLDM - Gray Level Non-Uniformity" : 0,
-        "GLDM - Gray Level Non-Uniformity Normalized" : 0,
-        "GLDM - Dependence Variance" : 0,
-        "GLDM - Dependence Non-Uniformity" : 0,
-        "GLDM - Dependence Non-Uniformity Normalized" : 0,
-        "GLDM - Dependence Entropy" : 0
-        }
-    
-    # Calculate average for gray levels
-    
-    for i in range(0, numGray):
-        for j in range(0, numSize):
-        
-            avgGray += gldm_norm[i][j]*(i+1)
-            
-    # Calculate average for size zones
-            
-    for i in range(0, numGray):
-        for j in range(0, numSize):
-        
-            avgSize += gldm_norm[i][j]*(j+1)
-    
+import numpy as np
+
+from dev.lib.metricCalc.featureGraph import evaluateFeatureBatch
+from dev.lib.metricCalc.countStacks import countEntropy, weightedCounts
+
+
+arbitSmall = 1e-22
+
+GLDM_FEATURES = [
+    "GLDM - Small Dependence Emphasis",
+    "GLDM - Large Dependence Emphasis",
+    "GLDM - Low Gray Level Emphasis",
+    "GLDM - High Gray Level Emphasis",
+    "GLDM - Small Dependence Low Gray Level Emphasis",
+    "GLDM - Large Dependence Low Gray Level Emphasis",
+    "GLDM - Small Dependence High Gray Level Emphasis",
+    "GLDM - Large Dependence High Gray Level Emphasis",
+    "GLDM - Gray Level Variance",
+    "GLDM - Gray Level Non-Uniformity",
+    "GLDM - Gray Level Non-Uniformity Normalized",
+    "GLDM - Dependence Variance",
+    "GLDM - Dependence Non-Uniformity",
+    "GLDM - Dependence Non-Uniformity Normalized",
+    "GLDM - Dependence Entropy"
+]
+
+
+# Every node works on a stack of matrices of shape (B, rows, columns), and
+# features are one value per matrix. Gray levels (i) run down the rows and
+# dependence counts (j) across the columns, both 1-based.
+#
+# As for GLRLMs, features that weight by gray level or by dependence alone
+# are taken from the marginals, and the four that weight by both from one
+# product with the weight vectors. The stack is left as integer counts, and
+# only the marginals and products taken from it are float.
+
+_GLDM_NODES = {
+    "grayZones": lambda get: get("gldm").sum(-1, dtype=float),
+    "dependenceZones": lambda get: get("gldm").sum(-2, dtype=float),
+    "numZones": lambda get: get("grayZones").sum(-1),
+    "i": lambda get: np.arange(1, get("gldm").shape[-2]+1, dtype=float),
+    "j": lambda get: np.arange(1, get("gldm").shape[-1]+1, dtype=float),
+    "grayWeights": lambda get: np.stack([1/get("i")**2, get("i")**2], -1),
+    "dependenceWeights": lambda get: np.stack([1/get("j")**2, get("j")**2],
+                                              -1),
+
+    # [small, large] dependence by [low, high] gray levels, per matrix.
+
+    "jointEmphasis": lambda get: np.einsum(
+        "bik,il->bkl",
+        weightedCounts(get("gldm"), get("dependenceWeights")),
+        get("grayWeights")
+    )/get("numZones")[:, None, None],
+
+    # Calculate average for gray levels and dependence sizes
+
+    "avgGray": lambda get: get("grayZones") @ get("i")/get("numZones"),
+    "avgSize": lambda get: get("dependenceZones") @ get("j")/get("numZones"),
+
     # Calculate metrics
-    
-    for i in range(0, numGray):
-        for j in range(0, numSize):
-            
-            gldmValue = gldm[i][j]
-            gldmNormValue = gldm_norm[i][j]
-            
-            gldmMetrics["GLDM - Small Dependence Emphasis"] += \
-                gldmValue/((j+1)**2)
-            
-            gldmMetrics["GLDM - Large Dependence Emphasis"] += \
-                gldmValue*((j+1)**2)
-            
-            gldmMetrics["GLDM - Low Gray Level Emphasis"] += \
-                gldmValue/((i+1)**2)
-            
-            gldmMetrics["GLDM - High Gray Level Emphasis"] += \
-                gldmValue*((i+1)**2)
-            
-            gldmMetrics["GLDM - Small Dependence Low Gray Level Emphasis"] += \
-                gldmValue/(((i+1)**2)*((j+1)**2))
-            
-            gldmMetrics["GLDM - Small Dependence High Gray Level Emphasis"] +=\
-                (gldmValue*((i+1)**2))/((j+1)**2)
-            
-            gldmMetrics["GLDM - Large Dependence Low Gray Level Emphasis"] += \
-                (gldmValue*((j+1)**2))/((i+1)**2)
-            
-            gldmMetrics["GLDM - Large Dependence High Gray Level Emphasis"] +=\
-                gldmValue*(((i+1)**2)*((j+1)**2))
-                        
-            gldmMetrics["GLDM - Gray Level Variance"] += \
-                gldmNormValue*(((i+1)-avgGray)*((i+1)-avgGray))
-            
-            gldmMetrics["GLDM - Dependence Variance"] += \
-                gldmNormValue*(((j+1)-avgSize)*((j+1)-avgGray))
-            
-            gldmMetrics["GLDM - Dependence Entropy"] -= \
-                gldmNormValue*math.log2(gldmNormValue+arbitSmall)
-            
-            rowTotal += gldmValue
-        
-        gldmMetrics["GLDM - Gray Level Non-Uniformity"] += rowTotal**2
-        
-        rowTotal = 0
-        
-    for j in range(0, numSize):
-        for i in range(0, numGray):
-            
-            colTotal += gldm[i][j]
-            
-        gldmMetrics["GLDM - Dependence Non-Uniformity"] += colTotal**2
-        
-        colTotal = 0
-        
-    gldmMetrics["GLDM - Small Dependence Emphasis"] /= numZones
-    
-    gldmMetrics["GLDM - Large Dependence Emphasis"] /= numZones
-    
-    gldmMetrics["GLDM - Low Gray Level Emphasis"] /= numZones
-    
-    gldmMetrics["GLDM - High Gray Level Emphasis"] /= numZones
-    
-    gldmMetrics["GLDM - Small Dependence Low Gray Level Emphasis"] /= numZones
-    
-    gldmMetrics["GLDM - Small Dependence High Gray Level Emphasis"] /= numZones
-    
-    gldmMetrics["GLDM - Large Dependence Low Gray Level Emphasis"] /= numZones
-    
-    gldmMetrics["GLDM - Large Dependence High Gray Level Emphasis"] /= numZones
-    
-    gldmMetrics["GLDM - Gray Level Non-Uniformity"] /= numZones
-    
-    gldmMetrics["GLDM - Gray Level Non-Uniformity Normalized"] \
-        = gldmMetrics["GLDM - Gray Level Non-Uniformity"]/numZones
-    
-    gldmMetrics["GLDM - Dependence Non-Uniformity"] /= numZones
-    
-    gldmMetrics["GLDM - Dependence Non-Uniformity Normalized"] \
-        = gldmMetrics["GLDM - Dependence Non-Uniformity"]/numZones
-    
+
+    "GLDM - Small Dependence Emphasis": lambda get: (
+        get("dependenceZones") @ get("dependenceWeights")[:, 0]
+        / get("numZones")
+    ),
+    "GLDM - Large Dependence Emphasis": lambda get: (
+        get("dependenceZones") @ get("dependenceWeights")[:, 1]
+        / get("numZones")
+    ),
+    "GLDM - Low Gray Level Emphasis": lambda get: (
+        get("grayZones") @ get("grayWeights")[:, 0]/get("numZones")
+    ),
+    "GLDM - High Gray Level Emphasis": lambda get: (
+        get("grayZones") @ get("grayWeights")[:, 1]/get("numZones")
+    ),
+    "GLDM - Small Dependence Low Gray Level Emphasis": lambda get: (
+        get("jointEmphasis")[:, 0, 0]
+    ),
+    "GLDM - Large Dependence Low Gray Level Emphasis": lambda get: (
+        get("jointEmphasis")[:, 1, 0]
+    ),
+    "GLDM - Small Dependence High Gray Level Emphasis": lambda get: (
+        get("jointEmphasis")[:, 0, 1]
+    ),
+    "GLDM - Large Dependence High Gray Level Emphasis": lambda get: (
+        get("jointEmphasis")[:, 1, 1]
+    ),
+    "GLDM - Gray Level Variance": lambda get: (
+        get("grayZones")*(get("i") - get("avgGray")[:, None])**2
+    ).sum(-1)/get("numZones"),
+    "GLDM - Gray Level Non-Uniformity": lambda get: (
+        (get("grayZones")**2).sum(-1)/get("numZones")
+    ),
+    "GLDM - Gray Level Non-Uniformity Normalized": lambda get: (
+        get("GLDM - Gray Level Non-Uniformity")/get("numZones")
+    ),
+    "GLDM - Dependence Variance": lambda get: (
+        get("dependenceZones")*(get("j") - get("avgSize")[:, None])
+        * (get("j") - get("avgGray")[:, None])
+    ).sum(-1)/get("numZones"),
+    "GLDM - Dependence Non-Uniformity": lambda get: (
+        (get("dependenceZones")**2).sum(-1)/get("numZones")
+    ),
+    "GLDM - Dependence Non-Uniformity Normalized": lambda get: (
+        get("GLDM - Dependence Non-Uniformity")/get("numZones")
+    ),
+    "GLDM - Dependence Entropy": lambda get: countEntropy(get("gldm"),
+                                                          get("numZones"))
+}
+
+
+def calcGLDMMetricsBatch(gldms, features=None):
+
+    gldms = np.asarray(gldms)
+
+    nodes = dict(_GLDM_NODES)
+    nodes["gldm"] = lambda get: gldms
+
+    return evaluateFeatureBatch(nodes, GLDM_FEATURES, features,
+                                len(gldms))
+
+
+def calcGLDMMetrics(gldm, features=None):
+
+    table, names = calcGLDMMetricsBatch(np.asarray(gldm)[None], features)
+
+    gldmMetrics = dict(zip(names, table[0]))
+
     return gldmMetrics
@@ -10,144 +10,144 @@ OUTPIT: Features calculates from GLRLM in form of Dict.
 
 ARGUMENTS: 
     glrlm - Gray Level Run Length Matrix.
-    numPixels - Total number of pixels found in image. 
-    
+    numPixels - Total number of pixels found in image.
+    features - List of features to calculate, e.g. ["Short Run Emphasis"].
+        (Default = None, all features)
+
+calcGLRLMMetricsBatch takes a stack of shape (B, rows, columns) instead, and
+returns a (B, n_features) array and the list of feature names. numPixels may
+be one count, or one per matrix.
 """
 
-import math
-
-def calcGLRLMMetrics(glrlm, numPixels):
-
-    # Initialized Parameters
-    
-    numGray = glrlm.shape[0]
-    numLength = glrlm.shape[1]
-    numRuns = glrlm.sum()
-    
-    glrlm_norm = glrlm/numRuns
-    
-    rowTotal = 0
-    colTotal = 0
-    
-    avgGray = 0
-    avgLength = 0
-    
-    arbitSmall = 1e-22
-    
-    # Create Dict to store metrics
-    
-    glrlmMetrics = {
-            "GLRLM - Short Run Emphasis" : 0,
-            "GLRLM - Long Run Emphasis" : 0,
-            "GLRLM - Low Gray Level Run Emphasis" : 0,            
-            "GLRLM - High Gray Level Run Emphasis" : 0,       
-            "GLRLM - Short Run Low Gray Emphasis" : 0,
-            "GLRLM - Short Run High Gray Emphasis" : 0,
-            "GLRLM - Long Run Low Gray Emphasis" : 0,
-            "GLRLM - Long Run High Gray Emphasis" : 0,
-            "GLRLM - Gray Level Variance" : 0,  
-            "GLRLM - Gray Level Non-Uniformity" : 0,
-            "GLRLM - Gray Level Non-Uniformity Normalized" : 0,
-            "GLRLM - Run Variance" : 0,
-            "GLRLM - Run Length Non-Uniformity" : 0,
-            "GLRLM - Run Length Non-Uniformity Normalized" : 0,
-            "GLRLM - Run Length Percentage" : 0,
-            "GLRLM - Run Entropy" : 0
-        }
-    
-    # Calculate average for gray levels
-    
-    for i in range(0, numGray):
-        for j in range(0, numLength):
-        
-            avgGray += glrlm_norm[i][j]*(i+1)
-            
-    # Calculate average for size zones
-            
-    for i in range(0, numGray):
-        for j in range(0, numLength):
-        
-            avgLength += glrlm_norm[i][j]*(j+1)
-    
+import numpy as np
+
+from dev.lib.metricCalc.featureGraph import evaluateFeatureBatch
+from dev.lib.metricCalc.countStacks import countEntropy, weightedCounts
+
+
+arbitSmall = 1e-22
+
+GLRLM_FEATURES = [
+    "GLRLM - Short Run Emphasis",
+    "GLRLM - Long Run Emphasis",
+    "GLRLM - Low Gray Level Run Emphasis",
+    "GLRLM - High Gray Level Run Emphasis",
+    "GLRLM - Short Run Low Gray Emphasis",
+    "GLRLM - Short Run High Gray Emphasis",
+    "GLRLM - Long Run Low Gray Emphasis",
+    "GLRLM - Long Run High Gray Emphasis",
+    "GLRLM - Gray Level Variance",
+    "GLRLM - Gray Level Non-Uniformity",
+    "GLRLM - Gray Level Non-Uniformity Normalized",
+    "GLRLM - Run Variance",
+    "GLRLM - Run Length Non-Uniformity",
+    "GLRLM - Run Length Non-Uniformity Normalized",
+    "GLRLM - Run Length Percentage",
+    "GLRLM - Run Entropy"
+]
+
+
+# Every node works on a stack of matrices of shape (B, rows, columns), and
+# features are one value per matrix. Gray levels (i) run down the rows and
+# run lengths (j) across the columns, both 1-based.
+#
+# Features that weight by gray level or by run length alone are taken from
+# the gray level and run length marginals. The four that weight by both are
+# the bilinear forms of the matrix with the weight vectors 1/j^2, j^2 and
+# 1/i^2, i^2, found for all four in one product. Only the entropy reads the
+# matrix again, at its nonzero entries. The stack is left as integer counts,
+# and only the marginals and products taken from it are float.
+
+_GLRLM_NODES = {
+    "grayRuns": lambda get: get("glrlm").sum(-1, dtype=float),
+    "lengthRuns": lambda get: get("glrlm").sum(-2, dtype=float),
+    "numRuns": lambda get: get("grayRuns").sum(-1),
+    "i": lambda get: np.arange(1, get("glrlm").shape[-2]+1, dtype=float),
+    "j": lambda get: np.arange(1, get("glrlm").shape[-1]+1, dtype=float),
+    "grayWeights": lambda get: np.stack([1/get("i")**2, get("i")**2], -1),
+    "lengthWeights": lambda get: np.stack([1/get("j")**2, get("j")**2], -1),
+
+    # [short, long] runs by [low, high] gray levels, per matrix.
+
+    "jointEmphasis": lambda get: np.einsum(
+        "bik,il->bkl", weightedCounts(get("glrlm"), get("lengthWeights")),
+        get("grayWeights")
+    )/get("numRuns")[:, None, None],
+
+    # Calculate average for gray levels and run lengths
+
+    "avgGray": lambda get: get("grayRuns") @ get("i")/get("numRuns"),
+    "avgLength": lambda get: get("lengthRuns") @ get("j")/get("numRuns"),
+
     # Calculate metrics
-    
-    for i in range(0, numGray):
-        for j in range(0, numLength):
-            
-            glrlmMetrics["GLRLM - Short Run Emphasis"] += \
-                glrlm[i][j]/((j+1)**2)
-            
-            glrlmMetrics["GLRLM - Long Run Emphasis"] += \
-                glrlm[i][j]*((j+1)**2)
-            
-            glrlmMetrics["GLRLM - Low Gray Level Run Emphasis"] += \
-                glrlm[i][j]/((i+1)**2)
-            
-            glrlmMetrics["GLRLM - High Gray Level Run Emphasis"] += \
-                glrlm[i][j]*((i+1)**2)
-            
-            glrlmMetrics["GLRLM - Short Run Low Gray Emphasis"] += \
-                glrlm[i][j]/(((i+1)**2)*((j+1)**2))
-            
-            glrlmMetrics["GLRLM - Short Run High Gray Emphasis"] += \
-                (glrlm[i][j]*((i+1)**2))/((j+1)**2)
-            
-            glrlmMetrics["GLRLM - Long Run Low Gray Emphasis"] += \
-                (glrlm[i][j]*((j+1)**2))/((i+1)**2)
-            
-            glrlmMetrics["GLRLM - Long Run High Gray Emphasis"] += \
-                glrlm[i][j]*(((i+1)**2)*((j+1)**2))
-                        
-            glrlmMetrics["GLRLM - Gray Level Variance"] += \
-                glrlm_norm[i][j]*(((i+1)-avgGray)*((i+1)-avgGray))
-            
-            glrlmMetrics["GLRLM - Run Variance"] += \
-                glrlm_norm[i][j]*(((j+1)-avgLength)*((j+1)-avgLength))
-            
-            glrlmMetrics["GLRLM - Run Entropy"] -= \
-                glrlm_norm[i][j]*math.log2(glrlm_norm[i][j]+arbitSmall)
-            
-            rowTotal += glrlm[i][j]
-        
-        glrlmMetrics["GLRLM - Gray Level Non-Uniformity"] += rowTotal**2
-        
-        rowTotal = 0
-        
-    for j in range(0, numLength):
-        for i in range(0, numGray):
-            
-            colTotal += glrlm[i][j]
-            
-        glrlmMetrics["GLRLM - Run Length Non-Uniformity"] += colTotal**2
-        
-        colTotal = 0
-        
-    glrlmMetrics["GLRLM - Short Run Emphasis"] /= numRuns
-    
-    glrlmMetrics["GLRLM - Long Run Emphasis"] /= numRuns
-    
-    glrlmMetrics["GLRLM - Low Gray Level Run Emphasis"] /= numRuns
-    
-    glrlmMetrics["GLRLM - High Gray Level Run Emphasis"] /= numRuns
-    
-    glrlmMetrics["GLRLM - Short Run Low Gray Emphasis"] /= numRuns
-    
-    glrlmMetrics["GLRLM - Short Run High Gray Emphasis"] /= numRuns
-    
-    glrlmMetrics["GLRLM - Long Run Low Gray Emphasis"] /= numRuns
-    
-    glrlmMetrics["GLRLM - Long Run High Gray Emphasis"] /= numRuns
-    
-    glrlmMetrics["GLRLM - Gray Level Non-Uniformity"] /= numRuns
-    
-    glrlmMetrics["GLRLM - Gray Level Non-Uniformity Normalized"] \
-        = glrlmMetrics["GLRLM - Gray Level Non-Uniformity"]/numRuns
-    
-    glrlmMetrics["GLRLM - Run Length Non-Uniformity"] /= numRuns
-    
-    glrlmMetrics["GLRLM - Run Length Non-Uniformity Normalized"] \
-        = glrlmMetrics["GLRLM - Run Length Non-Uniformity"]/numRuns
-    
-    glrlmMetrics["GLRLM - Run Length Percentage"] = numRuns/numPixels
-    
+
+    "GLRLM - Short Run Emphasis": lambda get: (
+        get("lengthRuns") @ get("lengthWeights")[:, 0]/get("numRuns")
+    ),
+    "GLRLM - Long Run Emphasis": lambda get: (
+        get("lengthRuns") @ get("lengthWeights")[:, 1]/get("numRuns")
+    ),
+    "GLRLM - Low Gray Level Run Emphasis": lambda get: (
+        get("grayRuns") @ get("grayWeights")[:, 0]/get("numRuns")
+    ),
+    "GLRLM - High Gray Level Run Emphasis": lambda get: (
+        get("grayRuns") @ get("grayWeights")[:, 1]/get("numRuns")
+    ),
+    "GLRLM - Short Run Low Gray Emphasis": lambda get: (
+        get("jointEmphasis")[:, 0, 0]
+    ),
+    "GLRLM - Short Run High Gray Emphasis": lambda get: (
+        get("jointEmphasis")[:, 0, 1]
+    ),
+    "GLRLM - Long Run Low Gray Emphasis": lambda get: (
+        get("jointEmphasis")[:, 1, 0]
+    ),
+    "GLRLM - Long Run High Gray Emphasis": lambda get: (
+        get("jointEmphasis")[:, 1, 1]
+    ),
+    "GLRLM - Gray Level Variance": lambda get: (
+        get("grayRuns")*(get("i") - get("avgGray")[:, None])**2
+    ).sum(-1)/get("numRuns"),
+    "GLRLM - Gray Level Non-Uniformity": lambda get: (
+        (get("grayRuns")**2).sum(-1)/get("numRuns")
+    ),
+    "GLRLM - Gray Level Non-Uniformity Normalized": lambda get: (
+        get("GLRLM - Gray Level Non-Uniformity")/get("numRuns")
+    ),
+    "GLRLM - Run Variance": lambda get: (
+        get("lengthRuns")*(get("j") - get("avgLength")[:, None])**2
+    ).sum(-1)/get("numRuns"),
+    "GLRLM - Run Length Non-Uniformity": lambda get: (
+        (get("lengthRuns")**2).sum(-1)/get("numRuns")
+    ),
+    "GLRLM - Run Length Non-Uniformity Normalized": lambda get: (
+        get("GLRLM - Run Length Non-Uniformity")/get("numRuns")
+    ),
+    "GLRLM - Run Length Percentage": lambda get: (
+        get("numRuns")/get("numPixels")
+    ),
+    "GLRLM - Run Entropy": lambda get: countEntropy(get("glrlm"),
+                                                    get("numRuns"))
+}
+
+
+def calcGLRLMMetricsBatch(glrlms, numPixels, features=None):
+
+    glrlms = np.asarray(glrlms)
+
+    nodes = dict(_GLRLM_NODES)
+    nodes["glrlm"] = lambda get: glrlms
+    nodes["numPixels"] = lambda get: np.reshape(numPixels, -1)
+
+    return evaluateFeatureBatch(nodes, GLRLM_FEATURES, features,
+                                len(glrlms))
+
+
+def calcGLRLMMetrics(glrlm, numPixels, features=None):
+
+    table, names = calcGLRLMMetricsBatch(np.asarray(glrlm)[None], numPixels,
+                                         features)
+
+    glrlmMetrics = dict(zip(names, table[0]))
+
     return glrlmMetrics
@@ -5,153 +5,207 @@
 
 Calculates 16 texture features from Gray Level Size Zone Matrix (GLSZM).
 
-INPUT: GLSZM form of Numpy array.
-OUTPIT: Features calculates from GLRLM in form of Dict.
+INPUT: GLSZM form of Numpy array, or scipy.sparse matrix.
+OUTPIT: Features calculates from GLSZM in form of Dict.
 
 ARGUMENTS: 
-    glszm - Gray Level Size Zone Matrix.
-    numPixels - Total number of pixels found in image. 
-    
+    glszm - Gray Level Size Zone Matrix, dense or sparse, e.g. from
+        calc_glszm(..., sparse=True).
+    numPixels - Total number of pixels found in image.
+    features - List of features to calculate, e.g. ["Small Area Emphasis"].
+        (Default = None, all features)
+
+calcGLSZMMetricsBatch takes a stack of shape (B, rows, columns) instead, or a
+list of B matrices of any shapes, dense or sparse, and returns a (B,
+n_features) array and the list of feature names. numPixels may be one count,
+or one per matrix.
+
+Only the nonzero entries are read, so the features cost as much as the
+number of distinct (gray level, zone size) pairs, however wide the matrix.
 """
 
-import math
+import numpy as np
+import scipy.sparse
 
+from dev.lib.metricCalc.featureGraph import evaluateFeatureBatch
 
-def calcGLSZMMetrics(glszm, numPixels):
 
-    # Initialized Parameters
+arbitSmall = 1e-22
 
-    numGray = glszm.shape[0]
-    numSize = glszm.shape[1]
-    numZones = glszm.sum()
+GLSZM_FEATURES = [
+    "GLSZM - Small Area Emphasis",
+    "GLSZM - Large Area Emphasis",
+    "GLSZM - Low Gray Level Zone Emphasis",
+    "GLSZM - High Gray Level Zone Emphasis",
+    "GLSZM - Small Area Low Gray Level Zone Emphasis",
+    "GLSZM - Large Area Low Gray Level Zone Emphasis",
+    "GLSZM - Small Area High Gray Level Zone Emphasis",
+    "GLSZM - Large Area High Gray Level Zone Emphasis",
+    "GLSZM - Gray Level Variance",
+    "GLSZM - Gray Level Non-Uniformity",
+    "GLSZM - Gray Level Non-Uniformity Normalized",
+    "GLSZM - Size Zone Variance",
+    "GLSZM - Size Zone Non-Uniformity",
+    "GLSZM - Size Zone Non-Uniformity Normalized",
+    "GLSZM - Size Zone Entropy",
+    "GLSZM - Size Zone Percentage"
+]
 
-    glszm_norm = glszm/numZones
 
-    rowTotal = 0
-    colTotal = 0
+def _zoneEntries(glszms):
 
-    avgGray = 0
-    avgSize = 0
+    # Nonzero entries of every matrix, as the matrix each is in (b), its
+    # gray level (i) and zone size (j), both 1-based, and its count. The
+    # features are sums over these, so only the (level, size) pairs that
+    # occur are stored, however large the zones.
 
-    arbitSmall = 1e-22
+    if isinstance(glszms, np.ndarray):
 
-    # Create Dict to store metrics
+        b, i, j = np.nonzero(glszms)
 
-    glszmMetrics = {
-        "GLSZM - Small Area Emphasis": 0,
-        "GLSZM - Large Area Emphasis": 0,
-        "GLSZM - Low Gray Level Zone Emphasis": 0,
-        "GLSZM - High Gray Level Zone Emphasis": 0,
-        "GLSZM - Small Area Low Gray Level Zone Emphasis": 0,
-        "GLSZM - Large Area Low Gray Level Zone Emphasis": 0,
-        "GLSZM - Small Area High Gray Level Zone Emphasis": 0,
-        "GLSZM - Large Area High Gray Level Zone Emphasis": 0,
-        "GLSZM - Gray Level Variance": 0,
-        "GLSZM - Gray Level Non-Uniformity": 0,
-        "GLSZM - Gray Level Non-Uniformity Normalized": 0,
-        "GLSZM - Size Zone Variance": 0,
-        "GLSZM - Size Zone Non-Uniformity": 0,
-        "GLSZM - Size Zone Non-Uniformity Normalized": 0,
-        "GLSZM - Size Zone Entropy": 0,
-        "GLSZM - Size Zone Percentage": 0
-    }
+        return b, i+1.0, j+1.0, glszms[b, i, j].astype(float)
 
-    # Calculate average for gray levels
+    entries = []
 
-    for i in range(0, numGray):
-        for j in range(0, numSize):
+    for b, glszm in enumerate(glszms):
 
-            avgGray += glszm_norm[i][j]*(i+1)
+        glszm = scipy.sparse.coo_matrix(glszm)
+        glszm.sum_duplicates()
 
-    # Calculate average for size zones
+        nonzero = glszm.data != 0
 
-    for i in range(0, numGray):
-        for j in range(0, numSize):
+        entries.append((np.full(np.count_nonzero(nonzero), b, dtype=np.intp),
+                        glszm.row[nonzero] + 1.0, glszm.col[nonzero] + 1.0,
+                        glszm.data[nonzero].astype(float)))
 
-            avgSize += glszm_norm[i][j]*(j+1)
+    if not entries:
+        return (np.zeros(0, dtype=np.intp),) + (np.zeros(0),)*3
 
-    # Calculate metrics
-
-    for i in range(0, numGray):
-        for j in range(0, numSize):
-
-            glszmValue = glszm[i][j]
-            glszmNormValue = glszm_norm[i][j]
-
-            glszmMetrics["GLSZM - Small Area Emphasis"] \
-                += glszmValue/((j+1)**2)
-
-            glszmMetrics["GLSZM - Large Area Emphasis"] \
-                += glszmValue*((j+1)**2)
-
-            glszmMetrics["GLSZM - Low Gray Level Zone Emphasis"] \
-                += glszmValue/((i+1)**2)
-
-            glszmMetrics["GLSZM - High Gray Level Zone Emphasis"] \
-                += glszmValue*((i+1)**2)
+    return tuple(np.concatenate(column) for column in zip(*entries))
 
-            glszmMetrics["GLSZM - Small Area Low Gray Level Zone Emphasis"] \
-                += glszmValue/(((i+1)**2)*((j+1)**2))
 
-            glszmMetrics["GLSZM - Small Area High Gray Level Zone Emphasis"] \
-                += (glszmValue*((i+1)**2))/((j+1)**2)
+def _marginalSquares(b, index, counts, batchSize):
 
-            glszmMetrics["GLSZM - Large Area Low Gray Level Zone Emphasis"] \
-                += (glszmValue*((j+1)**2))/((i+1)**2)
+    # Sum over each matrix of its squared marginal along index, e.g. its
+    # zone counts per gray level, squared.
 
-            glszmMetrics["GLSZM - Large Area High Gray Level Zone Emphasis"] \
-                += glszmValue*(((i+1)**2)*((j+1)**2))
+    index = index.astype(np.int64)
+    width = index.max(initial=0) + 1
 
-            glszmMetrics["GLSZM - Gray Level Variance"] \
-                += glszmNormValue*(abs(((i+1)-avgGray))**2)
+    groups, group = np.unique(b*width + index, return_inverse=True)
 
-            glszmMetrics["GLSZM - Size Zone Variance"] \
-                += glszmNormValue*(abs(((j+1)-avgSize))**2)
+    marginal = np.bincount(group.ravel(), weights=counts)
 
-            glszmMetrics["GLSZM - Size Zone Entropy"] \
-                -= glszmNormValue*math.log2(glszmNormValue+arbitSmall)
+    return np.bincount(groups // width, weights=marginal**2,
+                       minlength=batchSize)
 
-            rowTotal += glszmValue
 
-        glszmMetrics["GLSZM - Gray Level Non-Uniformity"] += rowTotal**2
+def _zoneSum(get, values):
 
-        rowTotal = 0
+    # Adds values of the entries up per matrix.
 
-    for j in range(0, numSize):
-        for i in range(0, numGray):
+    return np.bincount(get("b"), weights=values, minlength=get("batchSize"))
 
-            colTotal += glszm[i][j]
 
-        glszmMetrics["GLSZM - Size Zone Non-Uniformity"] += colTotal**2
+def _zoneMean(get, values):
 
-        colTotal = 0
+    # Mean of values over the zones of each matrix.
 
-    glszmMetrics["GLSZM - Small Area Emphasis"] /= numZones
+    return _zoneSum(get, get("counts")*values)/get("numZones")
 
-    glszmMetrics["GLSZM - Large Area Emphasis"] /= numZones
 
-    glszmMetrics["GLSZM - Low Gray Level Zone Emphasis"] /= numZones
+# Every node works on the nonzero entries of a batch of B matrices, and
+# features are one value per matrix.
 
-    glszmMetrics["GLSZM - High Gray Level Zone Emphasis"] /= numZones
+_GLSZM_NODES = {
+    "numZones": lambda get: _zoneSum(get, get("counts")),
+    "p": lambda get: get("counts")/get("numZones")[get("b")],
 
-    glszmMetrics["GLSZM - Small Area Low Gray Level Zone Emphasis"] /= numZones
+    # Calculate average for gray levels and size zones
 
-    glszmMetrics["GLSZM - Small Area High Gray Level Zone Emphasis"] /= numZones
+    "avgGray": lambda get: _zoneMean(get, get("i")),
+    "avgSize": lambda get: _zoneMean(get, get("j")),
 
-    glszmMetrics["GLSZM - Large Area Low Gray Level Zone Emphasis"] /= numZones
-
-    glszmMetrics["GLSZM - Large Area High Gray Level Zone Emphasis"] /= numZones
-
-    glszmMetrics["GLSZM - Gray Level Non-Uniformity"] /= numZones
-
-    glszmMetrics["GLSZM - Gray Level Non-Uniformity Normalized"] = \
-        glszmMetrics["GLSZM - Gray Level Non-Uniformity"]/numZones
-
-    glszmMetrics["GLSZM - Size Zone Non-Uniformity"] /= numZones
-
-    glszmMetrics["GLSZM - Size Zone Non-Uniformity Normalized"] = \
-        glszmMetrics["GLSZM - Size Zone Non-Uniformity"]/numZones
+    # Calculate metrics
 
-    glszmMetrics["GLSZM - Size Zone Percentage"] = numZones/numPixels
+    "GLSZM - Small Area Emphasis": lambda get: _zoneMean(
+        get, 1/get("j")**2
+    ),
+    "GLSZM - Large Area Emphasis": lambda get: _zoneMean(
+        get, get("j")**2
+    ),
+    "GLSZM - Low Gray Level Zone Emphasis": lambda get: _zoneMean(
+        get, 1/get("i")**2
+    ),
+    "GLSZM - High Gray Level Zone Emphasis": lambda get: _zoneMean(
+        get, get("i")**2
+    ),
+    "GLSZM - Small Area Low Gray Level Zone Emphasis": lambda get: _zoneMean(
+        get, 1/(get("i")**2*get("j")**2)
+    ),
+    "GLSZM - Large Area Low Gray Level Zone Emphasis": lambda get: _zoneMean(
+        get, get("j")**2/get("i")**2
+    ),
+    "GLSZM - Small Area High Gray Level Zone Emphasis": lambda get: _zoneMean(
+        get, get("i")**2/get("j")**2
+    ),
+    "GLSZM - Large Area High Gray Level Zone Emphasis": lambda get: _zoneMean(
+        get, get("i")**2*get("j")**2
+    ),
+    "GLSZM - Gray Level Variance": lambda get: _zoneMean(
+        get, (get("i") - get("avgGray")[get("b")])**2
+    ),
+    "GLSZM - Gray Level Non-Uniformity": lambda get: _marginalSquares(
+        get("b"), get("i"), get("counts"), get("batchSize")
+    )/get("numZones"),
+    "GLSZM - Gray Level Non-Uniformity Normalized": lambda get: (
+        get("GLSZM - Gray Level Non-Uniformity")/get("numZones")
+    ),
+    "GLSZM - Size Zone Variance": lambda get: _zoneMean(
+        get, (get("j") - get("avgSize")[get("b")])**2
+    ),
+    "GLSZM - Size Zone Non-Uniformity": lambda get: _marginalSquares(
+        get("b"), get("j"), get("counts"), get("batchSize")
+    )/get("numZones"),
+    "GLSZM - Size Zone Non-Uniformity Normalized": lambda get: (
+        get("GLSZM - Size Zone Non-Uniformity")/get("numZones")
+    ),
+    "GLSZM - Size Zone Entropy": lambda get: np.where(
+        get("numZones") > 0,
+        -_zoneSum(get, get("p")*np.log2(get("p")+arbitSmall)), np.nan
+    ),
+    "GLSZM - Size Zone Percentage": lambda get: (
+        get("numZones")/get("numPixels")
+    )
+}
+
+
+def calcGLSZMMetricsBatch(glszms, numPixels, features=None):
+
+    if not isinstance(glszms, list):
+        glszms = np.asarray(glszms)
+
+    b, i, j, counts = _zoneEntries(glszms)
+
+    nodes = dict(_GLSZM_NODES)
+    nodes["batchSize"] = lambda get: len(glszms)
+    nodes["b"] = lambda get: b
+    nodes["i"] = lambda get: i
+    nodes["j"] = lambda get: j
+    nodes["counts"] = lambda get: counts
+    nodes["numPixels"] = lambda get: np.reshape(numPixels, -1)
+
+    return evaluateFeatureBatch(nodes, GLSZM_FEATURES, features,
+                                len(glszms))
+
+
+def calcGLSZMMetrics(glszm, numPixels, features=None):
+
+    if not scipy.sparse.issparse(glszm):
+        glszm = np.asarray(glszm)
+
+    table, names = calcGLSZMMetricsBatch([glszm], numPixels, features)
+
+    glszmMetrics = dict(zip(names, table[0]))
 
     return glszmMetrics
@@ -10,84 +10,106 @@ OUTPIT: Features calculates from GLRLM in form of Dict.
 
 ARGUMENTS: 
     ngtdm - Gray Level Dependence Matrix.
-    
-"""
-
-# import math
-
-
-def calcNGTDMMetrics(ngtdm):
-
-    # Initialized Parameters
-
-    numGray = ngtdm.shape[0]
-
-    numGrayNonZero = 0
-    numPixels = 0
-
-    ngtdmCoarseness = 0
-
-    ngtdmContrast1 = 0
-    ngtdmContrast2 = 0
-
-    ngtdmBusyness = 0
-
-    ngtdmStrength = 0
-
-    # Create Dict to store metrics
-
-    ngtdmMetrics = {
-        "NGTDM - Coarseness": 0,
-        "NGTDM - Contrast": 0,
-        "NGTDM - Busyness": 0,
-        "NGTDM - Complexity": 0,
-        "NGTDM - Strength": 0
-    }
-
-    numGrayLevels = range(0, numGray)
-
-    # Calculate average for gray levels
-
-    for i in numGrayLevels:
+    features - List of features to calculate, e.g. ["Coarseness"]. The
+        pairwise gray level terms are only formed if a feature needs them.
+        (Default = None, all features)
 
-        p_i = ngtdm[i][1]
-        s_i = ngtdm[i][2]
-
-        ngtdmCoarseness += p_i*s_i
-
-        ngtdmContrast2 += s_i
-
-        numPixels += ngtdm[i][0]
-
-        if p_i != 0:
-            numGrayNonZero += 1
-
-        for j in numGrayLevels:
-
-            p_j = ngtdm[j][1]
-            s_j = ngtdm[j][2]
-
-            if p_i != 0 and p_j != 0:
-                ngtdmContrast1 += p_i*p_j*(abs(i-j)**2)
-
-                ngtdmBusyness += abs(((i+1)*p_i)-((j+1)*p_j))
-
-                ngtdmMetrics["NGTDM - Complexity"] += (abs(i-j) *
-                                                       (((p_i*s_i)+(p_j*s_j)) /
-                                                        (p_i+p_j)))
-
-                ngtdmStrength += (p_i+p_j)*(abs(i-j)**2)
-
-    ngtdmMetrics["NGTDM - Coarseness"] = 1/ngtdmCoarseness
-
-    ngtdmMetrics["NGTDM - Contrast"] = ((1/(numGrayNonZero*(numGrayNonZero-1)))
-                                        * ngtdmContrast1*(1/numPixels) *
-                                        ngtdmContrast2)
-
-    ngtdmMetrics["NGTDM - Busyness"] = ngtdmCoarseness/ngtdmBusyness
-
-    ngtdmMetrics["NGTDM - Complexity"] /= numPixels
+calcNGTDMMetricsBatch takes a stack of shape (B, L, 3) instead, and returns
+a (B, n_features) array and the list of feature names.
+"""
 
-    ngtdmMetrics["NGTDM - Strength"] = ngtdmStrength/ngtdmContrast2
+import numpy as np
+
+from dev.lib.metricCalc.featureGraph import evaluateFeatureBatch
+
+
+NGTDM_FEATURES = [
+    "NGTDM - Coarseness",
+    "NGTDM - Contrast",
+    "NGTDM - Busyness",
+    "NGTDM - Complexity",
+    "NGTDM - Strength"
+]
+
+# Every node works on a stack of NGTDMs of shape (B, L, 3), whose columns
+# are n_i, p_i and s_i. Pairwise terms only run over gray levels with
+# p_i != 0. Levels absent from every NGTDM of the stack are dropped first,
+# so a deep bit depth costs no more than the levels in use, and each
+# remaining (i, j) pair is masked by whether both are present. Only the
+# columns of the used levels are converted to float, not the whole stack.
+
+_NGTDM_NODES = {
+    "used": lambda get: np.flatnonzero((get("ngtdm")[..., 1] != 0).any(0)),
+    "p": lambda get: get("ngtdm")[:, get("used"), 1].astype(float),
+    "s": lambda get: get("ngtdm")[:, get("used"), 2].astype(float),
+    "numPixels": lambda get: get("ngtdm")[..., 0].sum(-1, dtype=float),
+    "present": lambda get: get("p") != 0,
+    "numGrayNonZero": lambda get: get("present").sum(-1),
+    "pairs": lambda get: get("present")[:, :, None] & get("present")[:, None, :],
+    "level": lambda get: get("used"),
+
+    # (i, j) pair terms over the used gray levels
+
+    "p_i": lambda get: get("p")[:, :, None],
+    "p_j": lambda get: get("p")[:, None, :],
+    "s_i": lambda get: get("s")[:, :, None],
+    "s_j": lambda get: get("s")[:, None, :],
+    "levelDiff": lambda get: np.abs(
+        get("level")[:, None]-get("level")[None, :]
+    ),
+
+    "ngtdmCoarseness": lambda get: (get("p")*get("s")).sum(-1),
+    "ngtdmContrast1": lambda get: (
+        get("p_i")*get("p_j")*(get("levelDiff")**2)
+    ).sum((-2, -1)),
+    "ngtdmContrast2": lambda get: get("s").sum(-1),
+    "ngtdmBusyness": lambda get: np.where(get("pairs"), np.abs(
+        (get("level")[:, None]+1)*get("p_i")
+        - (get("level")[None, :]+1)*get("p_j")
+    ), 0).sum((-2, -1)),
+    "ngtdmStrength": lambda get: np.where(
+        get("pairs"), (get("p_i")+get("p_j"))*(get("levelDiff")**2), 0
+    ).sum((-2, -1)),
+    "ngtdmComplexity": lambda get: (get("levelDiff")*np.divide(
+        (get("p_i")*get("s_i"))+(get("p_j")*get("s_j")),
+        get("p_i")+get("p_j"),
+        out=np.zeros(get("pairs").shape), where=get("pairs")
+    )).sum((-2, -1)),
+
+    # Calculate metrics
+
+    "NGTDM - Coarseness": lambda get: 1/get("ngtdmCoarseness"),
+    "NGTDM - Contrast": lambda get: (
+        (1/(get("numGrayNonZero")*(get("numGrayNonZero")-1)))
+        * get("ngtdmContrast1")*(1/get("numPixels")) *
+        get("ngtdmContrast2")
+    ),
+    "NGTDM - Busyness": lambda get: (
+        get("ngtdmCoarseness")/get("ngtdmBusyness")
+    ),
+    "NGTDM - Complexity": lambda get: (
+        get("ngtdmComplexity")/get("numPixels")
+    ),
+    "NGTDM - Strength": lambda get: (
+        get("ngtdmStrength")/get("ngtdmContrast2")
+    )
+}
+
+
+def calcNGTDMMetricsBatch(ngtdms, features=None):
+
+    ngtdms = np.asarray(ngtdms)
+
+    nodes = dict(_NGTDM_NODES)
+    nodes["ngtdm"] = lambda get: ngtdms
+
+    return evaluateFeatureBatch(nodes, NGTDM_FEATURES, features, len(ngtdms))
+
+
+def calcNGTDMMetrics(ngtdm, features=None):
+
+    table, names = calcNGTDMMetricsBatch(np.asarray(ngtdm)[None], features)
+
+    ngtdmMetrics = dict(zip(names, table[0]))
 
     return ngtdmMetrics
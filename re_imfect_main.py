@@ -0,0 +1,987 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Joshua J.A. Poole
+
+Extracts texture features from all five matrices (GLCM, GLRLM, GLSZM, GLDM,
+NGTDM) with a single shared preparation of the image.
+
+INPUT: Image in form of Numpy array.
+OUTPIT: Features from every matrix in form of one flat Dict.
+
+ARGUMENTS: 
+    image - Image in form of array.
+    config - Dict of settings. Any key left out is taken from
+        DEFAULT_CONFIG, and each matrix section is merged key by key.
+        (Default = None)
+    mask - Region of interest, as a boolean or label mask the shape of the
+        image. The image is cropped to the mask's bounding box, quantized
+        over the mask only, and every matrix skips pixels outside it.
+        (Default = None, the whole image)
+
+CONFIG:
+    matrices - Matrices to calculate.
+    quantization - Arguments for quantize_image, or None to use the raw
+        intensities with bitDepth.
+    bitDepth - Bitdepth of raw image. (Default = None, from image maximum)
+    ignoreBackground - If true, pixels of value 0 are background.
+    backend - Kernel backend for GLRLM run tracing and GLSZM zones, "numpy"
+        or "numba" (see dev.lib.matrixCalc.backends). (Default = None, the
+        backend chosen by set_backend)
+    features - Dict of matrix name to list of features, e.g.
+        {"glcm": ["Contrast", "Correlation"]}. Missing matrices give all.
+    glcm, glrlm, glszm, gldm, ngtdm - Settings for each matrix builder.
+    volume - Settings used instead for 3-D images (z, y, x): the (dz, dy, dx)
+        offsets of both GLCM and GLRLM, and the GLSZM connectivity. The GLCM
+        distances and the GLDM and NGTDM settings are shared with 2-D.
+    cache - On-disk matrix cache of extract_features (see
+        dev.lib.matrixCalc.matrixCache): the directory, or None for no
+        cache, and its size budget in maxMB. Matrices are keyed by the
+        quantized image and every builder setting, so a second run over the
+        same images only evaluates the metrics.
+
+3-D images are handled by the volume builders (see
+dev.lib.matrixCalc.volumeMatrices), over 13 directions. Directions along an
+axis one voxel thick are left out, so a single-plane volume gives the same
+features as the 2-D image.
+
+The GLSZM of a 2-D image, and of each label, is built sparse, holding only
+the zone sizes that occur, so a zone the size of the image costs no more
+than a small one.
+
+GLCM and GLRLM features are averaged over their directions. With more than
+one GLCM distance, each distance gets its own features, e.g.
+"GLCM - Contrast (d=2)".
+
+extract_feature_map(image, windowSize, step, config=None) gives the same
+features for every windowSize square of the image, step pixels apart, as an
+array of shape (H', W', n_features) and the list of feature names. The image
+is quantized once as a whole. GLCM, GLRLM and GLDM counts are updated as the
+window slides (see dev.lib.matrixCalc.slidingWindow), GLSZM and NGTDM are
+built for each window. Metrics are evaluated for batches of windows at once
+by the batched metric functions, e.g. calcGLCMMetricsBatch.
+
+extract_features_by_label(image, labels, config=None) gives the features of
+every non-zero label of a label image, e.g. one row per cell. Each matrix is
+built for all labels in one pass (see dev.lib.matrixCalc.labelMatrices).
+Returns the label values, an array of shape (n_labels, n_features) and the
+feature names. The image is quantized once over all labels, and the GLCM is
+always dense. Metrics of every label and direction are evaluated at once.
+
+COMMAND LINE:
+    python -m re_imfect_main extract <directory> -o features.parquet
+
+    Extracts features from every image in a directory across a pool of
+    worker processes and streams one row per image to a .csv or .parquet
+    file. With --cache-dir, matrices are kept on disk for the next run. Run
+    with --help for the options. The columns are the path and
+    feature_names(config), so every row lines up with the header.
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import functools
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from dev.lib.matrixCalc.quantizeImage import quantize_image
+from dev.lib.matrixCalc.roiMask import crop_to_mask
+from dev.lib.matrixCalc.matrixGLCM import calc_glcm_multi, GLCM_OFFSETS
+from dev.lib.matrixCalc.matrixGLRLM import calc_glrlm_multi
+from dev.lib.matrixCalc.matrixGLSZM import calc_glszm
+from dev.lib.matrixCalc.matrixGLDM import calc_gldm
+from dev.lib.matrixCalc.matrixNGTDM import calc_ngtdm
+from dev.lib.matrixCalc.labelMatrices import (label_index,
+                                              calc_glcm_by_label,
+                                              calc_glrlm_by_label,
+                                              calc_glszm_by_label,
+                                              calc_gldm_by_label,
+                                              calc_ngtdm_by_label)
+from dev.lib.matrixCalc.volumeMatrices import (VOLUME_OFFSETS,
+                                               calc_glcm_3d,
+                                               calc_glrlm_3d,
+                                               calc_glszm_3d,
+                                               calc_gldm_3d,
+                                               calc_ngtdm_3d)
+from dev.lib.matrixCalc.matrixCache import MatrixCache
+from dev.lib.matrixCalc.slidingWindow import (window_starts,
+                                              iter_glcm_windows,
+                                              iter_glrlm_windows,
+                                              iter_gldm_windows)
+from dev.lib.metricCalc.featureGraph import resolveFeatureNames
+from dev.lib.metricCalc.glcmMetrics import (GLCM_FEATURES, calcGLCMMetrics,
+                                            calcGLCMMetricsBatch)
+from dev.lib.metricCalc.glrlmMetrics import (GLRLM_FEATURES,
+                                             calcGLRLMMetrics,
+                                             calcGLRLMMetricsBatch)
+from dev.lib.metricCalc.glszmMetrics import (GLSZM_FEATURES,
+                                             calcGLSZMMetrics,
+                                             calcGLSZMMetricsBatch)
+from dev.lib.metricCalc.gldmMetrics import (GLDM_FEATURES, calcGLDMMetrics,
+                                            calcGLDMMetricsBatch)
+from dev.lib.metricCalc.ngtdmMetrics import (NGTDM_FEATURES,
+                                             calcNGTDMMetrics,
+                                             calcNGTDMMetricsBatch)
+
+
+DEFAULT_CONFIG = {
+    "matrices": ["glcm", "glrlm", "glszm", "gldm", "ngtdm"],
+    "quantization": {"numBins": 32},
+    "bitDepth": None,
+    "ignoreBackground": False,
+    "backend": None,
+    "features": {},
+    "glcm": {
+        "offsets": list(GLCM_OFFSETS.values()),
+        "distances": [1],
+        "sparse": False
+    },
+    "glrlm": {
+        "angles": [0, np.pi/4, np.pi/2, np.pi*(135/180)]
+    },
+    "glszm": {
+        "engine": "label",
+        "connectivity": 8
+    },
+    "gldm": {
+        "alpha": 0,
+        "radius": 1
+    },
+    "ngtdm": {
+        "distance": 1
+    },
+    "volume": {
+        "offsets": VOLUME_OFFSETS,
+        "connectivity": 26
+    },
+    "cache": {
+        "directory": None,
+        "maxMB": 1024
+    }
+}
+
+# Windows of a feature map whose metrics are evaluated at once.
+
+WINDOW_BATCH_SIZE = 1024
+
+
+def merge_config(config=None):
+
+    merged = {}
+
+    for key, default in DEFAULT_CONFIG.items():
+
+        value = (config or {}).get(key, default)
+
+        if isinstance(default, dict) and key != "features" and value is not None:
+            value = dict(default, **value)
+
+        merged[key] = value
+
+    unknown = set(config or {}) - set(DEFAULT_CONFIG)
+
+    if unknown:
+        raise ValueError("Unknown config keys: " + ", ".join(sorted(unknown)))
+
+    return merged
+
+
+def prepare_image(image, config, mask=None):
+
+    # Crops to the mask and quantizes (or casts) the image once. Every
+    # builder is handed the same intp level map, so none of them need to
+    # copy it again.
+
+    image, mask = crop_to_mask(image, mask)
+
+    if config["quantization"] is not None:
+
+        quantization = dict(config["quantization"])
+        quantization.setdefault("reserveBackground",
+                                config["ignoreBackground"])
+
+        levels, quantInfo = quantize_image(image, mask=mask, **quantization)
+
+        bitDepth = quantInfo["bitDepth"]
+        numLevels = quantInfo["numLevels"]
+
+    else:
+
+        bitDepth = config["bitDepth"]
+
+        if bitDepth is None:
+            bitDepth = max(1, int(image.max()).bit_length())
+
+        levels = image
+        numLevels = 2**bitDepth
+
+    levels = levels.astype(np.intp)
+
+    inROI = levels if mask is None else levels[mask]
+
+    if config["ignoreBackground"]:
+        numPixels = np.count_nonzero(inROI)
+    else:
+        numPixels = inROI.size
+
+    return levels, bitDepth, numLevels, numPixels, mask
+
+
+def feature_names(config=None):
+
+    # Names of the features extract_features gives for config, in the order
+    # of its records, without reading an image.
+
+    config = merge_config(config)
+
+    features = config["features"]
+    distances = config["glcm"]["distances"]
+
+    names = []
+
+    for matrix, matrixFeatures in (("glcm", GLCM_FEATURES),
+                                   ("glrlm", GLRLM_FEATURES),
+                                   ("glszm", GLSZM_FEATURES),
+                                   ("gldm", GLDM_FEATURES),
+                                   ("ngtdm", NGTDM_FEATURES)):
+
+        if matrix not in config["matrices"]:
+            continue
+
+        suffixes = [""]
+
+        if matrix == "glcm" and len(distances) > 1:
+            suffixes = [" (d=" + str(distance) + ")"
+                        for distance in distances]
+
+        for suffix in suffixes:
+            names.extend(name + suffix for name in resolveFeatureNames(
+                matrixFeatures, features.get(matrix)
+            ))
+
+    return names
+
+
+def _mean_features(metricsList, suffix=""):
+
+    return {name + suffix: float(np.mean([metrics[name]
+                                          for metrics in metricsList]))
+            for name in metricsList[0]}
+
+
+def _matrix_features(matrices, numPixels, config):
+
+    # Features of already built matrices, keyed by matrix name. GLCM and
+    # GLRLM hold one matrix per direction.
+
+    features = config["features"]
+
+    record = {}
+
+    if "glcm" in matrices:
+
+        glcms = matrices["glcm"]
+        distances = config["glcm"]["distances"]
+        numOffsets = len(glcms)//len(distances)
+
+        for d, distance in enumerate(distances):
+
+            suffix = "" if len(distances) == 1 else " (d=" + str(distance) + ")"
+
+            metricsList = [
+                calcGLCMMetrics(glcm, features=features.get("glcm"))
+                for glcm in glcms[d*numOffsets:(d+1)*numOffsets]
+            ]
+
+            record.update(_mean_features(metricsList, suffix))
+
+    if "glrlm" in matrices:
+
+        record.update(_mean_features([
+            calcGLRLMMetrics(glrlm, numPixels, features=features.get("glrlm"))
+            for glrlm in matrices["glrlm"]
+        ]))
+
+    if "glszm" in matrices:
+
+        record.update(_mean_features([
+            calcGLSZMMetrics(matrices["glszm"], numPixels,
+                             features=features.get("glszm"))
+        ]))
+
+    if "gldm" in matrices:
+
+        record.update(_mean_features([
+            calcGLDMMetrics(matrices["gldm"], features=features.get("gldm"))
+        ]))
+
+    if "ngtdm" in matrices:
+
+        record.update(_mean_features([
+            calcNGTDMMetrics(matrices["ngtdm"], features=features.get("ngtdm"))
+        ]))
+
+    return record
+
+
+@functools.lru_cache(maxsize=None)
+def _matrix_cache(directory, maxBytes):
+
+    # One cache per directory in each process, so its running size total is
+    # kept from one image to the next.
+
+    return MatrixCache(directory, maxBytes)
+
+
+def _cached(config):
+
+    # Wraps a builder to read through the matrix cache, if one is set.
+
+    cache = config["cache"]
+
+    if not cache or cache.get("directory") is None:
+        return lambda builder: builder
+
+    return _matrix_cache(str(cache["directory"]), cache["maxMB"]*2**20).wrap
+
+
+def _volume_matrices(levels, bitDepth, numLevels, mask, config):
+
+    ignoreBackground = config["ignoreBackground"]
+    cached = _cached(config)
+
+    # Directions that step along an axis one voxel thick, e.g. across the
+    # planes of a single-plane volume, find no neighbours. They are left
+    # out, rather than averaging their empty matrices into the features.
+    # A volume too small for any direction keeps them all.
+
+    offsets = [offset for offset in config["volume"]["offsets"]
+               if all(n > 1 for n, d in zip(levels.shape, offset) if d)]
+    offsets = offsets or config["volume"]["offsets"]
+
+    matrices = {}
+
+    if "glcm" in config["matrices"]:
+        matrices["glcm"] = cached(calc_glcm_3d)(
+            levels, offsets, config["glcm"]["distances"], bitDepth,
+            numLevels=numLevels, mask=mask
+        )
+
+    if "glrlm" in config["matrices"]:
+        matrices["glrlm"] = cached(calc_glrlm_3d)(
+            levels, offsets, bitDepth, ignoreBackground,
+            numLevels=numLevels, mask=mask, backend=config["backend"]
+        )
+
+    if "glszm" in config["matrices"]:
+        matrices["glszm"] = cached(calc_glszm_3d)(
+            levels, bitDepth, ignoreBackground, numLevels=numLevels,
+            connectivity=config["volume"]["connectivity"], mask=mask
+        )
+
+    if "gldm" in config["matrices"]:
+        matrices["gldm"] = cached(calc_gldm_3d)(
+            levels, config["gldm"]["alpha"], bitDepth, numLevels=numLevels,
+            radius=config["gldm"]["radius"], mask=mask
+        )
+
+    if "ngtdm" in config["matrices"]:
+        matrices["ngtdm"] = cached(calc_ngtdm_3d)(
+            levels, ignoreBackground, numLevels=numLevels,
+            distance=config["ngtdm"]["distance"], mask=mask
+        )
+
+    return matrices
+
+
+def extract_features(image, config=None, mask=None):
+
+    config = merge_config(config)
+
+    levels, bitDepth, numLevels, numPixels, mask = prepare_image(image, config,
+                                                                 mask)
+
+    ignoreBackground = config["ignoreBackground"]
+    cached = _cached(config)
+
+    if levels.ndim == 3:
+        return _matrix_features(_volume_matrices(levels, bitDepth, numLevels,
+                                                 mask, config),
+                                numPixels, config)
+
+    matrices = {}
+
+    if "glcm" in config["matrices"]:
+        matrices["glcm"] = cached(calc_glcm_multi)(
+            levels, config["glcm"]["offsets"], config["glcm"]["distances"],
+            bitDepth, sparse=config["glcm"]["sparse"], numLevels=numLevels,
+            mask=mask
+        )
+
+    if "glrlm" in config["matrices"]:
+        matrices["glrlm"] = cached(calc_glrlm_multi)(
+            levels, config["glrlm"]["angles"], bitDepth, ignoreBackground,
+            numLevels=numLevels, mask=mask, backend=config["backend"]
+        )
+
+    if "glszm" in config["matrices"]:
+        matrices["glszm"] = cached(calc_glszm)(
+            levels, bitDepth, ignoreBackground, numLevels=numLevels,
+            mask=mask, backend=config["backend"], sparse=True,
+            **config["glszm"]
+        )
+
+    if "gldm" in config["matrices"]:
+        matrices["gldm"] = cached(calc_gldm)(
+            levels, config["gldm"]["alpha"], bitDepth, numLevels=numLevels,
+            radius=config["gldm"]["radius"], mask=mask
+        )
+
+    if "ngtdm" in config["matrices"]:
+        matrices["ngtdm"] = cached(calc_ngtdm)(
+            levels, ignoreBackground, numLevels=numLevels,
+            distance=config["ngtdm"]["distance"], mask=mask
+        )
+
+    return _matrix_features(matrices, numPixels, config)
+
+
+def _stack_features(stacks, numPixels, config):
+
+    # As _matrix_features for stacks with one matrix (or one per direction)
+    # per item, evaluated by the batched metrics. Returns an array of shape
+    # (n_items, n_features) and the feature names along its last axis.
+
+    features = config["features"]
+
+    numItems = len(numPixels)
+
+    tables = []
+    featureNames = []
+
+    def addTable(table, names, suffix=""):
+        tables.append(table)
+        featureNames.extend(name + suffix for name in names)
+
+    if "glcm" in stacks:
+
+        glcms = stacks["glcm"]
+        distances = config["glcm"]["distances"]
+        numOffsets = glcms.shape[1]//len(distances)
+
+        table, names = calcGLCMMetricsBatch(
+            glcms.reshape((-1,) + glcms.shape[2:]),
+            features=features.get("glcm")
+        )
+        table = table.reshape(numItems, len(distances), numOffsets, -1)
+
+        for d, distance in enumerate(distances):
+            suffix = "" if len(distances) == 1 else " (d=" + str(distance) + ")"
+            addTable(table[:, d].mean(1), names, suffix)
+
+    if "glrlm" in stacks:
+
+        glrlms = stacks["glrlm"]
+
+        table, names = calcGLRLMMetricsBatch(
+            glrlms.reshape((-1,) + glrlms.shape[2:]),
+            np.repeat(numPixels, glrlms.shape[1]),
+            features=features.get("glrlm")
+        )
+        addTable(table.reshape(numItems, glrlms.shape[1], -1).mean(1), names)
+
+    if "glszm" in stacks:
+        addTable(*calcGLSZMMetricsBatch(stacks["glszm"], numPixels,
+                                        features=features.get("glszm")))
+
+    if "gldm" in stacks:
+        addTable(*calcGLDMMetricsBatch(stacks["gldm"],
+                                       features=features.get("gldm")))
+
+    if "ngtdm" in stacks:
+        addTable(*calcNGTDMMetricsBatch(stacks["ngtdm"],
+                                        features=features.get("ngtdm")))
+
+    if not tables:
+        return np.zeros((numItems, 0)), featureNames
+
+    return np.concatenate(tables, axis=1), featureNames
+
+
+def extract_features_by_label(image, labels, config=None):
+
+    # Features of every non-zero label of a label image. Each matrix is
+    # built for all labels in one pass over the image, as a stack with one
+    # matrix per label. Returns the label values, an array of shape
+    # (n_labels, n_features), and the feature names along its last axis.
+
+    config = merge_config(config)
+
+    # Image and labels are both cropped to the bounding box of the labels.
+
+    image, _ = crop_to_mask(image, labels)
+    labels, _ = crop_to_mask(labels, labels)
+
+    levels, bitDepth, numLevels, _, mask = prepare_image(image, config, labels)
+
+    labelValues, index = label_index(labels)
+
+    ignoreBackground = config["ignoreBackground"]
+
+    counted = mask & (levels != 0) if ignoreBackground else mask
+    numPixels = np.bincount(index[counted], minlength=labelValues.size)
+
+    stacks = {}
+
+    if "glcm" in config["matrices"]:
+        stacks["glcm"] = calc_glcm_by_label(
+            levels, labels, config["glcm"]["offsets"],
+            config["glcm"]["distances"], numLevels
+        )
+
+    if "glrlm" in config["matrices"]:
+        stacks["glrlm"] = calc_glrlm_by_label(
+            levels, labels, config["glrlm"]["angles"], numLevels,
+            ignoreBackground, config["backend"]
+        )
+
+    if "glszm" in config["matrices"]:
+        stacks["glszm"] = calc_glszm_by_label(
+            levels, labels, numLevels, ignoreBackground,
+            config["glszm"]["connectivity"]
+        )
+
+    if "gldm" in config["matrices"]:
+        stacks["gldm"] = calc_gldm_by_label(
+            levels, labels, config["gldm"]["alpha"], numLevels,
+            config["gldm"]["radius"]
+        )
+
+    if "ngtdm" in config["matrices"]:
+        stacks["ngtdm"] = calc_ngtdm_by_label(
+            levels, labels, numLevels, ignoreBackground,
+            config["ngtdm"]["distance"]
+        )
+
+    featureTable, featureNames = _stack_features(stacks, numPixels, config)
+
+    return labelValues, featureTable, featureNames
+
+
+def _add_window_batch(featureMaps, batch, calcBatch, shape, scale):
+
+    # Matrices of one batch are zero padded to the widest, for the GLSZM
+    # whose width depends on the largest zone of each window.
+
+    iy = np.array([window[0] for window in batch])
+    ix = np.array([window[1] for window in batch])
+
+    width = max(window[2].shape[-1] for window in batch)
+
+    matrices = np.zeros((len(batch),) + batch[0][2].shape[:-1] + (width,),
+                        dtype=batch[0][2].dtype)
+
+    for k, (_, _, matrix) in enumerate(batch):
+        matrices[k, ..., :matrix.shape[-1]] = matrix
+
+    table, names = calcBatch(matrices, iy, ix)
+
+    for n, name in enumerate(names):
+
+        if name not in featureMaps:
+            featureMaps[name] = np.zeros(shape)
+
+        featureMaps[name][iy, ix] += scale*table[:, n]
+
+
+def _add_window_metrics(featureMaps, windows, calcBatch, shape, scale=1):
+
+    # Adds scale times the metrics of each window to the map of each feature.
+    # Directions are averaged by adding each with scale 1/numDirections.
+    # calcBatch(matrices, iy, ix) evaluates WINDOW_BATCH_SIZE windows at a
+    # time, returning their table and feature names.
+
+    batch = []
+
+    for window in windows:
+
+        batch.append(window)
+
+        if len(batch) == WINDOW_BATCH_SIZE:
+            _add_window_batch(featureMaps, batch, calcBatch, shape, scale)
+            batch = []
+
+    if batch:
+        _add_window_batch(featureMaps, batch, calcBatch, shape, scale)
+
+
+def extract_feature_map(image, windowSize, step, config=None):
+
+    # Features of every windowSize square of the image, step pixels apart.
+    # Returns an array of shape (H', W', n_features) and the feature names
+    # along its last axis.
+
+    config = merge_config(config)
+
+    levels, bitDepth, numLevels, _, _ = prepare_image(image, config)
+
+    ignoreBackground = config["ignoreBackground"]
+    features = config["features"]
+    matrices = config["matrices"]
+
+    startsY = window_starts(levels.shape[0], windowSize, step)
+    startsX = window_starts(levels.shape[1], windowSize, step)
+    shape = (startsY.size, startsX.size)
+
+    if ignoreBackground:
+        numPixels = np.array([[np.count_nonzero(levels[y0:y0+windowSize,
+                                                       x0:x0+windowSize])
+                               for x0 in startsX] for y0 in startsY])
+    else:
+        numPixels = np.full(shape, windowSize*windowSize)
+
+    def windowMatrices(calcMatrix):
+        for iy, y0 in enumerate(startsY):
+            for ix, x0 in enumerate(startsX):
+                yield iy, ix, calcMatrix(levels[y0:y0+windowSize,
+                                                x0:x0+windowSize])
+
+    featureMaps = {}
+
+    if "glcm" in matrices:
+
+        offsets = config["glcm"]["offsets"]
+        distances = config["glcm"]["distances"]
+
+        for distance in distances:
+
+            suffix = "" if len(distances) == 1 else " (d=" + str(distance) + ")"
+
+            def calcBatch(glcms, iy, ix, suffix=suffix):
+                table, names = calcGLCMMetricsBatch(
+                    glcms, features=features.get("glcm")
+                )
+                return table, [name + suffix for name in names]
+
+            for dy, dx in offsets:
+                _add_window_metrics(
+                    featureMaps,
+                    iter_glcm_windows(levels, windowSize, step, numLevels,
+                                      (dy*distance, dx*distance)),
+                    calcBatch, shape, scale=1/len(offsets)
+                )
+
+    if "glrlm" in matrices:
+
+        angles = config["glrlm"]["angles"]
+
+        calcBatch = lambda glrlms, iy, ix: calcGLRLMMetricsBatch(
+            glrlms, numPixels[iy, ix], features=features.get("glrlm")
+        )
+
+        for angle in angles:
+            _add_window_metrics(
+                featureMaps,
+                iter_glrlm_windows(levels, windowSize, step, numLevels, angle,
+                                   ignoreBackground, config["backend"]),
+                calcBatch, shape, scale=1/len(angles)
+            )
+
+    if "glszm" in matrices:
+
+        # Zones can merge or split anywhere in the window as it moves, so the
+        # GLSZM is built afresh for each window.
+
+        _add_window_metrics(
+            featureMaps,
+            windowMatrices(lambda window: calc_glszm(
+                window, bitDepth, ignoreBackground, numLevels=numLevels,
+                backend=config["backend"], **config["glszm"]
+            )),
+            lambda glszms, iy, ix: calcGLSZMMetricsBatch(
+                glszms, numPixels[iy, ix], features=features.get("glszm")
+            ), shape
+        )
+
+    if "gldm" in matrices:
+
+        _add_window_metrics(
+            featureMaps,
+            iter_gldm_windows(levels, windowSize, step, numLevels,
+                              config["gldm"]["alpha"],
+                              config["gldm"]["radius"]),
+            lambda gldms, iy, ix: calcGLDMMetricsBatch(
+                gldms, features=features.get("gldm")
+            ), shape
+        )
+
+    if "ngtdm" in matrices:
+
+        _add_window_metrics(
+            featureMaps,
+            windowMatrices(lambda window: calc_ngtdm(
+                window, ignoreBackground, numLevels=numLevels,
+                distance=config["ngtdm"]["distance"]
+            )),
+            lambda ngtdms, iy, ix: calcNGTDMMetricsBatch(
+                ngtdms, features=features.get("ngtdm")
+            ), shape
+        )
+
+    featureNames = list(featureMaps)
+
+    if not featureNames:
+        return np.zeros(shape + (0,)), featureNames
+
+    return np.stack([featureMaps[name] for name in featureNames],
+                    axis=-1), featureNames
+
+
+IMAGE_SUFFIXES = (".tif", ".tiff", ".npy")
+
+
+def read_image(path):
+
+    path = Path(path)
+
+    if path.suffix.lower() == ".npy":
+        return np.load(path)
+
+    import tifffile
+
+    return tifffile.imread(path)
+
+
+def find_images(directory, recursive=False):
+
+    pattern = "**/*" if recursive else "*"
+
+    return sorted(str(path) for path in Path(directory).glob(pattern)
+                  if path.suffix.lower() in IMAGE_SUFFIXES and path.is_file())
+
+
+def _extract_chunk(paths, config):
+
+    # Runs in a worker process. Failures are returned rather than raised, so
+    # one bad image does not stop the rest of the chunk.
+
+    rows = []
+    errors = []
+
+    for path in paths:
+
+        try:
+            record = extract_features(read_image(path), config)
+        except Exception as error:
+            errors.append((path, repr(error)))
+            continue
+
+        rows.append(dict({"path": path}, **record))
+
+    return rows, errors
+
+
+class CSVFeatureWriter:
+
+    def __init__(self, path, fieldnames):
+
+        # Columns are fixed up front from the config's feature names, not by
+        # the first row, so the header is written even if no image succeeds.
+
+        self.file = open(path, "w", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames)
+        self.writer.writeheader()
+
+    def write(self, rows):
+
+        if not rows:
+            return
+
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetFeatureWriter:
+
+    def __init__(self, path, fieldnames):
+
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Writing .parquet requires pyarrow. "
+                              "Install it, or write to a .csv file instead.")
+
+        self.pyarrow = pyarrow
+
+        # The path is text, and every feature a float.
+
+        self.schema = pyarrow.schema([
+            (name, pyarrow.string() if name == "path" else pyarrow.float64())
+            for name in fieldnames
+        ])
+
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+
+        if not rows:
+            return
+
+        # Each chunk is written as its own row group, so nothing is held
+        # back in memory.
+
+        table = self.pyarrow.Table.from_pylist(rows, schema=self.schema)
+
+        self.writer.write_table(table)
+
+    def close(self):
+        self.writer.close()
+
+
+def open_feature_writer(path, fieldnames):
+
+    if Path(path).suffix.lower() == ".parquet":
+        return ParquetFeatureWriter(path, fieldnames)
+
+    return CSVFeatureWriter(path, fieldnames)
+
+
+def extract_directory(directory, output, config=None, workers=None,
+                      chunkSize=16, maxInFlight=None, recursive=False):
+
+    # Paths are submitted in chunks, with at most maxInFlight chunks queued
+    # at once. Results are written as each chunk finishes, so memory does
+    # not grow with the number of images.
+
+    if chunkSize < 1:
+        raise ValueError("chunkSize must be at least 1.")
+
+    if maxInFlight is not None and maxInFlight < 1:
+        raise ValueError("maxInFlight must be at least 1.")
+
+    paths = find_images(directory, recursive)
+    chunks = [paths[k:k+chunkSize] for k in range(0, len(paths), chunkSize)]
+
+    workers = workers or os.cpu_count() or 1
+    maxInFlight = maxInFlight or 2*workers
+
+    writer = open_feature_writer(output, ["path"] + feature_names(config))
+    numDone = 0
+    allErrors = []
+
+    try:
+
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+
+            pending = set()
+            chunkIter = iter(chunks)
+
+            for chunk in chunkIter:
+
+                pending.add(executor.submit(_extract_chunk, chunk, config))
+
+                if len(pending) >= maxInFlight:
+                    break
+
+            while pending:
+
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+
+                for future in done:
+
+                    rows, errors = future.result()
+                    writer.write(rows)
+
+                    numDone += len(rows)
+                    allErrors.extend(errors)
+
+                    nextChunk = next(chunkIter, None)
+
+                    if nextChunk is not None:
+                        pending.add(executor.submit(_extract_chunk,
+                                                    nextChunk, config))
+
+    finally:
+        writer.close()
+
+    return numDone, allErrors
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog="re_imfect_main",
+                                     description="Re_ImFECT texture features.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract = commands.add_parser(
+        "extract", help="Extract features from every image in a directory."
+    )
+    extract.add_argument("directory")
+    extract.add_argument("-o", "--output", required=True,
+                         help="Output .csv or .parquet file.")
+    extract.add_argument("-c", "--config",
+                         help="JSON file of extract_features settings.")
+    extract.add_argument("-j", "--workers", type=int, default=None,
+                         help="Worker processes. (Default = CPU count)")
+    extract.add_argument("--chunk-size", type=int, default=16,
+                         help="Images per task sent to a worker.")
+    extract.add_argument("--max-in-flight", type=int, default=None,
+                         help="Most chunks queued at once. "
+                              "(Default = 2 per worker)")
+    extract.add_argument("-r", "--recursive", action="store_true",
+                         help="Include images in subdirectories.")
+    extract.add_argument("--cache-dir", default=None,
+                         help="Directory of the on-disk matrix cache, "
+                              "shared by every worker.")
+    extract.add_argument("--cache-mb", type=float, default=None,
+                         help="Size budget of the matrix cache in MB. "
+                              "(Default = 1024)")
+
+    args = parser.parse_args(argv)
+
+    config = None
+
+    if args.config:
+        with open(args.config) as configFile:
+            config = json.load(configFile)
+
+    if args.cache_dir is not None or args.cache_mb is not None:
+
+        config = dict(config or {})
+        cache = dict(DEFAULT_CONFIG["cache"], **(config.get("cache") or {}))
+
+        if args.cache_dir is not None:
+            cache["directory"] = args.cache_dir
+
+        if args.cache_mb is not None:
+            cache["maxMB"] = args.cache_mb
+
+        config["cache"] = cache
+
+    numDone, errors = extract_directory(
+        args.directory, args.output, config, workers=args.workers,
+        chunkSize=args.chunk_size, maxInFlight=args.max_in_flight,
+        recursive=args.recursive
+    )
+
+    for path, error in errors:
+        print("Failed: " + path + ": " + error, file=sys.stderr)
+
+    print("Extracted features from " + str(numDone) + " images to "
+          + args.output)
+
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Tests that tile by tile accumulators merge into the single pass matrices.
+"""
+
+import numpy as np
+import pytest
+
+from dev.lib.matrixCalc.accumulators import (GLCMAccumulator,
+                                             GLRLMAccumulator,
+                                             GLDMAccumulator,
+                                             NGTDMAccumulator, iter_tiles)
+from dev.lib.matrixCalc.matrixGLCM import calc_glcm_multi, GLCM_OFFSETS
+from dev.lib.matrixCalc.matrixGLRLM import calc_glrlm_multi
+from dev.lib.matrixCalc.matrixGLDM import calc_gldm
+from dev.lib.matrixCalc.matrixNGTDM import calc_ngtdm
+
+
+NUM_LEVELS = 4
+ANGLES = [0, np.pi/4, np.pi/2, np.pi*(135/180)]
+
+
+def _image():
+
+    # Noise with some flat patches, so runs cross tile seams.
+
+    rng = np.random.default_rng(0)
+    arr = rng.integers(0, NUM_LEVELS, (37, 45))
+    arr[5:20, 3:40] = 2
+    arr[:, 30] = 1
+
+    return arr
+
+
+ACCUMULATORS = {
+    "glcm": (
+        lambda: GLCMAccumulator(NUM_LEVELS, GLCM_OFFSETS.values(), [1, 3]),
+        lambda arr: calc_glcm_multi(arr, GLCM_OFFSETS.values(), [1, 3], None,
+                                    numLevels=NUM_LEVELS)
+    ),
+    "glrlm": (
+        lambda: GLRLMAccumulator(NUM_LEVELS, ANGLES, ignoreBackground=True),
+        lambda arr: calc_glrlm_multi(arr, ANGLES, None, True,
+                                     numLevels=NUM_LEVELS)
+    ),
+    "gldm": (
+        lambda: GLDMAccumulator(NUM_LEVELS, alpha=1, radius=2),
+        lambda arr: calc_gldm(arr, 1, None, numLevels=NUM_LEVELS, radius=2)
+    ),
+    "ngtdm": (
+        lambda: NGTDMAccumulator(NUM_LEVELS, ignoreBackground=True,
+                                 distance=2),
+        lambda arr: calc_ngtdm(arr, True, numLevels=NUM_LEVELS, distance=2)
+    )
+}
+
+
+@pytest.mark.parametrize("name", sorted(ACCUMULATORS))
+@pytest.mark.parametrize("tileSize", [1, 7, 16, 64])
+def test_merged_tiles_match_single_pass(name, tileSize):
+
+    newAccumulator, singlePass = ACCUMULATORS[name]
+    arr = _image()
+
+    # Every tile in its own accumulator, merged in a shuffled order.
+
+    accumulators = []
+
+    for tile, halo, origin in iter_tiles(arr, tileSize,
+                                         newAccumulator().halo):
+        accumulator = newAccumulator()
+        accumulator.update(tile, halo, origin)
+        accumulators.append(accumulator)
+
+    order = np.random.default_rng(tileSize).permutation(len(accumulators))
+
+    merged = newAccumulator()
+
+    for k in order:
+        merged.merge(accumulators[k])
+
+    expected = singlePass(arr)
+
+    if name == "ngtdm":
+        np.testing.assert_allclose(merged.result(), expected, rtol=1e-12)
+    else:
+        np.testing.assert_array_equal(merged.result(), expected)
+
+
+@pytest.mark.parametrize("name", sorted(ACCUMULATORS))
+def test_empty_tile_adds_nothing(name):
+
+    newAccumulator, singlePass = ACCUMULATORS[name]
+    arr = _image()
+
+    accumulator = newAccumulator()
+    accumulator.update(np.zeros((0, 0), dtype=int), 0, (0, 0))
+
+    for tile, halo, origin in iter_tiles(arr, 16, accumulator.halo):
+        accumulator.update(tile, halo, origin)
+
+    expected = singlePass(arr)
+
+    np.testing.assert_allclose(accumulator.result(), expected, rtol=1e-12)
+
+
+def test_ngtdm_of_empty_image():
+
+    ngtdm = calc_ngtdm(np.zeros((0, 0), dtype=int), False)
+
+    assert ngtdm.shape == (1, 3)
+    assert not ngtdm.any()
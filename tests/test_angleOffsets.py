@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the angles shared by the GLCM and GLRLM builders.
+"""
+
+import numpy as np
+import pytest
+
+from dev.lib.matrixCalc.angleOffsets import (ANGLE_OFFSETS, angle_to_degrees,
+                                             angle_to_offset)
+from dev.lib.matrixCalc.matrixGLCM import GLCM_OFFSETS, calc_glcm
+
+
+ANGLES = [0, np.pi/4, np.pi/2, np.pi*(135/180)]
+
+
+def test_angles_map_to_degrees_and_offsets():
+
+    for angle, degrees in zip(ANGLES, (0, 45, 90, 135)):
+        assert angle_to_degrees(angle) == degrees
+        assert angle_to_offset(angle) == ANGLE_OFFSETS[degrees]
+
+    assert GLCM_OFFSETS is ANGLE_OFFSETS
+
+
+@pytest.mark.parametrize("angle", [np.pi/3, -np.pi/4, np.pi])
+def test_other_angles_are_rejected(angle):
+
+    with pytest.raises(ValueError):
+        angle_to_degrees(angle)
+
+    with pytest.raises(ValueError):
+        calc_glcm(np.zeros((3, 3), dtype=int), angle, 2)
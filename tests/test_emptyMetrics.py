@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of every metric calculator on matrices from empty, background-only and
+single-level images, alone and within a batch.
+"""
+
+import warnings
+
+import numpy as np
+import pytest
+
+from dev.lib.matrixCalc.matrixGLCM import calc_glcm
+from dev.lib.matrixCalc.matrixGLSZM import calc_glszm
+from dev.lib.matrixCalc.matrixGLDM import calc_gldm
+from dev.lib.matrixCalc.matrixNGTDM import calc_ngtdm
+from dev.lib.metricCalc.glcmMetrics import (GLCM_FEATURES, calcGLCMMetrics,
+                                            calcGLCMMetricsBatch)
+from dev.lib.metricCalc.glszmMetrics import (GLSZM_FEATURES,
+                                             calcGLSZMMetrics,
+                                             calcGLSZMMetricsBatch)
+from dev.lib.metricCalc.gldmMetrics import (GLDM_FEATURES, calcGLDMMetrics,
+                                            calcGLDMMetricsBatch)
+from dev.lib.metricCalc.ngtdmMetrics import (NGTDM_FEATURES,
+                                             calcNGTDMMetrics,
+                                             calcNGTDMMetricsBatch)
+
+
+NUM_LEVELS = 4
+
+IMAGES = {
+    "empty": np.zeros((0, 5), dtype=int),
+    "background": np.zeros((5, 5), dtype=int),
+    "single level": np.full((5, 5), 2),
+}
+
+TEXTURE = np.random.default_rng(7).integers(0, NUM_LEVELS, (6, 6))
+
+# Builder of a matrix from an image, its single and batch metric
+# calculators, and its features. GLSZMs are all built as wide as TEXTURE
+# has pixels, wider than any zone, so they stack.
+
+MATRICES = {
+    "GLCM": (lambda arr, sparse: calc_glcm(arr, 0, 2, sparse=sparse,
+                                           numLevels=NUM_LEVELS),
+             lambda matrix: calcGLCMMetrics(matrix),
+             lambda stack: calcGLCMMetricsBatch(stack),
+             GLCM_FEATURES),
+    "GLSZM": (lambda arr, sparse: _widened(
+                  calc_glszm(arr, 2, True, numLevels=NUM_LEVELS,
+                             sparse=sparse), sparse),
+              lambda matrix: calcGLSZMMetrics(matrix, 25),
+              lambda stack: calcGLSZMMetricsBatch(stack, 25),
+              GLSZM_FEATURES),
+    "GLDM": (lambda arr, sparse: calc_gldm(arr, 0, 2, numLevels=NUM_LEVELS),
+             lambda matrix: calcGLDMMetrics(matrix),
+             lambda stack: calcGLDMMetricsBatch(stack),
+             GLDM_FEATURES),
+    "NGTDM": (lambda arr, sparse: calc_ngtdm(arr, True,
+                                             numLevels=NUM_LEVELS),
+              lambda matrix: calcNGTDMMetrics(matrix),
+              lambda stack: calcNGTDMMetricsBatch(stack),
+              NGTDM_FEATURES),
+}
+
+SPARSE = {"GLCM", "GLSZM"}
+
+MAX_CORRELATION = "GLCM - Maximal Correlation Coefficient"
+
+
+def _widened(glszm, sparse):
+
+    width = TEXTURE.size
+
+    if sparse:
+        glszm = glszm.tocoo()
+        glszm.resize((NUM_LEVELS, width))
+        return glszm
+
+    return np.pad(glszm, ((0, 0), (0, width-glszm.shape[1])))
+
+
+def _values(metrics, features):
+
+    return np.array([metrics[name] for name in features], dtype=float)
+
+
+@pytest.mark.parametrize("image", sorted(IMAGES))
+@pytest.mark.parametrize("matrix", sorted(MATRICES))
+def test_metrics_of_empty_matrices(matrix, image):
+
+    build, single, batch, features = MATRICES[matrix]
+    arr = IMAGES[image]
+
+    # Features of an empty matrix may be nan, as for GLRLMs, but every one
+    # is returned, and nothing raises or warns.
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+
+        metrics = single(build(arr, False))
+        assert list(metrics) == features
+
+        values = _values(metrics, features)
+
+        # The dense Maximal Correlation Coefficient adds d_0 to Q, as the
+        # original did, so it is sqrt(numGray*d_0) where the sparse one is 0.
+
+        if matrix in SPARSE:
+
+            sparseValues = _values(single(build(arr, True)), features)
+            exact = [name != MAX_CORRELATION for name in features]
+
+            np.testing.assert_allclose(sparseValues[exact], values[exact])
+            np.testing.assert_allclose(sparseValues, values, atol=1e-3)
+
+        # An empty matrix within a batch gives the same row as alone, and
+        # leaves the other rows as they are.
+
+        stack = np.stack([build(TEXTURE, False), build(arr, False)])
+        table, names = batch(stack)
+
+        assert names == features
+        np.testing.assert_allclose(table[1], values, rtol=1e-6)
+        np.testing.assert_allclose(
+            table[0], _values(single(build(TEXTURE, False)), features),
+            rtol=1e-6
+        )
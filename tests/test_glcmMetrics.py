@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the GLCM metrics against values pinned from the original scalar
+implementation.
+"""
+
+import numpy as np
+import pytest
+import scipy.sparse
+
+from dev.lib.metricCalc import glcmMetrics
+from dev.lib.metricCalc.glcmMetrics import (GLCM_FEATURES,
+                                            calcGLCMMetrics,
+                                            calcGLCMMetricsBatch)
+
+
+# Two fixed GLCMs, the second with a gray level that never occurs, and every
+# feature the original per-feature scalar code gave for them.
+
+GLCM_A = np.array([[6, 2, 1, 0, 0],
+                   [2, 4, 3, 1, 0],
+                   [1, 3, 8, 2, 1],
+                   [0, 1, 2, 5, 3],
+                   [0, 0, 1, 3, 2]])
+
+GLCM_B = np.array([[4, 0, 2, 1],
+                   [0, 0, 0, 0],
+                   [2, 0, 6, 3],
+                   [1, 0, 3, 2]])
+
+EXPECTED_A = {
+    "GLCM - Autocorrelation": 9.568627449104191,
+    "GLCM - Cluster Prominence": 58.561546937475555,
+    "GLCM - Cluster Shade": -0.6286872885591421,
+    "GLCM - Cluster Tendency": 5.451749326112882,
+    "GLCM - Contrast": 0.86274509787005,
+    "GLCM - Correlation": 0.7267413425476007,
+    "GLCM - Difference Average": 0.6274509802691273,
+    "GLCM - Difference Variance": 0.46905036515216625,
+    "GLCM - Difference Entropy": 1.3970382508737362,
+    "GLCM - Joint Average": 2.901960783744714,
+    "GLCM - Joint Energy": 0.07804690500591778,
+    "GLCM - Joint Entropy": 3.9442103319237947,
+    "GLCM - Homogeneity": 0.7254901899231064,
+    "GLCM - Informational Measure of Correlation 1": -0.2565621684367049,
+    "GLCM - Informational Measure of Correlation 2": 0.828722065015021,
+    "GLCM - Maximal Correlation Coefficient": 0.7454630998393162,
+    "GLCM - Inverse Difference Moment": 0.7098039155000385,
+    "GLCM - Inverse Difference Moment Normalized": 0.7098039155000385,
+    "GLCM - Inverse Difference": 0.7254901959361784,
+    "GLCM - Inverse Difference Normalized": 0.9010270690954814,
+    "GLCM - Inverse Variance": 0.42156862736831985,
+    "GLCM - Maximum Probability": 0.15686274506728182,
+    "GLCM - Sum Average": 5.803921567489428,
+    "GLCM - Sum Entropy": 3.0663495490926502,
+    "GLCM - Sum Of Squares": 1.578623605995733,
+}
+
+EXPECTED_B = {
+    "GLCM - Autocorrelation": 7.583333330173612,
+    "GLCM - Cluster Prominence": 27.296296251507197,
+    "GLCM - Cluster Shade": -3.75925923398919,
+    "GLCM - Cluster Tendency": 3.555555554074074,
+    "GLCM - Contrast": 1.666666665972222,
+    "GLCM - Correlation": 0.3617021213284131,
+    "GLCM - Difference Average": 0.833333332986111,
+    "GLCM - Difference Variance": 0.9722222218171295,
+    "GLCM - Difference Entropy": 1.7295739583940895,
+    "GLCM - Joint Average": 2.6666666655555553,
+    "GLCM - Joint Energy": 0.14583333321180555,
+    "GLCM - Joint Entropy": 2.9591479163953895,
+    "GLCM - Homogeneity": 0.701388882734375,
+    "GLCM - Informational Measure of Correlation 1": -0.07138357792918436,
+    "GLCM - Informational Measure of Correlation 2": 0.4435322108210173,
+    "GLCM - Maximal Correlation Coefficient": 0.39548630869397766,
+    "GLCM - Inverse Difference Moment": 0.6666666606888889,
+    "GLCM - Inverse Difference Moment Normalized": 0.6666666606888889,
+    "GLCM - Inverse Difference": 0.7013888885966434,
+    "GLCM - Inverse Difference Normalized": 0.858730150759505,
+    "GLCM - Inverse Variance": 0.3009259258005401,
+    "GLCM - Maximum Probability": 0.24999999989583332,
+    "GLCM - Sum Average": 5.3333333311111115,
+    "GLCM - Sum Entropy": 2.4591479166037225,
+    "GLCM - Sum Of Squares": 1.305555555011574,
+}
+
+CASES = [(GLCM_A, EXPECTED_A), (GLCM_B, EXPECTED_B)]
+
+
+def check_metrics(metrics, expected):
+
+    for name in GLCM_FEATURES:
+        np.testing.assert_allclose(metrics[name], expected[name],
+                                   rtol=1e-12, atol=1e-14, err_msg=name)
+
+
+@pytest.mark.parametrize("glcm, expected", CASES)
+def test_dense_matches_scalar(glcm, expected):
+
+    check_metrics(calcGLCMMetrics(glcm), expected)
+
+
+@pytest.mark.parametrize("glcm, expected", CASES)
+def test_sparse_matches_scalar(glcm, expected):
+
+    check_metrics(calcGLCMMetrics(scipy.sparse.coo_matrix(glcm)), expected)
+
+
+@pytest.mark.parametrize("glcm, expected", CASES)
+def test_batch_matches_scalar(glcm, expected):
+
+    values, names = calcGLCMMetricsBatch(np.stack([glcm, glcm]))
+
+    for row in values:
+        check_metrics(dict(zip(names, row)), expected)
+
+
+def raise_if_called(get):
+
+    raise AssertionError("Maximal correlation coefficient was evaluated.")
+
+
+@pytest.fixture
+def no_max_correlation(monkeypatch):
+
+    monkeypatch.setattr(glcmMetrics, "_maxCorrelationDense", raise_if_called)
+    monkeypatch.setattr(glcmMetrics, "_maxCorrelationSparse", raise_if_called)
+    monkeypatch.setitem(glcmMetrics._GLCM_NODES,
+                        "GLCM - Maximal Correlation Coefficient",
+                        raise_if_called)
+    monkeypatch.setitem(glcmMetrics._GLCM_BATCH_NODES,
+                        "GLCM - Maximal Correlation Coefficient",
+                        raise_if_called)
+
+
+@pytest.mark.parametrize("toGLCM", [np.asarray, scipy.sparse.coo_matrix])
+def test_subset_skips_max_correlation(no_max_correlation, toGLCM):
+
+    metrics = calcGLCMMetrics(toGLCM(GLCM_A), features=["Contrast"])
+
+    assert list(metrics) == ["GLCM - Contrast"]
+    np.testing.assert_allclose(metrics["GLCM - Contrast"],
+                               EXPECTED_A["GLCM - Contrast"], rtol=1e-12)
+
+    with pytest.raises(AssertionError, match="Maximal correlation"):
+        calcGLCMMetrics(toGLCM(GLCM_A),
+                        features=["Maximal Correlation Coefficient"])
+
+
+def test_batch_subset_skips_max_correlation(no_max_correlation):
+
+    values, names = calcGLCMMetricsBatch(np.stack([GLCM_A, GLCM_A]),
+                                         features=["Contrast"])
+
+    assert names == ["GLCM - Contrast"]
+    np.testing.assert_allclose(values[:, 0], EXPECTED_A["GLCM - Contrast"],
+                               rtol=1e-12)
+
+    with pytest.raises(AssertionError, match="Maximal correlation"):
+        calcGLCMMetricsBatch(np.stack([GLCM_A, GLCM_A]),
+                             features=["Maximal Correlation Coefficient"])
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the GLDM metrics against entry by entry sums.
+"""
+
+import numpy as np
+
+from dev.lib.metricCalc import countStacks
+from dev.lib.metricCalc.gldmMetrics import (GLDM_FEATURES, calcGLDMMetrics,
+                                            calcGLDMMetricsBatch)
+
+
+def brute_gldm_metrics(gldm):
+
+    gldm = np.asarray(gldm, dtype=float)
+    numZones = gldm.sum()
+    p = gldm/numZones
+
+    i, j = np.indices(gldm.shape) + 1.0
+
+    avgGray = (p*i).sum()
+    avgSize = (p*j).sum()
+
+    return {
+        "GLDM - Small Dependence Emphasis": (p/j**2).sum(),
+        "GLDM - Large Dependence Emphasis": (p*j**2).sum(),
+        "GLDM - Low Gray Level Emphasis": (p/i**2).sum(),
+        "GLDM - High Gray Level Emphasis": (p*i**2).sum(),
+        "GLDM - Small Dependence Low Gray Level Emphasis":
+            (p/(i**2*j**2)).sum(),
+        "GLDM - Large Dependence Low Gray Level Emphasis":
+            (p*j**2/i**2).sum(),
+        "GLDM - Small Dependence High Gray Level Emphasis":
+            (p*i**2/j**2).sum(),
+        "GLDM - Large Dependence High Gray Level Emphasis":
+            (p*i**2*j**2).sum(),
+        "GLDM - Gray Level Variance": (p*(i-avgGray)**2).sum(),
+        "GLDM - Gray Level Non-Uniformity": (gldm.sum(1)**2).sum()/numZones,
+        "GLDM - Gray Level Non-Uniformity Normalized":
+            (gldm.sum(1)**2).sum()/numZones**2,
+        "GLDM - Dependence Variance": (p*(j-avgSize)*(j-avgGray)).sum(),
+        "GLDM - Dependence Non-Uniformity": (gldm.sum(0)**2).sum()/numZones,
+        "GLDM - Dependence Non-Uniformity Normalized":
+            (gldm.sum(0)**2).sum()/numZones**2,
+        "GLDM - Dependence Entropy": -(p[p > 0]*np.log2(p[p > 0])).sum(),
+    }
+
+
+def test_metrics_match_brute_force():
+
+    gldm = np.random.default_rng(13).integers(0, 9, (6, 9)).astype(np.uint32)
+
+    metrics = calcGLDMMetrics(gldm)
+    expected = brute_gldm_metrics(gldm)
+
+    assert list(metrics) == GLDM_FEATURES
+
+    for name in GLDM_FEATURES:
+        np.testing.assert_allclose(metrics[name], expected[name], rtol=1e-12)
+
+
+def test_batch_with_empty_matrix():
+
+    gldms = np.zeros((3, 4, 9), dtype=np.uint32)
+    gldms[1] = np.random.default_rng(14).integers(0, 9, (4, 9))
+
+    table, names = calcGLDMMetricsBatch(gldms)
+
+    assert np.isnan(table[[0, 2]]).all()
+    np.testing.assert_allclose(
+        table[1], [brute_gldm_metrics(gldms[1])[name] for name in names],
+        rtol=1e-12
+    )
+
+
+def test_blocked_integer_stack_matches_float_stack(monkeypatch):
+
+    gldms = np.random.default_rng(15).integers(0, 9, (7, 5, 9)).astype(
+        np.uint16
+    )
+
+    expected, names = calcGLDMMetricsBatch(gldms.astype(float))
+
+    monkeypatch.setattr(countStacks, "FLOAT_BLOCK_ENTRIES", 1)
+
+    table, _ = calcGLDMMetricsBatch(gldms)
+
+    np.testing.assert_allclose(table, expected, rtol=1e-12)
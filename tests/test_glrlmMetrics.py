@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the GLRLM metrics against entry by entry sums.
+"""
+
+import warnings
+
+import numpy as np
+
+from dev.lib.metricCalc import countStacks
+from dev.lib.metricCalc.glrlmMetrics import (GLRLM_FEATURES,
+                                             calcGLRLMMetrics,
+                                             calcGLRLMMetricsBatch)
+
+
+def brute_glrlm_metrics(glrlm, numPixels):
+
+    glrlm = np.asarray(glrlm, dtype=float)
+    numRuns = glrlm.sum()
+    p = glrlm/numRuns
+
+    i, j = np.indices(glrlm.shape) + 1.0
+
+    avgGray = (p*i).sum()
+    avgLength = (p*j).sum()
+
+    return {
+        "GLRLM - Short Run Emphasis": (p/j**2).sum(),
+        "GLRLM - Long Run Emphasis": (p*j**2).sum(),
+        "GLRLM - Low Gray Level Run Emphasis": (p/i**2).sum(),
+        "GLRLM - High Gray Level Run Emphasis": (p*i**2).sum(),
+        "GLRLM - Short Run Low Gray Emphasis": (p/(i**2*j**2)).sum(),
+        "GLRLM - Short Run High Gray Emphasis": (p*i**2/j**2).sum(),
+        "GLRLM - Long Run Low Gray Emphasis": (p*j**2/i**2).sum(),
+        "GLRLM - Long Run High Gray Emphasis": (p*i**2*j**2).sum(),
+        "GLRLM - Gray Level Variance": (p*(i - avgGray)**2).sum(),
+        "GLRLM - Gray Level Non-Uniformity": (
+            (glrlm.sum(1)**2).sum()/numRuns
+        ),
+        "GLRLM - Gray Level Non-Uniformity Normalized": (
+            (glrlm.sum(1)**2).sum()/numRuns**2
+        ),
+        "GLRLM - Run Variance": (p*(j - avgLength)**2).sum(),
+        "GLRLM - Run Length Non-Uniformity": (
+            (glrlm.sum(0)**2).sum()/numRuns
+        ),
+        "GLRLM - Run Length Non-Uniformity Normalized": (
+            (glrlm.sum(0)**2).sum()/numRuns**2
+        ),
+        "GLRLM - Run Length Percentage": numRuns/numPixels,
+        "GLRLM - Run Entropy": -(p[p > 0]*np.log2(p[p > 0])).sum()
+    }
+
+
+def test_glrlm_metrics_match_brute_force():
+
+    glrlm = np.random.default_rng(0).integers(0, 20, (8, 6)).astype(np.uint32)
+
+    metrics = calcGLRLMMetrics(glrlm, 500)
+    expected = brute_glrlm_metrics(glrlm, 500)
+
+    for name in GLRLM_FEATURES:
+        np.testing.assert_allclose(metrics[name], expected[name], rtol=1e-12)
+
+
+def test_empty_glrlm_gives_nan():
+
+    # E.g. an all-background image with ignoreBackground, or an empty mask.
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        metrics = calcGLRLMMetrics(np.zeros((4, 1), dtype=np.uint32), 0)
+
+    assert set(metrics) == set(GLRLM_FEATURES)
+    assert np.isnan(metrics["GLRLM - Run Entropy"])
+
+
+def test_batch_with_empty_matrix():
+
+    glrlms = np.zeros((3, 4, 5), dtype=np.uint32)
+    glrlms[1] = np.random.default_rng(1).integers(0, 9, (4, 5))
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        table, names = calcGLRLMMetricsBatch(glrlms, 100)
+
+    entropy = table[:, names.index("GLRLM - Run Entropy")]
+
+    assert np.isnan(entropy[[0, 2]]).all()
+    np.testing.assert_allclose(
+        table[1],
+        [brute_glrlm_metrics(glrlms[1], 100)[name] for name in names],
+        rtol=1e-12
+    )
+
+
+def test_batch_in_blocks_matches_float_stack(monkeypatch):
+
+    # Blocks of one matrix convert the integer stack a matrix at a time.
+
+    glrlms = np.random.default_rng(2).integers(0, 9, (7, 5, 6)).astype(
+        np.uint32
+    )
+
+    expected, names = calcGLRLMMetricsBatch(glrlms.astype(float), 80)
+
+    monkeypatch.setattr(countStacks, "FLOAT_BLOCK_ENTRIES", 1)
+
+    table, _ = calcGLRLMMetricsBatch(glrlms, 80)
+
+    np.testing.assert_allclose(table, expected, rtol=1e-12)
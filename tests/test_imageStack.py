@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the TIFF and HDF5 stack readers against whole-file reads.
+"""
+
+import numpy as np
+import pytest
+import tifffile
+
+from dev.lib.imageIO.imageStack import (TiffPageStack, open_stack,
+                                        iter_tiles, read_tile)
+
+
+INDICES = [
+    (slice(None),),
+    (1,),
+    (slice(3, 50), slice(7, 90)),
+    (slice(None, None, -3), slice(2, None, 5)),
+    (slice(60, 10, -2), -4),
+    (-1, slice(0, 0)),
+    (np.array([1, 0]),),
+    (0, slice(5, 30), slice(3, 4))
+]
+
+TIFF_LAYOUTS = {
+    "tiled": ((300, 500), np.uint16,
+              {"tile": (64, 128), "compression": "zlib"}),
+    "strips": ((300, 500), np.uint16,
+               {"compression": "zlib", "rowsperstrip": 37}),
+    "rgb": ((100, 120, 3), np.uint8,
+            {"tile": (32, 32), "compression": "zlib"}),
+    "separate": ((3, 70, 90), np.uint8,
+                 {"tile": (32, 32), "compression": "zlib",
+                  "planarconfig": "separate", "photometric": "rgb"}),
+    "pages": ((4, 70, 90), np.uint8,
+              {"tile": (32, 32), "compression": "zlib",
+               "photometric": "minisblack"}),
+    "pageStrips": ((3, 50, 40), np.uint8,
+                   {"compression": "zlib", "photometric": "minisblack",
+                    "rowsperstrip": 7})
+}
+
+
+@pytest.fixture(params=sorted(TIFF_LAYOUTS))
+def compressed_tiff(request, tmp_path):
+
+    shape, dtype, options = TIFF_LAYOUTS[request.param]
+
+    image = np.random.default_rng(0).integers(0, 255, shape).astype(dtype)
+    path = tmp_path / (request.param + ".tif")
+
+    tifffile.imwrite(path, image, **options)
+
+    return path, image
+
+
+def test_compressed_tiff_slices_match(compressed_tiff):
+
+    path, image = compressed_tiff
+
+    stack = open_stack(path)
+
+    assert isinstance(stack, TiffPageStack)
+    assert stack.shape == image.shape
+
+    for index in INDICES:
+
+        try:
+            expected = image[index]
+        except IndexError:
+            continue
+
+        np.testing.assert_array_equal(stack[index], expected)
+
+    stack.close()
+
+
+def test_tile_decodes_only_the_tiles_it_touches(tmp_path, monkeypatch):
+
+    image = np.random.default_rng(1).integers(0, 255, (512, 512),
+                                              dtype=np.uint8)
+    path = tmp_path / "slide.tif"
+
+    tifffile.imwrite(path, image, tile=(64, 64), compression="zlib")
+
+    def whole_page(*args, **kwargs):
+        raise AssertionError("Whole page decoded.")
+
+    monkeypatch.setattr(tifffile.TiffPage, "asarray", whole_page)
+
+    read = []
+    read_segments = tifffile.FileHandle.read_segments
+
+    def counted(self, offsets, *args, **kwargs):
+        read.append(len(offsets))
+        return read_segments(self, offsets, *args, **kwargs)
+
+    monkeypatch.setattr(tifffile.FileHandle, "read_segments", counted)
+
+    stack = open_stack(path)
+
+    # A 64x64 tile straddling a tile corner touches four tiles.
+
+    np.testing.assert_array_equal(read_tile(stack, 96, 32, 64, 64),
+                                  image[96:160, 32:96])
+    assert read == [4]
+
+    stack.close()
+
+
+def test_iter_tiles_covers_every_page(tmp_path):
+
+    image = np.random.default_rng(2).integers(0, 255, (3, 50, 70),
+                                              dtype=np.uint8)
+    path = tmp_path / "pages.tif"
+
+    tifffile.imwrite(path, image, tile=(16, 16), compression="zlib",
+                     photometric="minisblack")
+
+    stack = open_stack(path)
+    rebuilt = np.zeros_like(image)
+
+    for page, y, x, tile in iter_tiles(stack, 32):
+        rebuilt[page, y:y+tile.shape[0], x:x+tile.shape[1]] = tile
+
+    np.testing.assert_array_equal(rebuilt, image)
+
+    stack.close()
+
+
+def test_uncompressed_tiff_is_memory_mapped(tmp_path):
+
+    image = np.random.default_rng(3).integers(0, 255, (2, 30, 40),
+                                              dtype=np.uint8)
+    path = tmp_path / "plain.tif"
+
+    tifffile.imwrite(path, image, photometric="minisblack")
+
+    stack = open_stack(path)
+
+    assert isinstance(stack, np.memmap)
+    np.testing.assert_array_equal(stack[1, 5:9], image[1, 5:9])
+
+
+@pytest.mark.parametrize("chunks", [None, (1, 16, 16)])
+def test_hdf5_slices_match(tmp_path, chunks):
+
+    h5py = pytest.importorskip("h5py")
+
+    image = np.random.default_rng(4).integers(0, 255, (2, 30, 40),
+                                              dtype=np.uint16)
+    path = tmp_path / "stack.h5"
+
+    with h5py.File(path, "w") as h5File:
+        h5File.create_dataset("image", data=image, chunks=chunks)
+
+    stack = open_stack(path)
+
+    np.testing.assert_array_equal(read_tile(stack, 5, 7, 16, 16, page=1),
+                                  image[1, 5:21, 7:23])
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the per-label matrix builders against the single label builders.
+"""
+
+import numpy as np
+import pytest
+
+from dev.lib.matrixCalc.labelMatrices import calc_glszm_by_label, label_index
+from dev.lib.matrixCalc.matrixGLSZM import calc_glszm
+from re_imfect_main import extract_features_by_label
+
+
+def _tiled_labels(shape, cell):
+
+    # Square cells of cell pixels, each its own label.
+
+    rows, cols = np.indices(shape)
+
+    return (rows//cell)*(-(-shape[1]//cell)) + cols//cell + 1
+
+
+@pytest.mark.parametrize("connectivity", [4, 8])
+def test_glszm_by_label_matches_masked(connectivity):
+
+    rng = np.random.default_rng(8)
+    arr = rng.integers(0, 3, (20, 24))
+    labels = _tiled_labels(arr.shape, 6)
+    labels[rng.random(arr.shape) < 0.1] = 0
+
+    glszms = calc_glszm_by_label(arr, labels, 3, connectivity=connectivity)
+    labelValues, _ = label_index(labels)
+
+    assert len(glszms) == labelValues.size
+
+    for glszm, label in zip(glszms, labelValues):
+
+        expected = calc_glszm(arr, 2, True, numLevels=3,
+                              connectivity=connectivity, mask=labels == label,
+                              sparse=True)
+
+        assert glszm.shape == expected.shape
+        np.testing.assert_array_equal(glszm.toarray(), expected.toarray())
+
+
+def test_one_large_zone_does_not_widen_other_labels():
+
+    # One flat label of 40,000 pixels among 1,250 small ones. A shared
+    # dense size axis would need 1,250 x L x 40,000 counts.
+
+    arr = np.random.default_rng(9).integers(1, 256, (400, 400))
+    labels = _tiled_labels((400, 400), 8)
+    arr[:200, :200] = 7
+    labels[:200, :200] = labels.max() + 1
+
+    glszms = calc_glszm_by_label(arr, labels, 256)
+
+    widths = sorted(glszm.shape[1] for glszm in glszms)
+
+    assert widths[-1] == 200*200
+    assert widths[-2] <= 64
+
+    labelValues, table, names = extract_features_by_label(
+        arr, labels, {"quantization": None, "bitDepth": 8,
+                      "matrices": ["glszm"]}
+    )
+
+    assert table.shape == (len(glszms), len(names))
+    assert np.isfinite(table).all()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the on-disk matrix cache.
+"""
+
+import os
+
+import numpy as np
+import scipy.sparse
+
+from dev.lib.matrixCalc import matrixCache
+from dev.lib.matrixCalc.matrixCache import MatrixCache
+from dev.lib.matrixCalc.matrixGLCM import calc_glcm_multi, GLCM_OFFSETS
+
+
+def test_wrapped_builder_reads_back_its_matrices(tmp_path):
+
+    cache = MatrixCache(tmp_path)
+    levels = np.random.default_rng(0).integers(0, 8, (16, 16))
+
+    cached = cache.wrap(calc_glcm_multi)
+
+    built = cached(levels, list(GLCM_OFFSETS.values()), [1], 3)
+    read = cached(levels, list(GLCM_OFFSETS.values()), [1], bitDepth=3)
+
+    assert len(cache.entries()) == 1
+    np.testing.assert_array_equal(read, built)
+    assert read.dtype == built.dtype
+
+
+def test_lists_of_sparse_matrices_round_trip(tmp_path):
+
+    cache = MatrixCache(tmp_path)
+    matrices = [scipy.sparse.coo_matrix(np.eye(3, dtype=np.uint32)),
+                np.arange(4)]
+
+    cache.put("key", matrices)
+    read = cache.get("key")
+
+    np.testing.assert_array_equal(read[0].toarray(), np.eye(3))
+    np.testing.assert_array_equal(read[1], np.arange(4))
+    assert cache.get("missing") is None
+
+
+def test_eviction_keeps_the_budget_and_recent_entries(tmp_path):
+
+    cache = MatrixCache(tmp_path)
+    cache.put("probe", np.full(256, 0))
+    entrySize = cache.size()
+    cache.clear()
+
+    cache.maxBytes = 5*entrySize
+
+    for k in range(12):
+
+        cache.put(str(k), np.full(256, k))
+
+        # Entries must be told apart by their time of last use.
+
+        os.utime(cache._path(str(k)), (k, k))
+
+        assert cache.size() <= cache.maxBytes
+
+    assert cache.get("11") is not None
+    assert cache.get("0") is None
+
+
+def test_puts_do_not_scan_the_folder_each_time(tmp_path, monkeypatch):
+
+    cache = MatrixCache(tmp_path, maxBytes=2**30)
+    scans = []
+
+    entries = cache.entries
+    monkeypatch.setattr(cache, "entries",
+                        lambda: scans.append(1) or entries())
+    monkeypatch.setattr(matrixCache, "SCAN_PUTS", 50)
+
+    for k in range(200):
+        cache.put(str(k), np.arange(k))
+
+    assert len(scans) <= 5
+    assert cache._total == cache.size()
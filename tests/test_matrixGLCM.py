@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the GLCM builders against a pixel by pixel count.
+"""
+
+import numpy as np
+import pytest
+
+from dev.lib.matrixCalc.matrixGLCM import (calc_glcm, calc_glcm_multi,
+                                           GLCM_OFFSETS)
+
+
+def brute_glcm(arr, dy, dx, numLevels, mask=None):
+
+    # Visits every pixel and its neighbour (dy, dx) away, counting the pair
+    # both ways.
+
+    glcm = np.zeros((numLevels, numLevels), dtype=int)
+
+    rows, cols = arr.shape
+
+    for y in range(rows):
+        for x in range(cols):
+
+            ny, nx = y + dy, x + dx
+
+            if not (0 <= ny < rows and 0 <= nx < cols):
+                continue
+
+            if mask is not None and not (mask[y, x] and mask[ny, nx]):
+                continue
+
+            glcm[arr[y, x], arr[ny, nx]] += 1
+            glcm[arr[ny, nx], arr[y, x]] += 1
+
+    return glcm
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+@pytest.mark.parametrize("shape", [(3, 3), (7, 5), (1, 6)])
+def test_glcm_multi_matches_brute_force(shape, sparse):
+
+    arr = np.random.default_rng(0).integers(0, 4, shape)
+    offsets = list(GLCM_OFFSETS.values())
+    distances = [1, 2, 4, 5, 9]
+
+    glcms = calc_glcm_multi(arr, offsets, distances, 2, sparse=sparse)
+
+    k = 0
+
+    for distance in distances:
+        for dy, dx in offsets:
+
+            glcm = glcms[k].toarray() if sparse else glcms[k]
+
+            np.testing.assert_array_equal(
+                glcm, brute_glcm(arr, dy*distance, dx*distance, 4)
+            )
+
+            k += 1
+
+
+def test_glcm_with_mask_matches_brute_force():
+
+    rng = np.random.default_rng(1)
+    arr = rng.integers(0, 4, (9, 8))
+    mask = rng.random((9, 8)) < 0.6
+
+    for angle, (dy, dx) in GLCM_OFFSETS.items():
+
+        glcm = calc_glcm(arr, np.deg2rad(angle), 2, mask=mask)
+
+        np.testing.assert_array_equal(glcm, brute_glcm(arr, dy, dx, 4, mask))
+
+
+def test_glcm_offset_longer_than_mask():
+
+    arr = np.random.default_rng(2).integers(0, 4, (10, 10))
+    mask = np.zeros((10, 10), dtype=bool)
+    mask[3:5, 4:7] = True
+
+    glcms = calc_glcm_multi(arr, GLCM_OFFSETS.values(), [4], 2, mask=mask)
+
+    assert glcms.shape == (4, 4, 4)
+    assert not glcms.any()
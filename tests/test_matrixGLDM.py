@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the GLDM builder against a pixel by pixel neighbour count.
+"""
+
+import numpy as np
+import pytest
+
+from dev.lib.matrixCalc.matrixGLDM import calc_gldm
+
+
+def brute_gldm(arr, alpha, radius, numLevels, mask=None):
+
+    # Counts, for every pixel in the mask, the neighbours within radius
+    # that are in the image and mask and within alpha of it.
+
+    rows, cols = arr.shape
+    inside = np.ones(arr.shape, dtype=bool) if mask is None else mask
+
+    gldm = np.zeros((numLevels, (2*radius+1)**2), dtype=int)
+
+    for y in range(rows):
+
+        for x in range(cols):
+
+            if not inside[y, x]:
+                continue
+
+            dependent = 0
+
+            for i in range(y-radius, y+radius+1):
+                for j in range(x-radius, x+radius+1):
+                    if ((i, j) != (y, x) and 0 <= i < rows and 0 <= j < cols
+                            and inside[i, j]
+                            and abs(arr[i, j] - arr[y, x]) <= alpha):
+                        dependent += 1
+
+            gldm[arr[y, x], dependent] += 1
+
+    return gldm
+
+
+@pytest.mark.parametrize("alpha", [0, 1])
+@pytest.mark.parametrize("radius", [1, 2])
+@pytest.mark.parametrize("masked", [False, True])
+def test_gldm_matches_brute_force(alpha, radius, masked):
+
+    rng = np.random.default_rng(5)
+    arr = rng.integers(0, 4, (8, 9))
+    mask = rng.random(arr.shape) < 0.7 if masked else None
+
+    gldm = calc_gldm(arr, alpha, 2, radius=radius, mask=mask)
+
+    np.testing.assert_array_equal(gldm,
+                                  brute_gldm(arr, alpha, radius, 4, mask))
+
+
+@pytest.mark.parametrize("arr, mask", [
+    (np.zeros((0, 4), dtype=int), None),
+    (np.ones((3, 4), dtype=int), np.zeros((3, 4), dtype=bool)),
+])
+def test_empty(arr, mask):
+
+    gldm = calc_gldm(arr, 0, 1, mask=mask)
+
+    assert gldm.shape == (2, 9)
+    assert not gldm.any()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the GLRLM builder against a pixel by pixel walk along each line.
+"""
+
+import numpy as np
+import pytest
+
+from dev.lib.matrixCalc.angleOffsets import ANGLE_OFFSETS
+from dev.lib.matrixCalc.backends import available_backends
+from dev.lib.matrixCalc.matrixGLRLM import calc_glrlm, calc_glrlm_multi
+
+
+ANGLES = [0, np.pi/4, np.pi/2, np.pi*(135/180)]
+
+
+def brute_runs(arr, dy, dx, mask=None, ignoreBackground=True):
+
+    # Walks every line from its first pixel, ending a run where the level
+    # changes, the line ends, or the mask does. Returns (level, length)
+    # pairs.
+
+    rows, cols = arr.shape
+    inside = np.ones(arr.shape, dtype=bool) if mask is None else mask
+
+    runs = []
+
+    for y in range(rows):
+
+        for x in range(cols):
+
+            # Only start from pixels with no predecessor on their line.
+
+            if 0 <= y-dy < rows and 0 <= x-dx < cols:
+                continue
+
+            level, length = None, 0
+            i, j = y, x
+
+            while 0 <= i < rows and 0 <= j < cols:
+
+                value = arr[i, j] if inside[i, j] else None
+
+                if value != level:
+                    if level is not None:
+                        runs.append((level, length))
+                    level, length = value, 0
+
+                length += 1
+                i, j = i+dy, j+dx
+
+            if level is not None:
+                runs.append((level, length))
+
+    if ignoreBackground:
+        runs = [(level, length) for level, length in runs if level != 0]
+
+    return runs
+
+
+def brute_glrlm(runs, numLevels, width):
+
+    glrlm = np.zeros((numLevels, width), dtype=int)
+
+    for level, length in runs:
+        glrlm[level, length-1] += 1
+
+    return glrlm
+
+
+@pytest.mark.parametrize("backend", available_backends())
+@pytest.mark.parametrize("ignoreBackground", [True, False])
+@pytest.mark.parametrize("masked", [False, True])
+def test_glrlm_matches_brute_force(backend, ignoreBackground, masked):
+
+    rng = np.random.default_rng(1)
+    arr = rng.integers(0, 3, (7, 9))
+    arr[2, :] = 2  # A run the whole width of the image.
+    mask = rng.random(arr.shape) < 0.8 if masked else None
+
+    glrlms = calc_glrlm_multi(arr, ANGLES, 2, ignoreBackground,
+                              numLevels=3, mask=mask, backend=backend)
+
+    runs = [brute_runs(arr, *ANGLE_OFFSETS[degrees], mask, ignoreBackground)
+            for degrees in (0, 45, 90, 135)]
+
+    # The run length axis is shared and trimmed to the longest run.
+
+    longestRun = max(length for angleRuns in runs for _, length in angleRuns)
+    assert glrlms.shape == (4, 3, longestRun)
+
+    for glrlm, angleRuns in zip(glrlms, runs):
+        np.testing.assert_array_equal(glrlm,
+                                      brute_glrlm(angleRuns, 3, longestRun))
+
+
+def test_single_angle_matches_multi():
+
+    rng = np.random.default_rng(2)
+    arr = rng.integers(0, 4, (5, 6))
+
+    glrlms = calc_glrlm_multi(arr, ANGLES, 2)
+
+    # A single angle is trimmed to its own longest run.
+
+    for angle, glrlm in zip(ANGLES, glrlms):
+        single = calc_glrlm(arr, angle, 2)
+        padded = np.zeros_like(glrlm)
+        padded[:, :single.shape[1]] = single
+        np.testing.assert_array_equal(padded, glrlm)
+
+
+@pytest.mark.parametrize("arr, mask", [
+    (np.zeros((0, 4), dtype=int), None),
+    (np.zeros((3, 4), dtype=int), None),
+    (np.ones((3, 4), dtype=int), np.zeros((3, 4), dtype=bool)),
+])
+def test_empty_and_background_only(arr, mask):
+
+    glrlms = calc_glrlm_multi(arr, ANGLES, 1, mask=mask)
+
+    assert glrlms.shape == (4, 2, 1)
+    assert not glrlms.any()
+
+
+def test_background_runs_dropped_by_default():
+
+    # The original builder counted level 0 runs whatever ignoreBackground
+    # was. It is now honoured, and True by default.
+
+    arr = np.array([[0, 0, 1],
+                    [2, 0, 0]])
+
+    default = calc_glrlm(arr, 0, 2)
+    kept = calc_glrlm(arr, 0, 2, ignoreBackground=False)
+
+    assert not default[0].any()
+    np.testing.assert_array_equal(kept[0, :2], [0, 2])
+    np.testing.assert_array_equal(default[1:], kept[1:, :default.shape[1]])
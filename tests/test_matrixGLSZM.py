@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the GLSZM builder against a breadth first flood fill.
+"""
+
+from collections import deque
+
+import numpy as np
+import pytest
+
+from dev.lib.matrixCalc.backends import available_backends
+from dev.lib.matrixCalc.matrixGLSZM import calc_glszm
+
+
+def brute_zones(arr, connectivity, mask=None, ignoreBackground=True):
+
+    # Floods each zone from its first unvisited pixel. Returns (level, size)
+    # pairs.
+
+    rows, cols = arr.shape
+    counted = np.ones(arr.shape, dtype=bool) if mask is None else mask.copy()
+
+    if ignoreBackground:
+        counted &= arr != 0
+
+    if connectivity == 4:
+        steps = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    else:
+        steps = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1)
+                 if dy or dx]
+
+    visited = np.zeros(arr.shape, dtype=bool)
+    zones = []
+
+    for y in range(rows):
+
+        for x in range(cols):
+
+            if visited[y, x] or not counted[y, x]:
+                continue
+
+            visited[y, x] = True
+            queue = deque([(y, x)])
+            size = 0
+
+            while queue:
+
+                i, j = queue.popleft()
+                size += 1
+
+                for dy, dx in steps:
+
+                    ni, nj = i+dy, j+dx
+
+                    if (0 <= ni < rows and 0 <= nj < cols
+                            and counted[ni, nj] and not visited[ni, nj]
+                            and arr[ni, nj] == arr[y, x]):
+                        visited[ni, nj] = True
+                        queue.append((ni, nj))
+
+            zones.append((arr[y, x], size))
+
+    return zones
+
+
+def brute_glszm(zones, numLevels):
+
+    glszm = np.zeros((numLevels, max([size for _, size in zones] + [1])),
+                     dtype=int)
+
+    for level, size in zones:
+        glszm[level, size-1] += 1
+
+    return glszm
+
+
+@pytest.mark.parametrize("backend", available_backends())
+@pytest.mark.parametrize("connectivity", [4, 8])
+@pytest.mark.parametrize("ignoreBackground", [True, False])
+@pytest.mark.parametrize("masked", [False, True])
+def test_glszm_matches_brute_force(backend, connectivity, ignoreBackground,
+                                   masked):
+
+    rng = np.random.default_rng(3)
+    arr = rng.integers(0, 3, (9, 11))
+    mask = rng.random(arr.shape) < 0.8 if masked else None
+
+    expected = brute_glszm(brute_zones(arr, connectivity, mask,
+                                       ignoreBackground), 3)
+
+    for sparse in (False, True):
+
+        glszm = calc_glszm(arr, 2, ignoreBackground, numLevels=3,
+                           connectivity=connectivity, mask=mask,
+                           backend=backend, sparse=sparse)
+
+        if sparse:
+            glszm = glszm.toarray()
+
+        np.testing.assert_array_equal(glszm, expected)
+
+
+def test_floodfill_engine_matches_brute_force():
+
+    rng = np.random.default_rng(4)
+    arr = rng.integers(0, 3, (9, 11))
+
+    expected = brute_glszm(brute_zones(arr, 8), 4)
+    glszm = calc_glszm(arr, 2, True, engine="floodfill")
+
+    # The flood fill still tallies each background pixel as a zone of
+    # level 0, as it always has, so only the other levels are compared.
+
+    width = max(expected.shape[1], glszm.shape[1])
+    np.testing.assert_array_equal(
+        np.pad(glszm, ((0, 0), (0, width-glszm.shape[1])))[1:],
+        np.pad(expected, ((0, 0), (0, width-expected.shape[1])))[1:]
+    )
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+@pytest.mark.parametrize("arr, mask", [
+    (np.zeros((0, 4), dtype=int), None),
+    (np.zeros((3, 4), dtype=int), None),
+    (np.ones((3, 4), dtype=int), np.zeros((3, 4), dtype=bool)),
+])
+def test_empty_and_background_only(arr, mask, sparse):
+
+    glszm = calc_glszm(arr, 1, True, mask=mask, sparse=sparse)
+
+    assert glszm.shape == (2, 1)
+    assert glszm.sum() == 0
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the NGTDM builder against a pixel by pixel neighbourhood average.
+"""
+
+import numpy as np
+import pytest
+
+from dev.lib.matrixCalc.matrixNGTDM import calc_ngtdm
+
+
+def brute_ngtdm(arr, ignoreBackground, numLevels, distance, mask=None):
+
+    # Averages, for every counted pixel, the neighbours within distance that
+    # are in the image and mask. Pixels with no such neighbour are skipped.
+
+    rows, cols = arr.shape
+    inside = np.ones(arr.shape, dtype=bool) if mask is None else mask
+
+    ngtdm = np.zeros((numLevels, 3))
+
+    for y in range(rows):
+
+        for x in range(cols):
+
+            if not inside[y, x] or (ignoreBackground and arr[y, x] == 0):
+                continue
+
+            neighbours = [arr[i, j]
+                          for i in range(y-distance, y+distance+1)
+                          for j in range(x-distance, x+distance+1)
+                          if (i, j) != (y, x) and 0 <= i < rows
+                          and 0 <= j < cols and inside[i, j]]
+
+            if not neighbours:
+                continue
+
+            ngtdm[arr[y, x], 0] += 1
+            ngtdm[arr[y, x], 2] += abs(arr[y, x] - np.mean(neighbours))
+
+    ngtdm[:, 1] = ngtdm[:, 0]/np.count_nonzero(inside)
+
+    return ngtdm
+
+
+@pytest.mark.parametrize("ignoreBackground", [True, False])
+@pytest.mark.parametrize("distance", [1, 2])
+@pytest.mark.parametrize("masked", [False, True])
+def test_ngtdm_matches_brute_force(ignoreBackground, distance, masked):
+
+    rng = np.random.default_rng(6)
+    arr = rng.integers(0, 4, (8, 9))
+    mask = rng.random(arr.shape) < 0.7 if masked else None
+
+    ngtdm = calc_ngtdm(arr, ignoreBackground, numLevels=4, distance=distance,
+                       mask=mask)
+
+    np.testing.assert_allclose(
+        ngtdm, brute_ngtdm(arr, ignoreBackground, 4, distance, mask)
+    )
+
+
+@pytest.mark.parametrize("arr, mask", [
+    (np.zeros((0, 4), dtype=int), None),
+    (np.zeros((3, 4), dtype=int), None),
+    (np.ones((3, 4), dtype=int), np.zeros((3, 4), dtype=bool)),
+])
+def test_empty_and_background_only(arr, mask):
+
+    ngtdm = calc_ngtdm(arr, True, numLevels=2, mask=mask)
+
+    assert ngtdm.shape == (2, 3)
+    assert not ngtdm.any()
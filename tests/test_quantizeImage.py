@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of quantize_image, which maps images onto the gray levels every
+matrix builder counts.
+"""
+
+import numpy as np
+import pytest
+
+from dev.lib.matrixCalc.quantizeImage import quantize_image
+
+
+RAMP = np.arange(100, dtype=float).reshape(10, 10)
+
+
+def test_num_bins_spreads_the_range():
+
+    levels, quantInfo = quantize_image(RAMP, numBins=10)
+
+    # 100 values over 10 bins of width 9.9, the maximum in the last bin.
+
+    np.testing.assert_array_equal(
+        levels, np.minimum(np.floor(RAMP/9.9), 9).astype(int)
+    )
+    np.testing.assert_array_equal(np.bincount(levels.ravel()), [10]*10)
+    assert quantInfo["numLevels"] == 10
+    assert quantInfo["bitDepth"] == 4
+    assert quantInfo["binWidth"] == pytest.approx(9.9)
+    assert quantInfo["intensityRange"] == (0.0, 99.0)
+    np.testing.assert_allclose(quantInfo["binEdges"], np.linspace(0, 99, 11))
+
+
+def test_bin_width_sets_the_number_of_bins():
+
+    levels, quantInfo = quantize_image(RAMP, numBins=3, binWidth=10)
+
+    np.testing.assert_array_equal(levels, RAMP // 10)
+    assert quantInfo["numLevels"] == 10
+    assert quantInfo["binWidth"] == 10
+
+
+def test_intensity_range_clips_into_end_levels():
+
+    levels, quantInfo = quantize_image(RAMP, numBins=4,
+                                       intensityRange=(20, 60))
+
+    assert (levels[RAMP < 20] == 0).all()
+    assert (levels[RAMP >= 60] == 3).all()
+    np.testing.assert_array_equal(
+        levels[(RAMP >= 20) & (RAMP < 60)],
+        (RAMP[(RAMP >= 20) & (RAMP < 60)] - 20) // 10
+    )
+    assert quantInfo["intensityRange"] == (20.0, 60.0)
+
+
+def test_percentiles_ignore_outliers():
+
+    image = RAMP.copy()
+    image[0, 0] = -1e6
+    image[-1, -1] = 1e6
+
+    levels, quantInfo = quantize_image(image, numBins=8,
+                                       percentiles=(5, 95))
+
+    low, high = np.percentile(image, (5, 95))
+
+    assert quantInfo["intensityRange"] == (low, high)
+    assert levels[0, 0] == 0
+    assert levels[-1, -1] == 7
+
+    # The outliers do not squeeze the other pixels into a few levels.
+
+    assert np.unique(levels).size == 8
+
+
+def test_reserve_background_keeps_level_zero_free():
+
+    image = RAMP.copy()
+    image[::3] = 0
+
+    levels, quantInfo = quantize_image(image, numBins=5,
+                                       reserveBackground=True)
+
+    assert (levels[image == 0] == 0).all()
+    assert levels[image != 0].min() == 1
+    assert levels.max() == 5
+    assert quantInfo["numLevels"] == 6
+    assert quantInfo["reserveBackground"]
+
+    # The range is taken from the foreground alone.
+
+    assert quantInfo["intensityRange"] == (image[image != 0].min(),
+                                           image.max())
+
+
+def test_mask_restricts_the_range():
+
+    mask = np.zeros(RAMP.shape, dtype=bool)
+    mask[2:5, 3:7] = True
+
+    levels, quantInfo = quantize_image(RAMP, numBins=4, mask=mask)
+
+    assert quantInfo["intensityRange"] == (RAMP[mask].min(),
+                                           RAMP[mask].max())
+    assert (levels[~mask] == 0).all()
+    np.testing.assert_array_equal(np.unique(levels[mask]), [0, 1, 2, 3])
+
+
+@pytest.mark.parametrize("numBins, dtype", [
+    (1, np.uint8), (256, np.uint8), (257, np.uint16), (2**16, np.uint16)
+])
+def test_output_dtype(numBins, dtype):
+
+    levels, quantInfo = quantize_image(np.arange(2**17), numBins=numBins)
+
+    assert levels.dtype == dtype
+    assert levels.max() == numBins - 1
+    assert 2**quantInfo["bitDepth"] >= quantInfo["numLevels"]
+
+
+def test_too_many_levels():
+
+    with pytest.raises(ValueError):
+        quantize_image(np.arange(10), numBins=2**16, reserveBackground=True)
+
+
+@pytest.mark.parametrize("reserveBackground, level", [(False, 0), (True, 1)])
+def test_constant_image(reserveBackground, level):
+
+    levels, quantInfo = quantize_image(np.full((4, 5), 7.0), numBins=8,
+                                       reserveBackground=reserveBackground)
+
+    assert (levels == level).all()
+    assert quantInfo["intensityRange"] == (7.0, 7.0)
+    assert quantInfo["binWidth"] == 1.0
+
+
+def test_empty_mask_and_background_only():
+
+    levels, quantInfo = quantize_image(RAMP, mask=np.zeros(RAMP.shape))
+
+    assert not levels.any()
+    assert quantInfo["intensityRange"] == (0.0, 0.0)
+
+    levels, _ = quantize_image(np.zeros((3, 3)), reserveBackground=True)
+
+    assert not levels.any()
+
+
+@pytest.mark.parametrize("arguments", [
+    {"intensityRange": (5, 1)}, {"binWidth": 0}, {"numBins": 0}
+])
+def test_invalid_arguments(arguments):
+
+    with pytest.raises(ValueError):
+        quantize_image(RAMP, **arguments)
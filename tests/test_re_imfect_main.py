@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the feature extraction entry points in re_imfect_main.
+"""
+
+import csv
+import json
+import warnings
+
+import numpy as np
+import pytest
+
+from re_imfect_main import (extract_directory, extract_features,
+                            extract_features_by_label, feature_names, main)
+
+
+RAW_CONFIG = {"quantization": None, "bitDepth": 4}
+
+
+def _interior_labels():
+
+    # Two labels that touch none of the image borders.
+
+    labels = np.zeros((40, 40), dtype=int)
+    labels[5:15, 5:15] = 1
+    labels[20:30, 22:35] = 2
+
+    return labels
+
+
+def test_by_label_with_interior_labels():
+
+    image = np.random.default_rng(0).integers(0, 16, (40, 40))
+    labels = _interior_labels()
+
+    labelValues, table, names = extract_features_by_label(image, labels,
+                                                          RAW_CONFIG)
+
+    assert list(labelValues) == [1, 2]
+    assert table.shape == (2, len(names))
+
+
+@pytest.mark.parametrize("ignoreBackground", [False, True])
+def test_by_label_matches_masked_runs(ignoreBackground):
+
+    image = np.random.default_rng(1).integers(0, 16, (40, 40))
+    labels = _interior_labels()
+    config = dict(RAW_CONFIG, ignoreBackground=ignoreBackground)
+
+    labelValues, table, names = extract_features_by_label(image, labels,
+                                                          config)
+
+    for row, label in zip(table, labelValues):
+
+        features = extract_features(image, config, mask=labels == label)
+
+        np.testing.assert_allclose(row, [features[name] for name in names],
+                                   rtol=1e-9, atol=1e-12)
+
+
+def test_glcm_distance_longer_than_mask():
+
+    image = np.random.default_rng(2).integers(0, 256, (10, 10))
+    mask = np.zeros((10, 10), dtype=bool)
+    mask[3:5, 4:7] = True
+
+    features = extract_features(image, {"glcm": {"distances": [1, 2, 4]}},
+                                mask=mask)
+
+    assert "GLCM - Contrast (d=1)" in features
+    assert "GLCM - Contrast (d=4)" in features
+
+
+def test_background_only_image():
+
+    image = np.zeros((12, 12), dtype=int)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        features = extract_features(image, {"ignoreBackground": True})
+
+    assert np.isnan(features["GLRLM - Run Entropy"])
+
+
+@pytest.mark.parametrize("ignoreBackground", [False, True])
+def test_single_plane_volume_matches_image(ignoreBackground):
+
+    image = np.random.default_rng(3).integers(0, 256, (30, 40))
+    mask = np.zeros((30, 40), dtype=bool)
+    mask[5:9, 3:30] = True
+    config = {"ignoreBackground": ignoreBackground}
+
+    for roi in (None, mask):
+
+        planeFeatures = extract_features(image, config, mask=roi)
+        volumeFeatures = extract_features(
+            image[None], config, mask=None if roi is None else roi[None]
+        )
+
+        assert planeFeatures.keys() == volumeFeatures.keys()
+
+        for name, value in planeFeatures.items():
+            np.testing.assert_allclose(volumeFeatures[name], value,
+                                       rtol=1e-9, err_msg=name)
+
+
+def test_cached_features_match(tmp_path):
+
+    image = np.random.default_rng(4).integers(0, 256, (24, 24))
+    config = {"cache": {"directory": str(tmp_path)}}
+
+    expected = extract_features(image)
+
+    for _ in range(2):
+        features = extract_features(image, config)
+        assert features == pytest.approx(expected, nan_ok=True)
+
+
+@pytest.mark.parametrize("config", [
+    None,
+    {"matrices": ["ngtdm", "glcm"]},
+    {"glcm": {"distances": [1, 3]}},
+    {"features": {"glcm": ["Contrast"], "gldm": ["GLDM - Dependence Entropy"]}},
+])
+def test_feature_names_match_extracted(config):
+
+    image = np.random.default_rng(5).integers(0, 256, (16, 16))
+
+    assert feature_names(config) == list(extract_features(image, config))
+    assert feature_names(config) == list(extract_features(image[None],
+                                                          config))
+
+
+def test_extract_command(tmp_path, capsys):
+
+    images = tmp_path / "images"
+    images.mkdir()
+
+    rng = np.random.default_rng(6)
+
+    for k in range(3):
+        np.save(images / ("image" + str(k) + ".npy"),
+                rng.integers(0, 256, (12, 12)))
+
+    np.save(images / "blank.npy", np.zeros((12, 12), dtype=int))
+    (images / "broken.npy").write_bytes(b"not an image")
+
+    config = {"matrices": ["glcm", "glrlm"], "ignoreBackground": True,
+              "features": {"glrlm": ["Run Entropy"]}}
+    configPath = tmp_path / "config.json"
+    configPath.write_text(json.dumps(config))
+
+    output = tmp_path / "features.csv"
+
+    status = main(["extract", str(images), "-o", str(output), "-c",
+                   str(configPath), "-j", "1", "--chunk-size", "2"])
+
+    # The broken image is reported, and the rest are written under the
+    # header of the config's features.
+
+    assert status == 1
+    assert "broken.npy" in capsys.readouterr().err
+
+    with open(output, newline="") as file:
+        reader = csv.DictReader(file)
+        rows = list(reader)
+
+    assert reader.fieldnames == ["path"] + feature_names(config)
+    assert sorted(row["path"] for row in rows) == sorted(
+        str(images / name) for name in
+        ("blank.npy", "image0.npy", "image1.npy", "image2.npy")
+    )
+
+    for row in rows:
+        features = extract_features(np.load(row["path"]), config)
+        np.testing.assert_allclose(
+            [float(row[name]) for name in features],
+            list(features.values()), rtol=1e-9
+        )
+
+
+@pytest.mark.parametrize("arguments", [{"chunkSize": 0},
+                                       {"maxInFlight": 0}])
+def test_extract_directory_checks_chunks(tmp_path, arguments):
+
+    with pytest.raises(ValueError):
+        extract_directory(tmp_path, tmp_path / "features.csv", workers=1,
+                          **arguments)
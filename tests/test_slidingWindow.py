@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the sliding window builders against the builders of each window
+alone.
+"""
+
+import warnings
+
+import numpy as np
+import pytest
+
+from dev.lib.matrixCalc.angleOffsets import ANGLE_OFFSETS
+from dev.lib.matrixCalc.matrixGLCM import calc_glcm_multi
+from dev.lib.matrixCalc.matrixGLRLM import calc_glrlm
+from dev.lib.matrixCalc.matrixGLDM import calc_gldm
+from dev.lib.matrixCalc.slidingWindow import (iter_glcm_windows,
+                                              iter_glrlm_windows,
+                                              iter_gldm_windows,
+                                              window_starts, window_grid)
+from re_imfect_main import extract_feature_map, extract_features
+
+
+NUM_LEVELS = 4
+WINDOW = 5
+
+# Steps shorter than the window slide counts along; the rest count each
+# window afresh.
+
+STEPS = [1, 2, WINDOW, WINDOW+2]
+
+
+def _image():
+
+    image = np.random.default_rng(10).integers(0, NUM_LEVELS, (13, 17))
+    image[4:9, 3:12] = 2  # Runs and zones longer than a step.
+
+    return image
+
+
+def _windows(arr, step):
+
+    for iy, y0 in enumerate(window_starts(arr.shape[0], WINDOW, step)):
+        for ix, x0 in enumerate(window_starts(arr.shape[1], WINDOW, step)):
+            yield iy, ix, arr[y0:y0+WINDOW, x0:x0+WINDOW]
+
+
+def _check(windows, arr, step, calcWindow):
+
+    expected = {(iy, ix): calcWindow(window)
+                for iy, ix, window in _windows(arr, step)}
+
+    found = {(iy, ix): matrix for iy, ix, matrix in windows}
+
+    assert found.keys() == expected.keys()
+    assert len(found) == np.prod(window_grid(arr.shape, WINDOW, step))
+
+    for key, matrix in expected.items():
+        np.testing.assert_array_equal(found[key], matrix)
+
+
+@pytest.mark.parametrize("step", STEPS)
+@pytest.mark.parametrize("degrees", sorted(ANGLE_OFFSETS))
+@pytest.mark.parametrize("distance", [1, 3])
+def test_glcm_windows(step, degrees, distance):
+
+    arr = _image()
+    dy, dx = ANGLE_OFFSETS[degrees]
+    offset = (dy*distance, dx*distance)
+
+    _check(iter_glcm_windows(arr, WINDOW, step, NUM_LEVELS, offset), arr,
+           step, lambda window: calc_glcm_multi(window, [offset], [1], None,
+                                                numLevels=NUM_LEVELS)[0])
+
+
+def test_glcm_offset_longer_than_image():
+
+    arr = _image()
+
+    for iy, ix, glcm in iter_glcm_windows(arr, WINDOW, 3, NUM_LEVELS,
+                                          (0, 20)):
+        assert not glcm.any()
+
+    assert not calc_glcm_multi(arr, [(0, 20)], [1], None,
+                               numLevels=NUM_LEVELS).any()
+
+
+@pytest.mark.parametrize("step", STEPS)
+@pytest.mark.parametrize("degrees", sorted(ANGLE_OFFSETS))
+@pytest.mark.parametrize("ignoreBackground", [False, True])
+def test_glrlm_windows(step, degrees, ignoreBackground):
+
+    arr = _image()
+    angle = np.deg2rad(degrees)
+
+    def calcWindow(window):
+
+        # Window GLRLMs always have WINDOW columns.
+
+        glrlm = calc_glrlm(window, angle, None, ignoreBackground,
+                           numLevels=NUM_LEVELS)
+        padded = np.zeros((NUM_LEVELS, WINDOW), dtype=glrlm.dtype)
+        padded[:, :glrlm.shape[1]] = glrlm
+
+        return padded
+
+    _check(iter_glrlm_windows(arr, WINDOW, step, NUM_LEVELS, angle,
+                              ignoreBackground), arr, step, calcWindow)
+
+
+@pytest.mark.parametrize("step", STEPS)
+@pytest.mark.parametrize("alpha", [0, 1])
+@pytest.mark.parametrize("radius", [1, 2])
+def test_gldm_windows(step, alpha, radius):
+
+    arr = _image()
+
+    _check(iter_gldm_windows(arr, WINDOW, step, NUM_LEVELS, alpha, radius),
+           arr, step, lambda window: calc_gldm(window, alpha, None,
+                                               numLevels=NUM_LEVELS,
+                                               radius=radius))
+
+
+@pytest.mark.parametrize("step", [2, WINDOW+1])
+@pytest.mark.parametrize("ignoreBackground", [False, True])
+def test_feature_map_matches_window_features(step, ignoreBackground):
+
+    arr = _image()
+    config = {"quantization": None, "bitDepth": 2,
+              "ignoreBackground": ignoreBackground,
+              "glcm": {"distances": [1, 2]}}
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+
+        featureMap, names = extract_feature_map(arr, WINDOW, step, config)
+
+        assert featureMap.shape == (window_grid(arr.shape, WINDOW, step)
+                                    + (len(names),))
+
+        for iy, ix, window in _windows(arr, step):
+
+            features = extract_features(window, config)
+
+            np.testing.assert_allclose(
+                featureMap[iy, ix], [features[name] for name in names],
+                rtol=1e-6, atol=1e-9
+            )
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the 3-D matrix builders against voxel by voxel counts.
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from dev.lib.matrixCalc import volumeMatrices
+from dev.lib.matrixCalc.volumeMatrices import (VOLUME_OFFSETS, calc_glcm_3d,
+                                               calc_glrlm_3d, calc_glszm_3d,
+                                               calc_gldm_3d, calc_ngtdm_3d)
+
+
+def _inside(voxel, shape):
+
+    return all(0 <= v < n for v, n in zip(voxel, shape))
+
+
+def brute_glcm_3d(arr, step, numLevels, mask=None):
+
+    glcm = np.zeros((numLevels, numLevels), dtype=int)
+
+    for voxel in itertools.product(*map(range, arr.shape)):
+
+        neighbour = tuple(v + s for v, s in zip(voxel, step))
+
+        if not _inside(neighbour, arr.shape):
+            continue
+
+        if mask is not None and not (mask[voxel] and mask[neighbour]):
+            continue
+
+        glcm[arr[voxel], arr[neighbour]] += 1
+        glcm[arr[neighbour], arr[voxel]] += 1
+
+    return glcm
+
+
+def test_glcm_3d_matches_brute_force():
+
+    rng = np.random.default_rng(0)
+    arr = rng.integers(0, 3, (3, 4, 5))
+    mask = rng.random(arr.shape) < 0.7
+    distances = [1, 3, 6]
+
+    # An ROI mask crops to its bounding box, so brute force over the same
+    # box.
+
+    box = tuple(slice(c.min(), c.max()+1) for c in np.nonzero(mask))
+
+    cases = [(None, arr, None), (mask, arr[box], mask[box])]
+
+    for roi, volume, boxMask in cases:
+
+        glcms = calc_glcm_3d(arr, VOLUME_OFFSETS, distances, numLevels=3,
+                             mask=roi)
+
+        k = 0
+
+        for distance in distances:
+            for offset in VOLUME_OFFSETS:
+
+                step = tuple(distance*o for o in offset)
+
+                np.testing.assert_array_equal(
+                    glcms[k], brute_glcm_3d(volume, step, 3, boxMask)
+                )
+
+                k += 1
+
+
+def brute_glrlm_3d(arr, step, numLevels, ignoreBackground):
+
+    # Walks every line from its first voxel, counting each run as it ends.
+    # -1 marks voxels outside the ROI, which end a run and are not counted.
+
+    glrlm = np.zeros((numLevels, max(arr.shape)), dtype=int)
+
+    for voxel in itertools.product(*map(range, arr.shape)):
+
+        if _inside(tuple(v - s for v, s in zip(voxel, step)), arr.shape):
+            continue
+
+        line = []
+
+        while _inside(voxel, arr.shape):
+            line.append(arr[voxel])
+            voxel = tuple(v + s for v, s in zip(voxel, step))
+
+        for level, run in itertools.groupby(line):
+            if level >= 0 and not (ignoreBackground and level == 0):
+                glrlm[level, len(list(run)) - 1] += 1
+
+    return glrlm
+
+
+@pytest.mark.parametrize("blockVoxels", [2**22, 7, 1])
+def test_glrlm_3d_matches_brute_force(monkeypatch, blockVoxels):
+
+    # Small blocks split the sheared volume into many, which must give the
+    # same runs.
+
+    monkeypatch.setattr(volumeMatrices, "GLRLM_BLOCK_VOXELS", blockVoxels)
+
+    rng = np.random.default_rng(1)
+    arr = rng.integers(0, 3, (4, 5, 6))
+    arr[1:3, 1:4, 1:5] = 2
+    mask = rng.random(arr.shape) < 0.8
+    offsets = VOLUME_OFFSETS + [(-1, 1, 0), (0, 0, -1)]
+
+    for ignoreBackground in (False, True):
+
+        glrlms = calc_glrlm_3d(arr, offsets, numLevels=3,
+                               ignoreBackground=ignoreBackground, mask=mask)
+
+        for glrlm, offset in zip(glrlms, offsets):
+
+            expected = brute_glrlm_3d(np.where(mask, arr, -1), offset, 3,
+                                      ignoreBackground)
+
+            assert not expected[:, glrlm.shape[1]:].any()
+            np.testing.assert_array_equal(glrlm,
+                                          expected[:, :glrlm.shape[1]])
+
+
+def brute_glszm_3d(arr, numLevels, ignoreBackground, connectivity, mask):
+
+    # Labels each level on its own with ndimage.
+
+    rank = {6: 1, 18: 2, 26: 3}[connectivity]
+    structure = ndimage.generate_binary_structure(3, rank)
+
+    zones = []
+
+    for level in range(1 if ignoreBackground else 0, numLevels):
+
+        labels, _ = ndimage.label((arr == level) & mask, structure=structure)
+
+        zones += [(level, size) for size in np.bincount(labels.ravel())[1:]]
+
+    glszm = np.zeros((numLevels, arr.size), dtype=int)
+
+    for level, size in zones:
+        glszm[level, size - 1] += 1
+
+    return glszm
+
+
+@pytest.mark.parametrize("connectivity", [6, 18, 26])
+def test_glszm_3d_matches_brute_force(connectivity):
+
+    rng = np.random.default_rng(2)
+    arr = np.kron(rng.integers(0, 3, (3, 3, 3)), np.ones((2, 3, 2), int))
+    arr[rng.random(arr.shape) < 0.2] = 1
+    mask = rng.random(arr.shape) < 0.9
+
+    for ignoreBackground in (False, True):
+        for roi in (None, mask):
+
+            glszm = calc_glszm_3d(arr, None, ignoreBackground, numLevels=3,
+                                  connectivity=connectivity, mask=roi)
+
+            expected = brute_glszm_3d(
+                arr, 3, ignoreBackground, connectivity,
+                np.ones(arr.shape, dtype=bool) if roi is None else roi
+            )
+
+            assert not expected[:, glszm.shape[1]:].any()
+            np.testing.assert_array_equal(glszm,
+                                          expected[:, :glszm.shape[1]])
+
+
+def _neighbourhood(voxel, radius, inside):
+
+    # Voxels within radius of voxel, in the volume and mask, leaving out
+    # voxel itself.
+
+    for step in itertools.product(range(-radius, radius+1), repeat=3):
+
+        neighbour = tuple(v + s for v, s in zip(voxel, step))
+
+        if any(step) and _inside(neighbour, inside.shape) \
+                and inside[neighbour]:
+            yield neighbour
+
+
+def brute_gldm_3d(arr, alpha, radius, numLevels, mask=None):
+
+    inside = np.ones(arr.shape, dtype=bool) if mask is None else mask
+
+    gldm = np.zeros((numLevels, (2*radius+1)**3), dtype=int)
+
+    for voxel in itertools.product(*map(range, arr.shape)):
+
+        if not inside[voxel]:
+            continue
+
+        dependent = sum(abs(arr[neighbour] - arr[voxel]) <= alpha
+                        for neighbour in _neighbourhood(voxel, radius,
+                                                        inside))
+
+        gldm[arr[voxel], dependent] += 1
+
+    return gldm
+
+
+def brute_ngtdm_3d(arr, ignoreBackground, numLevels, distance, mask=None):
+
+    inside = np.ones(arr.shape, dtype=bool) if mask is None else mask
+
+    ngtdm = np.zeros((numLevels, 3))
+
+    for voxel in itertools.product(*map(range, arr.shape)):
+
+        if not inside[voxel] or (ignoreBackground and arr[voxel] == 0):
+            continue
+
+        neighbours = [arr[neighbour] for neighbour in
+                      _neighbourhood(voxel, distance, inside)]
+
+        if not neighbours:
+            continue
+
+        ngtdm[arr[voxel], 0] += 1
+        ngtdm[arr[voxel], 2] += abs(arr[voxel] - np.mean(neighbours))
+
+    ngtdm[:, 1] = ngtdm[:, 0]/np.count_nonzero(inside)
+
+    return ngtdm
+
+
+@pytest.mark.parametrize("blockPlanes", [1, 2, 16])
+@pytest.mark.parametrize("radius", [0, 1, 2])
+@pytest.mark.parametrize("masked", [False, True])
+def test_gldm_3d_matches_brute_force(monkeypatch, blockPlanes, radius,
+                                     masked):
+
+    monkeypatch.setattr(volumeMatrices, "NEIGHBOUR_BLOCK_PLANES",
+                        blockPlanes)
+
+    rng = np.random.default_rng(11)
+    arr = rng.integers(0, 3, (5, 4, 6))
+    mask = rng.random(arr.shape) < 0.7 if masked else None
+
+    for alpha in (0, 1):
+
+        gldm = calc_gldm_3d(arr, alpha, None, numLevels=3, radius=radius,
+                            mask=mask)
+
+        np.testing.assert_array_equal(
+            gldm, brute_gldm_3d(arr, alpha, radius, 3, mask)
+        )
+
+
+@pytest.mark.parametrize("blockPlanes", [1, 2, 16])
+@pytest.mark.parametrize("distance", [1, 2])
+@pytest.mark.parametrize("masked", [False, True])
+def test_ngtdm_3d_matches_brute_force(monkeypatch, blockPlanes, distance,
+                                      masked):
+
+    monkeypatch.setattr(volumeMatrices, "NEIGHBOUR_BLOCK_PLANES",
+                        blockPlanes)
+
+    rng = np.random.default_rng(12)
+    arr = rng.integers(0, 3, (5, 4, 6))
+    mask = rng.random(arr.shape) < 0.7 if masked else None
+
+    for ignoreBackground in (False, True):
+
+        ngtdm = calc_ngtdm_3d(arr, ignoreBackground, numLevels=3,
+                              distance=distance, mask=mask)
+
+        np.testing.assert_allclose(
+            ngtdm, brute_ngtdm_3d(arr, ignoreBackground, 3, distance, mask)
+        )
+
+
+def test_gldm_and_ngtdm_3d_of_empty_volumes():
+
+    empty = np.zeros((0, 3, 3), dtype=int)
+    outside = np.zeros((2, 3, 3), dtype=bool)
+
+    for arr, mask in ((empty, None), (np.ones((2, 3, 3), dtype=int),
+                                      outside)):
+
+        assert not calc_gldm_3d(arr, 0, None, numLevels=2, mask=mask).any()
+        assert not calc_ngtdm_3d(arr, True, numLevels=2, mask=mask).any()